@@ -1,24 +1,91 @@
 from __future__ import annotations
 
+import logging
+from typing import Any, Mapping
+
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
-from homeassistant.helpers.aiohttp_client import async_get_clientsession
 
-from .const import DOMAIN, PLATFORMS, CONF_HOST, CONF_USERNAME, CONF_PASSWORD, CONF_VERIFY_SSL
+from .const import (
+    DOMAIN,
+    PLATFORMS,
+    CONF_HOST,
+    CONF_USERNAME,
+    CONF_PASSWORD,
+    CONF_VERIFY_SSL,
+    CONF_VOLTAGE_DIVISOR,
+    CONF_CURRENT_DIVISOR,
+    CONF_TRANSPORT,
+    CONF_POWER_BUDGET,
+    DATA_FLEET,
+    DATA_POWER_BUDGET,
+    DATA_PROBES,
+    DEFAULT_VOLTAGE_DIVISOR,
+    DEFAULT_CURRENT_DIVISOR,
+    DEFAULT_TRANSPORT,
+    DEFAULT_POWER_BUDGET,
+    TRANSPORT_TELNET,
+)
 from .api import WattBoxHTTPClient
+from .telnet import WattBoxTelnetClient
+from .transport import WattBoxTransport
+from .coordinator import WattBoxCoordinator
+from .fleet import FleetScheduler
+from .names import OutletNameCache
+from .probe import ProbeCache
+from .sequencer import FleetPowerBudget
+from .snapshot import SnapshotStore
+from .services import async_setup_services, async_unload_services
 
+_LOGGER = logging.getLogger(__name__)
 
-async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
-    session = async_get_clientsession(hass)
-    client = WattBoxHTTPClient(
-        session=session,
-        host=entry.data[CONF_HOST],
-        user=entry.data[CONF_USERNAME],
-        pw=entry.data[CONF_PASSWORD],
-        verify_ssl=entry.data.get(CONF_VERIFY_SSL, True),
+
+def create_client(data: Mapping[str, Any]) -> WattBoxTransport:
+    """Device client for the configured transport"""
+    if data.get(CONF_TRANSPORT, DEFAULT_TRANSPORT) == TRANSPORT_TELNET:
+        return WattBoxTelnetClient(host=data[CONF_HOST], user=data[CONF_USERNAME], pw=data[CONF_PASSWORD])
+    # The client owns a small keep-alive pool per device rather than HA's shared session
+    return WattBoxHTTPClient(
+        session=None,
+        host=data[CONF_HOST],
+        user=data[CONF_USERNAME],
+        pw=data[CONF_PASSWORD],
+        verify_ssl=data.get(CONF_VERIFY_SSL, True),
+        voltage_divisor=data.get(CONF_VOLTAGE_DIVISOR, DEFAULT_VOLTAGE_DIVISOR),
+        current_divisor=data.get(CONF_CURRENT_DIVISOR, DEFAULT_CURRENT_DIVISOR),
     )
-    hass.data.setdefault(DOMAIN, {})[entry.entry_id] = {"client": client}
+
+
+async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
+    client = create_client(entry.data)
+
+    fleet: FleetScheduler = hass.data.setdefault(DATA_FLEET, FleetScheduler())
+    entry.async_on_unload(fleet.register(entry.entry_id))
+
+    budget: FleetPowerBudget = hass.data.setdefault(DATA_POWER_BUDGET, FleetPowerBudget())
+    entry.async_on_unload(budget.set_limit(entry.entry_id, entry.data.get(CONF_POWER_BUDGET, DEFAULT_POWER_BUDGET)))
+
+    coordinator = WattBoxCoordinator(hass, client, entry, fleet, budget)
+    entry.async_on_unload(client.add_batch_listener(coordinator.async_commands_done))
+    entry.async_on_unload(client.add_push_listener(coordinator.async_handle_push))
+    entry.async_on_unload(coordinator.async_cancel_waiters)
+    entry.async_on_unload(client.async_close)
+    # Entities come up from the saved snapshot and cached names, setup never
+    # waits on the device; the first poll runs once they exist
+    await coordinator.async_restore()
+    # Added a moment ago: the config flow's probe stands in for the first poll
+    probe = hass.data.setdefault(DATA_PROBES, ProbeCache()).take(entry.data[CONF_HOST])
+    if probe is not None:
+        coordinator.pipeline.preloaded = probe.data
+        # A new entry's entities are named after its outlets from the start
+        coordinator.names.async_update(probe.data.names)
+
+    hass.data.setdefault(DOMAIN, {})[entry.entry_id] = {"client": client, "coordinator": coordinator}
     await hass.config_entries.async_forward_entry_setups(entry, PLATFORMS)
+    await async_setup_services(hass)
+    entry.async_create_background_task(
+        hass, coordinator.async_refresh(), f"{DOMAIN} first refresh {entry.data[CONF_HOST]}"
+    )
     return True
 
 
@@ -26,4 +93,10 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     ok = await hass.config_entries.async_unload_platforms(entry, PLATFORMS)
     if ok:
         hass.data[DOMAIN].pop(entry.entry_id, None)
+        await async_unload_services(hass)
     return ok
+
+
+async def async_remove_entry(hass: HomeAssistant, entry: ConfigEntry) -> None:
+    await OutletNameCache(hass, entry.entry_id).async_remove()
+    await SnapshotStore(hass, entry.entry_id).async_remove()
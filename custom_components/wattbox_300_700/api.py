@@ -1,128 +1,298 @@
 from __future__ import annotations
 
+import hashlib
 import logging
-from typing import List, Dict, Optional
+import time
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from typing import AsyncIterator, FrozenSet, Dict, Optional
 
 import aiohttp
-import async_timeout
-import xml.etree.ElementTree as ET
+
+from .parser import IDENTITY_TAGS, InfoParser, WattBoxData, read_tags
+from .probe import DeviceProbe
+from .transport import WattBoxAuthError, WattBoxTransport
 
 _LOGGER = logging.getLogger(__name__)
 
+# Connection pool per device: small cap, keep one warm between polls
+MAX_CONNECTIONS_PER_HOST = 2
+KEEPALIVE_TIMEOUT = 30
+
+# Raised when a pooled connection was closed by the device before it answered
+_EARLY_CLOSE_ERRORS = (aiohttp.ServerDisconnectedError, aiohttp.ClientOSError)
+
+
+async def _on_dns_resolvehost_start(session, trace_ctx, params) -> None:
+    trace_ctx.trace_request_ctx.dns_started = time.monotonic()
+
+
+async def _on_dns_resolvehost_end(session, trace_ctx, params) -> None:
+    ctx = trace_ctx.trace_request_ctx
+    ctx.dns_time = time.monotonic() - ctx.dns_started
+
+
+async def _on_connection_create_start(session, trace_ctx, params) -> None:
+    trace_ctx.trace_request_ctx.connect_started = time.monotonic()
+
+
+async def _on_connection_create_end(session, trace_ctx, params) -> None:
+    ctx = trace_ctx.trace_request_ctx
+    ctx.connect_time = time.monotonic() - ctx.connect_started
+
+
+async def _on_connection_reuseconn(session, trace_ctx, params) -> None:
+    trace_ctx.trace_request_ctx.reused = True
+
 
-class WattBoxHTTPClient:
+def _trace_config() -> aiohttp.TraceConfig:
+    trace = aiohttp.TraceConfig()
+    trace.on_dns_resolvehost_start.append(_on_dns_resolvehost_start)
+    trace.on_dns_resolvehost_end.append(_on_dns_resolvehost_end)
+    trace.on_connection_create_start.append(_on_connection_create_start)
+    trace.on_connection_create_end.append(_on_connection_create_end)
+    trace.on_connection_reuseconn.append(_on_connection_reuseconn)
+    return trace
+
+
+class WattBoxHTTPClient(WattBoxTransport):
     """HTTP client for WB-300 and WB-700"""
 
-    def __init__(self, session: aiohttp.ClientSession, host: str, user: str, pw: str, verify_ssl: bool = True):
+    def __init__(
+        self,
+        session: Optional[aiohttp.ClientSession],
+        host: str,
+        user: str,
+        pw: str,
+        verify_ssl: bool = True,
+        voltage_divisor: float = 10.0,
+        current_divisor: float = 10.0,
+    ):
+        super().__init__(host)
+        # Without a session the client owns a pooled one tuned for this device
         self._session = session
-        self._host = host.rstrip("/")
+        self._owns_session = session is None
         self._auth = aiohttp.BasicAuth(user, pw)
         self._ssl = verify_ssl
-        self._timeout = 8
+        # Raw voltage_value/current_value are divided by these
+        self._divisors = (voltage_divisor, current_divisor)
+        # Per-outlet metering tags the device sends, learned from the first complete body
+        self._outlet_tags: Optional[FrozenSet[str]] = None
+        # Validators of the last parsed wattbox_info.xml, see poll()
+        self._fingerprint: Optional[bytes] = None
+        self._etag: Optional[str] = None
+        self._last_modified: Optional[str] = None
+        # Last snapshot parsed; handed back as is when a body does not change it
+        self._last: Optional[WattBoxData] = None
 
     def _url(self, path: str) -> str:
         return f"http://{self._host}/{path.lstrip('/')}"
 
-    async def _get_text(self, path: str) -> str:
-        """Fetch a URL and return its body as text, even if server closes early."""
+    def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(
+                limit_per_host=MAX_CONNECTIONS_PER_HOST,
+                keepalive_timeout=KEEPALIVE_TIMEOUT,
+            )
+            self._session = aiohttp.ClientSession(connector=connector, trace_configs=[_trace_config()])
+            self._owns_session = True
+        return self._session
+
+    @asynccontextmanager
+    async def _open(self, path: str, headers: Optional[Dict[str, str]] = None) -> AsyncIterator[aiohttp.ClientResponse]:
+        """GET path on a pooled connection.
+
+        A reused keep-alive connection the device already closed is retried
+        once on a fresh connection instead of surfacing an error. Records DNS,
+        connect, time-to-first-byte and body timings.
+        """
         url = self._url(path)
-        headers = {"Connection": "keep-alive", "User-Agent": "HA"}
-        async with async_timeout.timeout(self._timeout):
-            async with self._session.get(url, auth=self._auth, ssl=self._ssl, headers=headers) as resp:
-                chunks = []
+        req_headers = {"Connection": "keep-alive", "User-Agent": "HA"}
+        if headers:
+            req_headers.update(headers)
+        session = self._get_session()
+        metrics = self.metrics
+
+        for attempt in range(2):
+            ctx = SimpleNamespace(dns_started=0.0, dns_time=None, connect_started=0.0, connect_time=None, reused=False)
+            started = time.monotonic()
+            try:
+                resp = await session.get(url, auth=self._auth, ssl=self._ssl, headers=req_headers, trace_request_ctx=ctx)
+                break
+            except _EARLY_CLOSE_ERRORS as e:
+                if attempt or not ctx.reused:
+                    raise
+                metrics.early_closes += 1
+                _LOGGER.debug("%s closed a pooled connection early, reconnecting: %s", self._host, e)
+
+        headers_at = time.monotonic()
+        metrics.requests += 1
+        if resp.status in (401, 403):
+            resp.release()
+            raise WattBoxAuthError(f"{self._host} rejected the credentials")
+        if ctx.reused:
+            metrics.reused += 1
+        if ctx.dns_time is not None:
+            metrics.dns.add(ctx.dns_time)
+        if ctx.connect_time is not None:
+            metrics.connects += 1
+            metrics.connect.add(ctx.connect_time)
+        # Time to first byte excludes connection setup
+        metrics.ttfb.add(headers_at - started - (ctx.connect_time or 0.0))
+        metrics.keepalive = resp.headers.get("Connection", "").lower() != "close"
+        try:
+            yield resp
+        finally:
+            resp.release()
+            metrics.body.add(time.monotonic() - headers_at)
+
+    def _parse_result(self, parser: InfoParser, truncated: bool) -> WattBoxData:
+        try:
+            data = self._last = parser.result(truncated, self._last)
+        except ValueError:
+            self.metrics.parse_failures += 1
+            raise
+        if self._outlet_tags is None and not truncated:
+            self._outlet_tags = parser.outlet_tags
+            if self._outlet_tags:
+                _LOGGER.debug("%s meters outlets: %s", self._host, ", ".join(sorted(self._outlet_tags)))
+        return data
+
+    async def _read_info(self, path: str) -> WattBoxData:
+        """Stream an info page through the parser; parsing stops once every tag is read,
+        the tail is drained unparsed so the connection can be reused."""
+        parser = InfoParser(*self._divisors, self._outlet_tags)
+        metrics = self.metrics
+        truncated = False
+        parse_time = 0.0
+        async with self._guarded(), self._deadline():
+            async with self._open(path) as resp:
                 try:
                     async for c in resp.content.iter_any():
-                        chunks.append(c)
+                        metrics.bytes_read += len(c)
+                        t = time.monotonic()
+                        done = parser.feed(c)
+                        parse_time += time.monotonic() - t
+                        if done:
+                            break
+                    # Drain the tail unparsed so the connection can be reused
+                    metrics.bytes_read += len(await resp.read())
                 except Exception as e:
+                    # device often closes early, keep what was parsed
                     _LOGGER.debug("stream read error ignored: %s", e)
-                try:
-                    return b"".join(chunks).decode("utf-8", "ignore")
-                except Exception:
-                    return ""
+                    metrics.early_closes += 1
+                    truncated = True
+        t = time.monotonic()
+        try:
+            return self._parse_result(parser, truncated)
+        finally:
+            metrics.parse.add(parse_time + time.monotonic() - t)
 
     async def _fire_and_forget(self, path: str) -> None:
         """Send a command but ignore body (device often closes early)."""
-        url = self._url(path)
-        headers = {"Connection": "keep-alive", "User-Agent": "HA"}
-        async with async_timeout.timeout(self._timeout):
-            async with self._session.get(url, auth=self._auth, ssl=self._ssl, headers=headers) as resp:
+        async with self._guarded(), self._deadline():
+            async with self._open(path) as resp:
                 try:
-                    await resp.content.readany()
+                    self.metrics.bytes_read += len(await resp.read())
                 except Exception:
                     pass
-                return
+
+    async def _send(self, command: str) -> None:
+        await self._fire_and_forget(command)
+
+    def _outlet_command(self, outlet: int, action: int) -> str:
+        return f"control.cgi?outlet={outlet}&command={action}"
+
+    def _auto_reboot_command(self, enabled: bool) -> str:
+        return f"control.cgi?outlet=0&command={4 if enabled else 5}"
 
     # ---------- Public API ----------
 
-    async def get_outlet_states(self) -> List[bool]:
-        """Return list of outlet states as booleans, index 0 -> outlet 1"""
-        xml_text = await self._get_text("wattbox_info.xml")
-        try:
-            root = ET.fromstring(xml_text)
-        except Exception as e:
-            _LOGGER.error("Failed to parse wattbox_info.xml: %s", e)
-            raise
+    async def async_close(self) -> None:
+        """Cancel queued commands and close the owned connection pool"""
+        await super().async_close()
+        if self._owns_session and self._session is not None:
+            await self._session.close()
+
+    async def get_info(self) -> WattBoxData:
+        """Fetch wattbox_info.xml once and return states, names and metrics"""
+        return await self._read_info("wattbox_info.xml")
 
-        node = root.find("outlet_status")
-        if node is None or node.text is None:
-            raise ValueError("outlet_status not found in XML")
-
-        csv = node.text.replace("\r", "").replace("\n", "").strip()
-        parts = [p.strip() for p in csv.split(",") if p.strip() != ""]
-        return [p == "1" for p in parts]
-
-    async def set_outlet(self, outlet: int, on: bool) -> None:
-        """Turn one outlet on or off"""
-        if outlet < 0:
-            raise ValueError("outlet must be >= 0")
-        cmd = 1 if on else 0
-        await self._fire_and_forget(f"control.cgi?outlet={outlet}&command={cmd}")
-
-    async def reset_outlet(self, outlet: int) -> None:
-        # 0 means reset all
-        if outlet < 0:
-            raise ValueError("outlet must be >= 0")
-        await self._fire_and_forget(f"control.cgi?outlet={outlet}&command=3")
-
-    async def set_auto_reboot(self, enabled: bool) -> None:
-        """Enable or disable auto reboot for all outlets"""
-        cmd = 4 if enabled else 5
-        await self._fire_and_forget(f"control.cgi?outlet=0&command={cmd}")
-        
-    async def get_outlet_names(self) -> list[str]:
-        """Return list of outlet names from <outlet_name>."""
-        xml_text = await self._get_text("wattbox_info.xml")
-        root = ET.fromstring(xml_text)
-        node = root.find("outlet_name")
-        if node is None or node.text is None:
-            return []
-        csv = node.text.replace("\r", "").replace("\n", "").strip()
-        return [p.strip() for p in csv.split(",") if p.strip() != ""]
-
-    async def get_metrics(self) -> Dict[str, Optional[float]]:
-        """Return voltage V, current A, power W if present"""
-        xml_text = await self._get_text("wattbox_info.xml")
+    async def probe(self) -> DeviceProbe:
+        """Fetch wattbox_info.xml once, whole, for the snapshot and the identity tags"""
+        body = bytearray()
+        truncated = False
+        async with self._guarded(), self._deadline():
+            async with self._open("wattbox_info.xml") as resp:
+                try:
+                    async for c in resp.content.iter_any():
+                        body += c
+                except Exception as e:
+                    _LOGGER.debug("stream read error ignored: %s", e)
+                    truncated = True
+        self.metrics.bytes_read += len(body)
+        parser = InfoParser(*self._divisors)
+        parser.feed(bytes(body))
+        data = self._parse_result(parser, truncated)
+        tags = read_tags(bytes(body), IDENTITY_TAGS)
+        # wattbox_info.xml carries no firmware version
+        return DeviceProbe(data, model=tags.get("hardware_version"), serial=tags.get("serial_number"))
+
+    async def poll(self) -> Optional[WattBoxData]:
+        """Fetch wattbox_info.xml, returning None when it is unchanged since the last poll.
+
+        Uses ETag/Last-Modified when the firmware sends them. Otherwise each
+        chunk is hashed and scanned as it arrives until every wanted tag was
+        seen. The hash covers every chunk read, so the part of the body the
+        snapshot comes from plus whatever else those chunks held; when it
+        matches the last one no snapshot is built. The tail is drained unread
+        so the connection can be reused.
+        """
+        headers = {}
+        if self._etag:
+            headers["If-None-Match"] = self._etag
+        if self._last_modified:
+            headers["If-Modified-Since"] = self._last_modified
+
+        digest = hashlib.blake2b(digest_size=16)
+        parser = InfoParser(*self._divisors, self._outlet_tags)
+        truncated = False
+        scan_time = 0.0
+        metrics = self.metrics
+        async with self._guarded(), self._deadline():
+            async with self._open("wattbox_info.xml", headers) as resp:
+                if resp.status == 304:
+                    return None
+                etag = resp.headers.get("ETag")
+                last_modified = resp.headers.get("Last-Modified")
+                try:
+                    async for c in resp.content.iter_any():
+                        metrics.bytes_read += len(c)
+                        digest.update(c)
+                        t = time.monotonic()
+                        done = parser.feed(c)
+                        scan_time += time.monotonic() - t
+                        if done:
+                            break
+                    metrics.bytes_read += len(await resp.read())
+                except Exception as e:
+                    _LOGGER.debug("stream read error ignored: %s", e)
+                    metrics.early_closes += 1
+                    truncated = True
+
+        fingerprint = digest.digest()
+        if fingerprint == self._fingerprint:
+            metrics.parse.add(scan_time)
+            return None
+
+        t = time.monotonic()
         try:
-            root = ET.fromstring(xml_text)
-        except Exception as e:
-            _LOGGER.error("Failed to parse wattbox_info.xml: %s", e)
-            raise
+            data = self._parse_result(parser, truncated)
+        finally:
+            metrics.parse.add(scan_time + time.monotonic() - t)
 
-        def _read_int(tag: str) -> Optional[int]:
-            node = root.find(tag)
-            if node is None or node.text is None:
-                return None
-            try:
-                return int(node.text.strip())
-            except ValueError:
-                return None
-
-        v_raw = _read_int("voltage_value")   # 1115 -> 111.5 V
-        a_raw = _read_int("current_value")   # 105 -> 10.5 A
-        w_raw = _read_int("power_value")     # 600 -> 600 W
-
-        return {
-            "voltage": (v_raw / 10.0) if v_raw is not None else None,
-            "current": (a_raw / 10.0) if a_raw is not None else None,
-            "power": float(w_raw) if w_raw is not None else None,
-        }
\ No newline at end of file
+        # Only remember validators of a body that parsed
+        self._fingerprint = fingerprint
+        self._etag = etag
+        self._last_modified = last_modified
+        return data
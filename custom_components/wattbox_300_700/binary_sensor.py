@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import logging
+from typing import Any
+
+from homeassistant.components.binary_sensor import BinarySensorDeviceClass, BinarySensorEntity
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+from homeassistant.helpers.entity_platform import AddEntitiesCallback
+
+from .const import DOMAIN
+from .coordinator import WattBoxCoordinator
+from .detection import OVER_CURRENT, OVER_VOLTAGE, UNDER_VOLTAGE
+from .entity import WattBoxEntity
+from .parser import WattBoxChanges
+
+_LOGGER = logging.getLogger(__name__)
+
+_NAMES = {
+    UNDER_VOLTAGE: "Under Voltage",
+    OVER_VOLTAGE: "Over Voltage",
+    OVER_CURRENT: "Over Current",
+}
+
+
+async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, add_entities: AddEntitiesCallback) -> None:
+    coordinator: WattBoxCoordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
+    # Only the checks with a threshold configured
+    add_entities([WBPowerAlertSensor(coordinator, entry, kind) for kind in coordinator.detector.limits])
+
+
+class WBPowerAlertSensor(WattBoxEntity, BinarySensorEntity):
+    """On while a brownout, surge or overcurrent alert is active"""
+
+    _attr_device_class = BinarySensorDeviceClass.PROBLEM
+
+    def __init__(self, coordinator: WattBoxCoordinator, entry: ConfigEntry, kind: str):
+        super().__init__(coordinator)
+        self._kind = kind
+        self._attr_name = f"WattBox {_NAMES[kind]}"
+        self._attr_unique_id = f"wb_300_700_{entry.data.get('host')}_{kind}"
+        self._written: Any = None
+
+    @property
+    def is_on(self) -> bool:
+        return bool(self.coordinator.detector.is_active(self._kind))
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:
+        limit = self.coordinator.detector.limits[self._kind]
+        return {"threshold": limit.threshold, "hysteresis": limit.hysteresis, "worst": limit.extreme}
+
+    def _is_changed(self, changes: WattBoxChanges) -> bool:
+        # Compare what is shown: the poll's events stay set through pushes and
+        # optimistic updates, and while active the worst reading can still move
+        shown = (self.is_on, self.coordinator.detector.limits[self._kind].extreme)
+        if shown == self._written:
+            return False
+        self._written = shown
+        return True
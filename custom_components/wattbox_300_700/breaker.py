@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import random
+import time
+from typing import Any, Dict, Optional
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Consecutive failures that open the circuit
+FAILURE_THRESHOLD = 3
+# Open period after the first trip, doubled per further trip
+BASE_BACKOFF = 5.0
+MAX_BACKOFF = 300.0
+JITTER = 0.2
+
+
+class CircuitBreaker:
+    """Closed / open / half-open breaker for one device.
+
+    Closed: everything goes through. After FAILURE_THRESHOLD consecutive
+    failures it opens and fails fast for a jittered, exponentially growing
+    backoff. Then it lets a single probe through (half-open): success closes
+    it, failure opens it again for longer.
+    """
+
+    def __init__(
+        self,
+        threshold: int = FAILURE_THRESHOLD,
+        base_backoff: float = BASE_BACKOFF,
+        max_backoff: float = MAX_BACKOFF,
+        jitter: float = JITTER,
+        rng: Optional[random.Random] = None,
+    ):
+        self.threshold = threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self._rng = rng or random.Random()
+        self.state = CLOSED
+        self.failures = 0
+        # Opens since the last success, drives the backoff
+        self._streak = 0
+        self.trips = 0
+        self.rejected = 0
+        self.retry_at = 0.0
+        self._probing = False
+
+    def allow(self, now: Optional[float] = None) -> bool:
+        """Whether a request may go out now; the caller must report its outcome"""
+        if self.state == CLOSED:
+            return True
+        now = time.monotonic() if now is None else now
+        if self.state == OPEN and now >= self.retry_at:
+            self.state = HALF_OPEN
+        if self.state == HALF_OPEN and not self._probing:
+            self._probing = True
+            return True
+        self.rejected += 1
+        return False
+
+    def success(self) -> None:
+        self.state = CLOSED
+        self.failures = 0
+        self._streak = 0
+        self._probing = False
+
+    def failure(self, now: Optional[float] = None) -> None:
+        self.failures += 1
+        if self.state == HALF_OPEN or self.failures >= self.threshold:
+            now = time.monotonic() if now is None else now
+            backoff = min(self.base_backoff * 2 ** self._streak, self.max_backoff)
+            backoff *= self._rng.uniform(1 - self.jitter, 1 + self.jitter)
+            self.state = OPEN
+            self.retry_at = now + backoff
+            self._streak += 1
+            self.trips += 1
+        self._probing = False
+
+    def release(self) -> None:
+        """The allowed request ended without a verdict (e.g. cancelled)"""
+        self._probing = False
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "trips": self.trips,
+            "rejected": self.rejected,
+            "retry_in": round(max(0.0, self.retry_at - time.monotonic()), 1) if self.state == OPEN else None,
+        }
@@ -2,7 +2,6 @@ from __future__ import annotations
 
 import asyncio
 import logging
-from typing import List, Optional
 
 from homeassistant.components.button import ButtonEntity
 from homeassistant.config_entries import ConfigEntry
@@ -11,137 +10,118 @@ from homeassistant.helpers.entity_platform import AddEntitiesCallback
 
 from .const import (
     DOMAIN,
-    CONF_MODEL,
-    CONF_OUTLETS,
-    DEFAULT_MODEL,
-    outlets_for,
-    CONF_MODEL as _CONF_MODEL,
+    CONF_HOST,
+    CONF_SEQUENCE_DELAY,
+    DEFAULT_SEQUENCE_DELAY,
+    EVENT_RESET_DONE,
 )
-from .api import WattBoxHTTPClient
+from .transport import WattBoxTransport
+from .coordinator import RESET_TIMEOUT, WaitResult, WattBoxCoordinator
+from .entity import WattBoxDeviceMixin
+from .sequencer import ACTION_RESET, DONE, build_plan
 
 _LOGGER = logging.getLogger(__name__)
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, add_entities: AddEntitiesCallback) -> None:
-    client: WattBoxHTTPClient = hass.data[DOMAIN][entry.entry_id]["client"]
+    client: WattBoxTransport = hass.data[DOMAIN][entry.entry_id]["client"]
+    coordinator: WattBoxCoordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
 
-    model = entry.data.get(CONF_MODEL, DEFAULT_MODEL)
-    outlets = entry.data.get(CONF_OUTLETS) or outlets_for(model)
-    if not outlets or outlets < 1:
-        outlets = outlets_for(model or DEFAULT_MODEL)
+    entities: list[ButtonEntity] = [WBResetButton(client, coordinator, entry, i + 1) for i in range(coordinator.outlets)]
+    entities.append(WBResetAllButton(client, coordinator, entry, "Reset All Outlets"))
+    entities.append(WBCancelSequenceButton(client, coordinator, entry, "Cancel Sequence"))
 
-    names: List[str] = []
-    try:
-        names = await client.get_outlet_names()
-    except Exception as e:
-        _LOGGER.debug("Could not load outlet names for buttons: %s", e)
+    add_entities(entities)
 
-    entities: list[ButtonEntity] = []
-    for i in range(outlets):
-        n = i + 1
-        label = f"{n} - {names[i]} Reset" if i < len(names) and names[i] else f"Outlet {n} Reset"
-        entities.append(WBResetButton(client, entry, n, label))
 
-    entities.append(WBResetAllButton(client, entry, "Reset All Outlets"))
+class WBBase(WattBoxDeviceMixin, ButtonEntity):
+    """Base that can optimistically update the shared coordinator and report reset results"""
 
-    add_entities(entities, True)
-
-
-class WBBase(ButtonEntity):
-    """Base that refreshes and can optimistically update the switch coordinator"""
-
-    def __init__(self, client: WattBoxHTTPClient, entry: ConfigEntry, name: str, unique_suffix: str):
+    def __init__(self, client: WattBoxTransport, coordinator: WattBoxCoordinator, entry: ConfigEntry, name: str, unique_suffix: str):
         self._client = client
+        self.coordinator = coordinator
         self._entry = entry
         self._attr_name = name
         self._attr_unique_id = f"wb_300_700_{entry.data.get('host')}_{unique_suffix}"
-        self._attr_device_info = {
-            "identifiers": {(DOMAIN, entry.data.get("host"))},
-            "name": f"WattBox 300/700 ({entry.data.get('host')})",
-            "manufacturer": "Snap One",
-            "model": entry.data.get("model", DEFAULT_MODEL),
-        }
 
-    def _get_coordinator(self):
-        try:
-            return self.hass.data[DOMAIN][self._entry.entry_id].get("switch_coordinator")
-        except Exception:
-            return None
-
-    async def _refresh_now(self) -> Optional[list]:
-        # Use async_refresh() to perform the update immediately
-        coord = self._get_coordinator()
-        if not coord:
-            return None
-        try:
-            await coord.async_refresh()
-            return coord.data
-        except Exception:
-            return None
+    def _report(self, outlets: list[int], result: WaitResult, outcome: str | None = None) -> None:
+        outcome = outcome or ("success" if result.success else "timeout")
+        self._attr_extra_state_attributes = {
+            "last_result": outcome,
+            "last_elapsed": round(result.elapsed, 1),
+        }
+        self.async_write_ha_state()
+        if outcome == "timeout":
+            _LOGGER.warning("%s: outlets did not come back on within %.0fs", self.name, result.elapsed)
+        self.hass.bus.async_fire(
+            EVENT_RESET_DONE,
+            {
+                "host": self._entry.data.get(CONF_HOST),
+                "outlets": outlets,
+                "success": result.success,
+                "elapsed": round(result.elapsed, 1),
+            },
+        )
 
     def _optimistic_set(self, indices_off: list[int]) -> None:
         # Immediately set given outlet indices to OFF and push update
-        coord = self._get_coordinator()
-        if not coord:
+        coord = self.coordinator
+        if not coord.data:
             return
-        try:
-            data = list(coord.data or [])
-            changed = False
-            for idx in indices_off:
-                if idx < len(data):
-                    if data[idx] is True:
-                        changed = True
-                    data[idx] = False
-            if changed:
-                coord.async_set_updated_data(data)
-        except Exception:
-            pass
+        mask = coord.data.mask
+        for idx in indices_off:
+            mask &= ~(1 << idx)
+        data = coord.data.with_mask(mask)
+        if data is not coord.data:
+            coord.async_set_updated_data(data)
 
 
 class WBResetButton(WBBase):
-    """Reset one outlet: set OFF immediately, then refresh every 1s until ON"""
+    """Reset one outlet: set OFF immediately, then wait until the device reports it ON"""
 
-    def __init__(self, client: WattBoxHTTPClient, entry: ConfigEntry, outlet: int, label: str):
-        super().__init__(client, entry, label, f"outlet_{outlet}_reset")
+    def __init__(self, client: WattBoxTransport, coordinator: WattBoxCoordinator, entry: ConfigEntry, outlet: int):
         self._outlet = outlet
+        super().__init__(client, coordinator, entry, "", f"outlet_{outlet}_reset")
+        self._attr_name = self._label()
+
+    def _label(self) -> str:
+        name = self.coordinator.names.name(self._outlet - 1)
+        return f"{self._outlet} - {name} Reset" if name else f"Outlet {self._outlet} Reset"
 
     async def async_press(self) -> None:
         await self._client.reset_outlet(self._outlet)
 
         # Optimistic OFF now
-        self._optimistic_set([self._outlet - 1])
+        idx = self._outlet - 1
+        self._optimistic_set([idx])
 
-        # Then poll every 1s with immediate refresh until ON or timeout
-        for _ in range(120):
-            await asyncio.sleep(1)
-            data = await self._refresh_now()
-            try:
-                idx = self._outlet - 1
-                if isinstance(data, list) and idx < len(data) and bool(data[idx]):
-                    break
-            except Exception:
-                pass
+        result = await self.coordinator.async_wait_for_outlets([idx], timeout=RESET_TIMEOUT)
+        self._report([self._outlet], result)
 
 
 class WBResetAllButton(WBBase):
-    """Reset all outlets: set all OFF immediately, then refresh every 1s until all ON"""
+    """Reset all outlets one after another, each by the device itself, within the power budget"""
+
+    def __init__(self, client: WattBoxTransport, coordinator: WattBoxCoordinator, entry: ConfigEntry, label: str):
+        super().__init__(client, coordinator, entry, label, "reset_all")
+
+    async def async_press(self) -> None:
+        coord = self.coordinator
+        indices = list(range(coord.outlets))
+        delay = self._entry.data.get(CONF_SEQUENCE_DELAY, DEFAULT_SEQUENCE_DELAY)
+        task = coord.sequencer.start(ACTION_RESET, build_plan(ACTION_RESET, indices, delay))
+        # Stopped by the cancel button or service, not by this call going away
+        progress = await asyncio.shield(task)
+        outcome = "success" if progress.status == DONE else progress.status
+        self._report([i + 1 for i in indices], WaitResult(progress.status == DONE, progress.elapsed), outcome)
+
+
+class WBCancelSequenceButton(WBBase):
+    """Stop the running outlet sequence after its current step"""
 
-    def __init__(self, client: WattBoxHTTPClient, entry: ConfigEntry, label: str):
-        super().__init__(client, entry, label, "reset_all")
+    def __init__(self, client: WattBoxTransport, coordinator: WattBoxCoordinator, entry: ConfigEntry, label: str):
+        super().__init__(client, coordinator, entry, label, "cancel_sequence")
 
     async def async_press(self) -> None:
-        await self._client.reset_outlet(0)
-
-        # Optimistic OFF for all known outlets
-        coord = self._get_coordinator()
-        count = len(coord.data) if coord and isinstance(coord.data, list) else 12
-        self._optimistic_set(list(range(count)))
-
-        for _ in range(180):
-            await asyncio.sleep(1)
-            data = await self._refresh_now()
-            try:
-                if isinstance(data, list) and len(data) >= count and all(bool(x) for x in data[:count]):
-                    break
-            except Exception:
-                pass
\ No newline at end of file
+        if not self.coordinator.sequencer.cancel():
+            _LOGGER.debug("%s: no sequence running", self.name)
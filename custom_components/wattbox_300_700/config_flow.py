@@ -1,7 +1,11 @@
 from __future__ import annotations
 
+import logging
+from typing import Any, Dict, Mapping, Optional, Tuple
+
 import voluptuous as vol
 from homeassistant import config_entries
+from homeassistant.core import HomeAssistant
 from homeassistant.data_entry_flow import FlowResult
 
 from .const import (
@@ -11,44 +15,166 @@ from .const import (
     CONF_PASSWORD,
     CONF_VERIFY_SSL,
     CONF_SCAN_INTERVAL,
+    CONF_MIN_SCAN_INTERVAL,
+    CONF_MAX_SCAN_INTERVAL,
     CONF_OUTLETS,
     CONF_MODEL,
+    CONF_FIRMWARE,
+    CONF_TRANSPORT,
+    CONF_UNDER_VOLTAGE,
+    CONF_OVER_VOLTAGE,
+    CONF_OVER_CURRENT,
+    CONF_VOLTAGE_HYSTERESIS,
+    CONF_CURRENT_HYSTERESIS,
+    CONF_VOLTAGE_DIVISOR,
+    CONF_CURRENT_DIVISOR,
+    CONF_SEQUENCE_DELAY,
+    CONF_POWER_BUDGET,
+    DATA_PROBES,
     DEFAULT_VERIFY_SSL,
     DEFAULT_SCAN_INTERVAL,
-    DEFAULT_MODEL,
-    MODEL_CHOICES,
-    outlets_for,
+    DEFAULT_MIN_SCAN_INTERVAL,
+    DEFAULT_MAX_SCAN_INTERVAL,
+    DEFAULT_UNDER_VOLTAGE,
+    DEFAULT_OVER_VOLTAGE,
+    DEFAULT_OVER_CURRENT,
+    DEFAULT_VOLTAGE_HYSTERESIS,
+    DEFAULT_CURRENT_HYSTERESIS,
+    DEFAULT_VOLTAGE_DIVISOR,
+    DEFAULT_CURRENT_DIVISOR,
+    DEFAULT_SEQUENCE_DELAY,
+    DEFAULT_POWER_BUDGET,
+    DEFAULT_TRANSPORT,
+    TRANSPORT_CHOICES,
+    model_for,
 )
+from . import create_client
+from .probe import DeviceProbe, ProbeCache, async_probe
+from .transport import WattBoxAuthError
+
+_LOGGER = logging.getLogger(__name__)
+
+# Alert thresholds, reading scale and sequencing: key -> default
+ALERT_FIELDS = {
+    CONF_UNDER_VOLTAGE: DEFAULT_UNDER_VOLTAGE,
+    CONF_OVER_VOLTAGE: DEFAULT_OVER_VOLTAGE,
+    CONF_OVER_CURRENT: DEFAULT_OVER_CURRENT,
+    CONF_VOLTAGE_HYSTERESIS: DEFAULT_VOLTAGE_HYSTERESIS,
+    CONF_CURRENT_HYSTERESIS: DEFAULT_CURRENT_HYSTERESIS,
+    CONF_VOLTAGE_DIVISOR: DEFAULT_VOLTAGE_DIVISOR,
+    CONF_CURRENT_DIVISOR: DEFAULT_CURRENT_DIVISOR,
+    CONF_SEQUENCE_DELAY: DEFAULT_SEQUENCE_DELAY,
+    CONF_POWER_BUDGET: DEFAULT_POWER_BUDGET,
+}
+_DIVISORS = (CONF_VOLTAGE_DIVISOR, CONF_CURRENT_DIVISOR)
+# Settings that decide how the device is reached; only changing these needs a probe
+CONNECTION_FIELDS = (CONF_HOST, CONF_USERNAME, CONF_PASSWORD, CONF_VERIFY_SSL, CONF_TRANSPORT)
+
+
+def _alert_schema(values: dict) -> dict:
+    """Optional float fields for ALERT_FIELDS, defaulting to the given values"""
+    return {
+        vol.Optional(key, default=values.get(key, default)): vol.All(
+            vol.Coerce(float), vol.Range(min=0.001 if key in _DIVISORS else 0)
+        )
+        for key, default in ALERT_FIELDS.items()
+    }
+
+
+async def _async_probe(hass: HomeAssistant, data: Mapping[str, Any]) -> Tuple[Optional[DeviceProbe], Dict[str, str]]:
+    """Probe the device with these settings once; the form errors when it fails.
+
+    A successful probe is kept for the first refresh of the entry.
+    """
+    client = create_client(data)
+    try:
+        probe = await async_probe(client)
+    except WattBoxAuthError:
+        return None, {"base": "invalid_auth"}
+    except Exception as e:
+        _LOGGER.debug("Probing %s failed: %s", data[CONF_HOST], str(e) or type(e).__name__)
+        return None, {"base": "cannot_connect"}
+    finally:
+        await client.async_close()
+    hass.data.setdefault(DATA_PROBES, ProbeCache()).put(data[CONF_HOST], probe)
+    return probe, {}
+
+
+def _detected(probe: DeviceProbe) -> dict:
+    """Entry data the device reports about itself"""
+    return {
+        CONF_MODEL: probe.model or model_for(probe.outlets),
+        CONF_OUTLETS: probe.outlets,
+        CONF_FIRMWARE: probe.firmware,
+    }
+
 
 class ConfigFlow(config_entries.ConfigFlow, domain=DOMAIN):
     VERSION = 1
 
+    _reauth_entry: config_entries.ConfigEntry | None = None
+
     async def async_step_user(self, user_input: dict | None = None) -> FlowResult:
+        errors: Dict[str, str] = {}
         if user_input is not None:
-            model = user_input[CONF_MODEL]
+            # Entries from before unique ids were set are matched by host
+            self._async_abort_entries_match({CONF_HOST: user_input[CONF_HOST]})
             data = {
                 CONF_HOST: user_input[CONF_HOST],
                 CONF_USERNAME: user_input[CONF_USERNAME],
                 CONF_PASSWORD: user_input[CONF_PASSWORD],
                 CONF_VERIFY_SSL: user_input.get(CONF_VERIFY_SSL, DEFAULT_VERIFY_SSL),
+                CONF_TRANSPORT: user_input.get(CONF_TRANSPORT, DEFAULT_TRANSPORT),
                 CONF_SCAN_INTERVAL: user_input.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL),
-                CONF_MODEL: model,
-                CONF_OUTLETS: outlets_for(model),
+                CONF_MIN_SCAN_INTERVAL: user_input.get(CONF_MIN_SCAN_INTERVAL, DEFAULT_MIN_SCAN_INTERVAL),
+                CONF_MAX_SCAN_INTERVAL: user_input.get(CONF_MAX_SCAN_INTERVAL, DEFAULT_MAX_SCAN_INTERVAL),
+                **{key: user_input.get(key, default) for key, default in ALERT_FIELDS.items()},
             }
-            return self.async_create_entry(
-                title=f"WattBox 300/700 ({data[CONF_HOST]})",
-                data=data,
-            )
+            probe, errors = await _async_probe(self.hass, data)
+            if probe is not None:
+                # The same WattBox under another address is still the same device
+                await self.async_set_unique_id(probe.serial or data[CONF_HOST])
+                self._abort_if_unique_id_configured()
+                return self.async_create_entry(
+                    title=f"WattBox 300/700 ({data[CONF_HOST]})",
+                    data={**data, **_detected(probe)},
+                )
 
+        user_input = user_input or {}
         schema = vol.Schema({
-            vol.Required(CONF_HOST): str,
-            vol.Required(CONF_USERNAME): str,
+            vol.Required(CONF_HOST, default=user_input.get(CONF_HOST, "")): str,
+            vol.Required(CONF_USERNAME, default=user_input.get(CONF_USERNAME, "")): str,
             vol.Required(CONF_PASSWORD): str,
-            vol.Required(CONF_MODEL, default=DEFAULT_MODEL): vol.In(list(MODEL_CHOICES.keys())),
+            vol.Required(CONF_TRANSPORT, default=DEFAULT_TRANSPORT): vol.In(TRANSPORT_CHOICES),
             vol.Optional(CONF_SCAN_INTERVAL, default=DEFAULT_SCAN_INTERVAL): int,
+            vol.Optional(CONF_MIN_SCAN_INTERVAL, default=DEFAULT_MIN_SCAN_INTERVAL): int,
+            vol.Optional(CONF_MAX_SCAN_INTERVAL, default=DEFAULT_MAX_SCAN_INTERVAL): int,
             vol.Optional(CONF_VERIFY_SSL, default=DEFAULT_VERIFY_SSL): bool,
+            **_alert_schema({}),
+        })
+        return self.async_show_form(step_id="user", data_schema=schema, errors=errors)
+
+    async def async_step_reauth(self, entry_data: Mapping[str, Any]) -> FlowResult:
+        """The device rejected the stored credentials"""
+        self._reauth_entry = self.hass.config_entries.async_get_entry(self.context["entry_id"])
+        return await self.async_step_reauth_confirm()
+
+    async def async_step_reauth_confirm(self, user_input: dict | None = None) -> FlowResult:
+        entry = self._reauth_entry
+        errors: Dict[str, str] = {}
+        if user_input is not None:
+            data = {**entry.data, CONF_USERNAME: user_input[CONF_USERNAME], CONF_PASSWORD: user_input[CONF_PASSWORD]}
+            probe, errors = await _async_probe(self.hass, data)
+            if probe is not None:
+                self.hass.config_entries.async_update_entry(entry, data={**data, **_detected(probe)})
+                await self.hass.config_entries.async_reload(entry.entry_id)
+                return self.async_abort(reason="reauth_successful")
+
+        schema = vol.Schema({
+            vol.Required(CONF_USERNAME, default=entry.data.get(CONF_USERNAME, "")): str,
+            vol.Required(CONF_PASSWORD): str,
         })
-        return self.async_show_form(step_id="user", data_schema=schema)
+        return self.async_show_form(step_id="reauth_confirm", data_schema=schema, errors=errors)
 
     @staticmethod
     def async_get_options_flow(config_entry):
@@ -61,29 +187,42 @@ class OptionsFlow(config_entries.OptionsFlow):
 
     async def async_step_init(self, user_input=None) -> FlowResult:
         data = self._entry.data
+        errors: Dict[str, str] = {}
 
         if user_input is not None:
             new_pw = user_input.get(CONF_PASSWORD, "")
-            model = user_input.get(CONF_MODEL, data.get(CONF_MODEL, DEFAULT_MODEL))
             merged = {
+                **data,
                 CONF_HOST: user_input.get(CONF_HOST, data.get(CONF_HOST)),
                 CONF_USERNAME: user_input.get(CONF_USERNAME, data.get(CONF_USERNAME)),
                 CONF_PASSWORD: data.get(CONF_PASSWORD) if new_pw == "" else new_pw,
                 CONF_VERIFY_SSL: user_input.get(CONF_VERIFY_SSL, data.get(CONF_VERIFY_SSL, DEFAULT_VERIFY_SSL)),
+                CONF_TRANSPORT: user_input.get(CONF_TRANSPORT, data.get(CONF_TRANSPORT, DEFAULT_TRANSPORT)),
                 CONF_SCAN_INTERVAL: user_input.get(CONF_SCAN_INTERVAL, data.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL)),
-                CONF_MODEL: model,
-                CONF_OUTLETS: outlets_for(model),
+                CONF_MIN_SCAN_INTERVAL: user_input.get(CONF_MIN_SCAN_INTERVAL, data.get(CONF_MIN_SCAN_INTERVAL, DEFAULT_MIN_SCAN_INTERVAL)),
+                CONF_MAX_SCAN_INTERVAL: user_input.get(CONF_MAX_SCAN_INTERVAL, data.get(CONF_MAX_SCAN_INTERVAL, DEFAULT_MAX_SCAN_INTERVAL)),
+                **{key: user_input.get(key, data.get(key, default)) for key, default in ALERT_FIELDS.items()},
             }
-            self.hass.config_entries.async_update_entry(self._entry, data=merged, options={})
-            await self.hass.config_entries.async_reload(self._entry.entry_id)
-            return self.async_create_entry(title="", data={})
+            probe = None
+            current = {CONF_VERIFY_SSL: DEFAULT_VERIFY_SSL, CONF_TRANSPORT: DEFAULT_TRANSPORT, **data}
+            if any(merged[key] != current.get(key) for key in CONNECTION_FIELDS):
+                probe, errors = await _async_probe(self.hass, merged)
+            if not errors:
+                if probe is not None:
+                    merged.update(_detected(probe))
+                self.hass.config_entries.async_update_entry(self._entry, data=merged, options={})
+                await self.hass.config_entries.async_reload(self._entry.entry_id)
+                return self.async_create_entry(title="", data={})
 
         schema = vol.Schema({
             vol.Required(CONF_HOST, default=data.get(CONF_HOST, "")): str,
             vol.Required(CONF_USERNAME, default=data.get(CONF_USERNAME, "")): str,
             vol.Optional(CONF_PASSWORD, default=""): str,  # leave blank to keep
-            vol.Required(CONF_MODEL, default=data.get(CONF_MODEL, DEFAULT_MODEL)): vol.In(list(MODEL_CHOICES.keys())),
+            vol.Required(CONF_TRANSPORT, default=data.get(CONF_TRANSPORT, DEFAULT_TRANSPORT)): vol.In(TRANSPORT_CHOICES),
             vol.Optional(CONF_SCAN_INTERVAL, default=data.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL)): int,
+            vol.Optional(CONF_MIN_SCAN_INTERVAL, default=data.get(CONF_MIN_SCAN_INTERVAL, DEFAULT_MIN_SCAN_INTERVAL)): int,
+            vol.Optional(CONF_MAX_SCAN_INTERVAL, default=data.get(CONF_MAX_SCAN_INTERVAL, DEFAULT_MAX_SCAN_INTERVAL)): int,
             vol.Optional(CONF_VERIFY_SSL, default=data.get(CONF_VERIFY_SSL, DEFAULT_VERIFY_SSL)): bool,
+            **_alert_schema(data),
         })
-        return self.async_show_form(step_id="init", data_schema=schema)
\ No newline at end of file
+        return self.async_show_form(step_id="init", data_schema=schema, errors=errors)
\ No newline at end of file
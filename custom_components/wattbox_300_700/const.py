@@ -1,18 +1,75 @@
 DOMAIN = "wattbox_300_700"
-PLATFORMS = ["switch", "sensor", "button"]
+PLATFORMS = ["switch", "sensor", "binary_sensor", "button"]
 
 CONF_HOST = "host"
 CONF_USERNAME = "username"
 CONF_PASSWORD = "password"
 CONF_VERIFY_SSL = "verify_ssl"
 CONF_SCAN_INTERVAL = "scan_interval"
+CONF_MIN_SCAN_INTERVAL = "min_scan_interval"
+CONF_MAX_SCAN_INTERVAL = "max_scan_interval"
 CONF_OUTLETS = "outlets"
 CONF_MODEL = "model"
+CONF_TRANSPORT = "transport"
+CONF_UNDER_VOLTAGE = "under_voltage"
+CONF_OVER_VOLTAGE = "over_voltage"
+CONF_OVER_CURRENT = "over_current"
+CONF_VOLTAGE_HYSTERESIS = "voltage_hysteresis"
+CONF_CURRENT_HYSTERESIS = "current_hysteresis"
+CONF_VOLTAGE_DIVISOR = "voltage_divisor"
+CONF_CURRENT_DIVISOR = "current_divisor"
+CONF_POWER_BUDGET = "power_budget"
+CONF_SEQUENCE_DELAY = "sequence_delay"
+CONF_FIRMWARE = "firmware"
+
+SERVICE_SET_OUTLETS = "set_outlets"
+ATTR_DEVICE_ID = "device_id"
+ATTR_OUTLETS = "outlets"
+SERVICE_GET_HISTORY = "get_history"
+ATTR_SECONDS = "seconds"
+SERVICE_SEQUENCE_OUTLETS = "sequence_outlets"
+SERVICE_CANCEL_SEQUENCE = "cancel_sequence"
+ATTR_ACTION = "action"
+ATTR_DELAY = "delay"
+ATTR_OUTLET = "outlet"
+
+EVENT_RESET_DONE = f"{DOMAIN}_reset_done"
+EVENT_POWER_ALERT = f"{DOMAIN}_power_alert"
+EVENT_SEQUENCE_DONE = f"{DOMAIN}_sequence_done"
+
+# hass.data key of the FleetScheduler shared by every entry
+DATA_FLEET = f"{DOMAIN}_fleet"
+# hass.data key of the FleetPowerBudget shared by every entry
+DATA_POWER_BUDGET = f"{DOMAIN}_power_budget"
+# hass.data key of the ProbeCache the config flow hands to the first refresh
+DATA_PROBES = f"{DOMAIN}_probes"
 
 DEFAULT_SCAN_INTERVAL = 10
+DEFAULT_MIN_SCAN_INTERVAL = 2
+DEFAULT_MAX_SCAN_INTERVAL = 60
 DEFAULT_VERIFY_SSL = True
 DEFAULT_MODEL = "WB-700-IPV-12"
 
+# How the integration talks to the device: HTTP CGI or the integration
+# protocol over a persistent telnet session (host may be given as host:port)
+TRANSPORT_HTTP = "http"
+TRANSPORT_TELNET = "telnet"
+TRANSPORT_CHOICES = [TRANSPORT_HTTP, TRANSPORT_TELNET]
+DEFAULT_TRANSPORT = TRANSPORT_HTTP
+# Firmware reports voltage and current in tenths
+DEFAULT_VOLTAGE_DIVISOR = 10
+DEFAULT_CURRENT_DIVISOR = 10
+# Alert thresholds (V, A), 0 disables; an alert clears once back inside by the hysteresis
+DEFAULT_UNDER_VOLTAGE = 108.0
+DEFAULT_OVER_VOLTAGE = 132.0
+DEFAULT_OVER_CURRENT = 15.0
+DEFAULT_VOLTAGE_HYSTERESIS = 2.0
+DEFAULT_CURRENT_HYSTERESIS = 0.5
+# Sequenced switch-on: seconds between outlets, and the fleet-wide power cap
+# in W (0 for none; with several entries the smallest one applies)
+DEFAULT_SEQUENCE_DELAY = 2.0
+DEFAULT_POWER_BUDGET = 0.0
+
 # Model → outlet count
 MODEL_CHOICES = {
     "WB-300-IP-3": 3,
@@ -23,3 +80,8 @@ MODEL_CHOICES = {
 
 def outlets_for(model: str) -> int:
     return MODEL_CHOICES.get(model, MODEL_CHOICES[DEFAULT_MODEL])
+
+
+def model_for(outlets: int) -> str:
+    """First known model with this many outlets, for devices that do not report theirs"""
+    return next((model for model, count in MODEL_CHOICES.items() if count == outlets), DEFAULT_MODEL)
@@ -0,0 +1,418 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Iterable
+
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.exceptions import ConfigEntryAuthFailed, HomeAssistantError
+from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+
+from .const import (
+    DOMAIN,
+    CONF_HOST,
+    CONF_MODEL,
+    CONF_OUTLETS,
+    CONF_SCAN_INTERVAL,
+    CONF_MIN_SCAN_INTERVAL,
+    CONF_MAX_SCAN_INTERVAL,
+    CONF_UNDER_VOLTAGE,
+    CONF_OVER_VOLTAGE,
+    CONF_OVER_CURRENT,
+    CONF_VOLTAGE_HYSTERESIS,
+    CONF_CURRENT_HYSTERESIS,
+    EVENT_POWER_ALERT,
+    EVENT_SEQUENCE_DONE,
+    DEFAULT_MODEL,
+    DEFAULT_SCAN_INTERVAL,
+    DEFAULT_MIN_SCAN_INTERVAL,
+    DEFAULT_MAX_SCAN_INTERVAL,
+    DEFAULT_UNDER_VOLTAGE,
+    DEFAULT_OVER_VOLTAGE,
+    DEFAULT_OVER_CURRENT,
+    DEFAULT_VOLTAGE_HYSTERESIS,
+    DEFAULT_CURRENT_HYSTERESIS,
+    outlets_for,
+)
+from .transport import CircuitOpenError, WattBoxAuthError, WattBoxTransport
+from .detection import PowerDetector, PowerEvent
+from .parser import WattBoxChanges, WattBoxData, diff, mask_of
+from .scheduler import AdaptiveInterval
+from .fleet import FleetScheduler
+from .pipeline import PollPipeline
+from .energy import EnergyAccumulator
+from .history import DeviceHistory
+from .names import OutletNameCache
+from .snapshot import SnapshotStore
+from .optimistic import OptimisticStates, PendingCommand
+from .sequencer import RUNNING, FleetPowerBudget, PowerSequencer, estimate_load
+
+_LOGGER = logging.getLogger(__name__)
+
+# Accelerated refresh period while anything waits on outlet states
+WAIT_REFRESH_INTERVAL = 1.0
+# Longest a reset outlet gets to come back on
+RESET_TIMEOUT = 120.0
+
+
+@dataclass
+class WaitResult:
+    """Outcome of waiting for outlets to reach a state"""
+
+    success: bool
+    elapsed: float
+
+
+@dataclass
+class _Waiter:
+    indices: frozenset[int]
+    on: bool
+    started: float
+    deadline: float
+    future: asyncio.Future
+
+
+class WattBoxCoordinator(DataUpdateCoordinator[WattBoxData]):
+    """One wattbox_info.xml poll per device, shared by every platform"""
+
+    def __init__(
+        self,
+        hass: HomeAssistant,
+        client: WattBoxTransport,
+        entry: ConfigEntry,
+        fleet: FleetScheduler,
+        budget: FleetPowerBudget | None = None,
+    ):
+        def _opt(key: str, default: float) -> float:
+            return entry.options.get(key, entry.data.get(key, default))
+
+        self.interval = AdaptiveInterval(
+            base=_opt(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL),
+            minimum=_opt(CONF_MIN_SCAN_INTERVAL, DEFAULT_MIN_SCAN_INTERVAL),
+            maximum=_opt(CONF_MAX_SCAN_INTERVAL, DEFAULT_MAX_SCAN_INTERVAL),
+        )
+        super().__init__(
+            hass,
+            _LOGGER,
+            name=f"{DOMAIN}_{entry.data.get(CONF_HOST)}",
+            update_interval=timedelta(seconds=self.interval.current),
+        )
+        self.client = client
+        self.entry = entry
+        self.fleet = fleet
+
+        model = entry.data.get(CONF_MODEL, DEFAULT_MODEL)
+        outlets = entry.data.get(CONF_OUTLETS) or outlets_for(model)
+        if not outlets or outlets < 1:
+            outlets = outlets_for(model or DEFAULT_MODEL)
+        self.outlets: int = outlets
+        self.detector = PowerDetector(
+            under_voltage=_opt(CONF_UNDER_VOLTAGE, DEFAULT_UNDER_VOLTAGE),
+            over_voltage=_opt(CONF_OVER_VOLTAGE, DEFAULT_OVER_VOLTAGE),
+            over_current=_opt(CONF_OVER_CURRENT, DEFAULT_OVER_CURRENT),
+            voltage_hysteresis=_opt(CONF_VOLTAGE_HYSTERESIS, DEFAULT_VOLTAGE_HYSTERESIS),
+            current_hysteresis=_opt(CONF_CURRENT_HYSTERESIS, DEFAULT_CURRENT_HYSTERESIS),
+        )
+        self.pipeline = PollPipeline(entry.entry_id, client, outlets, self.interval, fleet, self.detector)
+        # Fed on every successful poll, unchanged payloads included
+        self.energy = EnergyAccumulator()
+        # Constant-size recent history, independent of the recorder
+        self.history = DeviceHistory()
+        # Loaded from storage at setup, revalidated by every poll
+        self.names = OutletNameCache(hass, entry.entry_id)
+        self.snapshot = SnapshotStore(hass, entry.entry_id)
+        # True while the data is the saved snapshot rather than a live poll
+        self.restored = False
+
+        # Switch commands shown before the device confirms them
+        self.optimistic = OptimisticStates()
+
+        # Staggered bulk switching, paced by the fleet power budget
+        self.budget = budget
+        # Last metered draw of each outlet while on, W
+        self.loads: dict[int, float] = {}
+        self.sequencer = PowerSequencer(
+            entry.entry_id,
+            self.async_switch_outlets,
+            budget,
+            lambda index: estimate_load(self.pipeline.device_data, index, self.loads),
+            self._async_sequence_progress,
+            self.async_reset_outlets,
+        )
+
+        # What the last update changed, entities skip state writes otherwise
+        self.changes = WattBoxChanges()
+
+        # Pending outlet waiters, served by at most one accelerated refresh loop
+        self._waiters: list[_Waiter] = []
+        self._wait_task: asyncio.Task | None = None
+
+    def empty_data(self) -> WattBoxData:
+        """Placeholder snapshot used when the device could not be reached"""
+        return WattBoxData(states=[False] * self.outlets, names=list(self.names.names))
+
+    async def async_restore(self) -> None:
+        """Start from persisted state without asking the device.
+
+        With a saved snapshot the entities come up with its states, marked as
+        restored; without one they start unavailable. Either way the first
+        real poll is left to the caller to run in the background.
+        """
+        await self.names.async_load()
+        saved = await self.snapshot.async_load()
+        if saved is not None:
+            self.restored = True
+            self.async_set_updated_data(self.pipeline.pad(saved))
+        else:
+            self.data = self.empty_data()
+            self.last_update_success = False
+
+    def _apply_delay(self) -> None:
+        self.update_interval = timedelta(seconds=self.pipeline.delay)
+
+    @callback
+    def async_note_activity(self) -> None:
+        """A command was sent: poll fast until the device settles again"""
+        self.pipeline.activity()
+        self._apply_delay()
+
+    @callback
+    def async_commands_done(self) -> None:
+        """The client's command queue drained: one fast refresh for the whole batch"""
+        self.async_note_activity()
+        self.hass.async_create_task(self.async_request_refresh())
+
+    async def async_switch_outlet(self, index: int, on: bool) -> None:
+        """Show outlet index (0-based) in its new state at once, then wait for the device to confirm.
+
+        Raises HomeAssistantError, with the outlet back in the state the device
+        reports, when the command could not be sent or was never confirmed.
+        """
+        states = self.data.states if self.data else []
+        previous = states[index] if index < len(states) else False
+        optimistic = self.optimistic
+        cmd = optimistic.start(index, on, previous, time.monotonic(), self.hass.loop.create_future())
+        self._apply_optimistic()
+        try:
+            await self.client.set_outlet(index + 1, on)
+        except Exception as e:
+            optimistic.fail(cmd)
+            self._apply_optimistic([cmd])
+            raise HomeAssistantError(f"Switching outlet {index + 1} failed: {e}") from e
+
+        try:
+            confirmed = await asyncio.wait_for(asyncio.shield(cmd.future), max(0.0, cmd.deadline - time.monotonic()))
+        except asyncio.TimeoutError:
+            # No poll came back after the deadline to settle it
+            optimistic.fail(cmd)
+            self._apply_optimistic([cmd])
+            confirmed = False
+        if confirmed is False:
+            raise HomeAssistantError(f"Outlet {index + 1} did not turn {'on' if on else 'off'} within {optimistic.timeout:.0f}s")
+
+    async def async_switch_outlets(self, indices: list[int], on: bool) -> None:
+        """async_switch_outlet for several outlets at once, sent as one batch"""
+        await asyncio.gather(*(self.async_switch_outlet(i, on) for i in indices))
+
+    async def async_reset_outlets(self, indices: list[int]) -> None:
+        """Reset outlets (0-based) with the device's own reset and wait until they are back on"""
+        await asyncio.gather(*(self.client.reset_outlet(i + 1) for i in indices))
+        result = await self.async_wait_for_outlets(indices, True, RESET_TIMEOUT)
+        if not result.success:
+            raise HomeAssistantError(f"Outlets {[i + 1 for i in indices]} did not come back on within {RESET_TIMEOUT:.0f}s")
+
+    @callback
+    def _async_sequence_progress(self) -> None:
+        progress = self.sequencer.progress
+        # Only the sequence entities have something new to show
+        self.changes = WattBoxChanges()
+        self.async_update_listeners()
+        if progress.status == RUNNING:
+            return
+        self.hass.bus.async_fire(
+            EVENT_SEQUENCE_DONE,
+            {
+                "entry_id": self.entry.entry_id,
+                "host": self.entry.data.get(CONF_HOST),
+                **progress.as_dict(),
+            },
+        )
+
+    def _apply_optimistic(self, failed: Iterable[PendingCommand] = ()) -> None:
+        """Push the polled states with pending commands overlaid; failed ones fall back"""
+        if self.data is None:
+            return
+        device = self.pipeline.device_data
+        if device is not None:
+            base = device.states
+        else:
+            # Nothing polled yet: undo failed commands by hand
+            base = list(self.data.states)
+            for cmd in failed:
+                if cmd.index < len(base):
+                    base[cmd.index] = cmd.previous
+        shown = self.data.with_mask(mask_of(self.optimistic.overlay(base)))
+        if shown is not self.data:
+            self.async_set_updated_data(shown)
+
+    async def async_wait_for_outlets(self, indices: Iterable[int], on: bool = True, timeout: float = 120.0) -> WaitResult:
+        """Wait until the device reports every outlet index in the given state.
+
+        Only polls started at least WAIT_REFRESH_INTERVAL after the call count,
+        so a command has time to take effect first. Any number of waiters share
+        one refresh loop per device.
+        """
+        now = time.monotonic()
+        waiter = _Waiter(frozenset(indices), on, now, now + timeout, self.hass.loop.create_future())
+        self._waiters.append(waiter)
+        if self._wait_task is None or self._wait_task.done():
+            self._wait_task = self.hass.async_create_task(self._async_wait_loop())
+        return await waiter.future
+
+    async def _async_wait_loop(self) -> None:
+        while self._waiters:
+            next_deadline = min(w.deadline for w in self._waiters)
+            await asyncio.sleep(max(0.0, min(WAIT_REFRESH_INTERVAL, next_deadline - time.monotonic())))
+            if any(w.deadline > time.monotonic() for w in self._waiters):
+                await self.async_refresh()
+            self._expire_waiters()
+
+    def _resolve_waiters(self, data: WattBoxData, poll_started: float) -> None:
+        for w in list(self._waiters):
+            if poll_started - w.started < WAIT_REFRESH_INTERVAL:
+                continue
+            states = data.states
+            if all(i < len(states) and states[i] == w.on for i in w.indices):
+                self._finish_waiter(w, True)
+
+    def _expire_waiters(self) -> None:
+        now = time.monotonic()
+        for w in list(self._waiters):
+            if now >= w.deadline:
+                self._finish_waiter(w, False)
+
+    def _finish_waiter(self, waiter: _Waiter, success: bool) -> None:
+        self._waiters.remove(waiter)
+        if not waiter.future.done():
+            waiter.future.set_result(WaitResult(success, time.monotonic() - waiter.started))
+
+    @callback
+    def async_cancel_waiters(self) -> None:
+        self.sequencer.cancel()
+        self.optimistic.cancel()
+        for w in self._waiters:
+            w.future.cancel()
+        self._waiters.clear()
+        if self._wait_task is not None:
+            self._wait_task.cancel()
+
+    async def _async_update_data(self) -> WattBoxData:
+        pipeline = self.pipeline
+        try:
+            data = await pipeline.run(self.data)
+        except CircuitOpenError as e:
+            # Already warned when the circuit opened
+            raise UpdateFailed(str(e)) from e
+        except WattBoxAuthError as e:
+            # Stops polling and asks the user for new credentials
+            raise ConfigEntryAuthFailed(str(e)) from e
+        except Exception as e:
+            _LOGGER.warning("WattBox poll failed: %s", e)
+            raise UpdateFailed(str(e)) from e
+        finally:
+            self._apply_delay()
+
+        if self._waiters:
+            self._resolve_waiters(pipeline.device_data, pipeline.started)
+        if self.optimistic.pending:
+            data = self._reconcile_optimistic(data)
+        device = pipeline.device_data
+        if self.budget is not None:
+            self.budget.report(self.entry.entry_id, device.power, pipeline.started)
+        if device.outlet_power is not None:
+            for i, (w, on) in enumerate(zip(device.outlet_power, device.states)):
+                if on and w:
+                    self.loads[i] = w
+        now = time.time()
+        self.energy.add(now, pipeline.device_data.power)
+        self.history.add(now, pipeline.device_data)
+        self.names.async_update(pipeline.device_data.names)
+        self.snapshot.async_save(pipeline.device_data)
+        self.restored = False
+        for event in pipeline.events:
+            self._fire_power_event(event)
+        self.changes = pipeline.changes
+        return data
+
+    @callback
+    def async_handle_push(self, states: list[bool] | None) -> None:
+        """Outlet states pushed by the device, applied without a poll"""
+        pipeline = self.pipeline
+        if states is None:
+            # Push session lost: back to regular polling, starting now
+            pipeline.set_interval(self.interval.current)
+            self._apply_delay()
+            self.hass.async_create_task(self.async_request_refresh())
+            return
+        device = pipeline.apply_push(states)
+        if device is None or self.data is None:
+            return
+        now = time.monotonic()
+        if self._waiters:
+            self._resolve_waiters(device, now)
+        settled = False
+        if self.optimistic.pending:
+            settled = any(self.optimistic.reconcile(device.states, now, now))
+        self.history.add_states(time.time(), device.states)
+        self.snapshot.async_save(device)
+        shown = self.data.with_mask(mask_of(self.optimistic.overlay(device.states)))
+        self.changes = diff(self.data, shown)
+        if self.changes or settled:
+            # Not async_set_updated_data: that would push back the fallback poll,
+            # which is also where the metrics come from
+            self.data = shown
+            self.async_update_listeners()
+
+    def _reconcile_optimistic(self, data: WattBoxData) -> WattBoxData:
+        """Settle pending switch commands; the rest stay overlaid on the polled states"""
+        pipeline = self.pipeline
+        device = pipeline.device_data
+        self.optimistic.reconcile(device.states, pipeline.started, time.monotonic())
+        if not self.optimistic.pending:
+            return data
+        shown = device.with_mask(mask_of(self.optimistic.overlay(device.states)))
+        pipeline.changes = diff(self.data, shown)
+        return shown if pipeline.changes else self.data
+
+    def _fire_power_event(self, event: PowerEvent) -> None:
+        log = _LOGGER.warning if event.active else _LOGGER.info
+        log(
+            "%s %s %s: %s (threshold %s, worst %s)",
+            self.entry.data.get(CONF_HOST),
+            event.kind,
+            "started" if event.active else "cleared",
+            event.value,
+            event.threshold,
+            event.extreme,
+        )
+        self.hass.bus.async_fire(
+            EVENT_POWER_ALERT,
+            {
+                "entry_id": self.entry.entry_id,
+                "host": self.entry.data.get(CONF_HOST),
+                "type": event.kind,
+                "active": event.active,
+                "value": event.value,
+                "threshold": event.threshold,
+                "extreme": event.extreme,
+            },
+        )
+
+    @callback
+    def async_set_updated_data(self, data: WattBoxData) -> None:
+        self.changes = diff(self.data, data)
+        super().async_set_updated_data(data)
@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from .const import (
+    DEFAULT_UNDER_VOLTAGE,
+    DEFAULT_OVER_VOLTAGE,
+    DEFAULT_OVER_CURRENT,
+    DEFAULT_VOLTAGE_HYSTERESIS,
+    DEFAULT_CURRENT_HYSTERESIS,
+)
+from .parser import WattBoxData
+
+UNDER_VOLTAGE = "under_voltage"
+OVER_VOLTAGE = "over_voltage"
+OVER_CURRENT = "over_current"
+ALERT_KINDS = (UNDER_VOLTAGE, OVER_VOLTAGE, OVER_CURRENT)
+
+
+@dataclass
+class PowerEvent:
+    """An alert starting (active) or clearing; extreme is the worst reading seen"""
+
+    kind: str
+    active: bool
+    value: float
+    threshold: float
+    extreme: float
+
+
+class _Limit:
+    def __init__(self, kind: str, key: str, threshold: float, hysteresis: float, above: bool):
+        self.kind = kind
+        self.key = key
+        self.threshold = threshold
+        self.hysteresis = abs(hysteresis)
+        self.above = above
+        self.active = False
+        self.extreme: Optional[float] = None
+
+    def _worse(self, a: float, b: float) -> float:
+        return max(a, b) if self.above else min(a, b)
+
+    def check(self, value: Optional[float]) -> Optional[PowerEvent]:
+        """Returns an event on a transition, None otherwise"""
+        if value is None:
+            return None
+        if self.active:
+            self.extreme = self._worse(self.extreme, value)
+            # Must come back past the threshold by the hysteresis to clear
+            cleared = value < self.threshold - self.hysteresis if self.above else value > self.threshold + self.hysteresis
+            if not cleared:
+                return None
+            self.active = False
+            return PowerEvent(self.kind, False, value, self.threshold, self.extreme)
+        tripped = value > self.threshold if self.above else value < self.threshold
+        if not tripped:
+            return None
+        self.active = True
+        self.extreme = value
+        return PowerEvent(self.kind, True, value, self.threshold, value)
+
+
+class PowerDetector:
+    """Under/over-voltage and overcurrent detection with hysteresis.
+
+    A threshold of 0 (or None) disables that check.
+    """
+
+    def __init__(
+        self,
+        under_voltage: Optional[float] = DEFAULT_UNDER_VOLTAGE,
+        over_voltage: Optional[float] = DEFAULT_OVER_VOLTAGE,
+        over_current: Optional[float] = DEFAULT_OVER_CURRENT,
+        voltage_hysteresis: float = DEFAULT_VOLTAGE_HYSTERESIS,
+        current_hysteresis: float = DEFAULT_CURRENT_HYSTERESIS,
+    ):
+        limits = (
+            (UNDER_VOLTAGE, "voltage", under_voltage, voltage_hysteresis, False),
+            (OVER_VOLTAGE, "voltage", over_voltage, voltage_hysteresis, True),
+            (OVER_CURRENT, "current", over_current, current_hysteresis, True),
+        )
+        self.limits: Dict[str, _Limit] = {
+            kind: _Limit(kind, key, threshold, hysteresis, above)
+            for kind, key, threshold, hysteresis, above in limits
+            if threshold
+        }
+
+    @property
+    def active(self) -> bool:
+        return any(limit.active for limit in self.limits.values())
+
+    def is_active(self, kind: str) -> Optional[bool]:
+        """None when that check is disabled"""
+        limit = self.limits.get(kind)
+        return limit.active if limit else None
+
+    def update(self, data: WattBoxData) -> List[PowerEvent]:
+        """Check one snapshot; returns the alerts that started or cleared"""
+        events = []
+        for limit in self.limits.values():
+            event = limit.check(getattr(data, limit.key))
+            if event is not None:
+                events.append(event)
+        return events
+
+    def as_dict(self) -> Dict[str, Dict[str, Optional[float]]]:
+        return {
+            kind: {"active": limit.active, "threshold": limit.threshold, "extreme": limit.extreme}
+            for kind, limit in self.limits.items()
+        }
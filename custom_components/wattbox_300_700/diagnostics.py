@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+import dataclasses
+from typing import Any
+
+from homeassistant.components.diagnostics import async_redact_data
+from homeassistant.config_entries import ConfigEntry
+from homeassistant.core import HomeAssistant
+
+from .const import DOMAIN, CONF_PASSWORD, CONF_USERNAME
+from .coordinator import WattBoxCoordinator
+
+TO_REDACT = {CONF_PASSWORD, CONF_USERNAME}
+
+
+async def async_get_config_entry_diagnostics(hass: HomeAssistant, entry: ConfigEntry) -> dict[str, Any]:
+    coordinator: WattBoxCoordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
+    interval = coordinator.interval
+    return {
+        "entry": async_redact_data(dict(entry.data), TO_REDACT),
+        "options": async_redact_data(dict(entry.options), TO_REDACT),
+        "last_update_success": coordinator.last_update_success,
+        "poll": {
+            "interval": interval.current,
+            "min": interval.minimum,
+            "base": interval.base,
+            "max": interval.maximum,
+            "consecutive_failures": interval.failures,
+            "last_latency": coordinator.pipeline.latency,
+        },
+        "transport": type(coordinator.client).__name__,
+        "circuit": coordinator.client.breaker.as_dict(),
+        "timeout": round(coordinator.client.timeout, 2),
+        "requests": coordinator.client.metrics.as_dict(),
+        "commands": coordinator.optimistic.as_dict(),
+        "fleet": dataclasses.asdict(coordinator.fleet.stats),
+        "sequence": coordinator.sequencer.progress.as_dict(),
+        "power_budget": coordinator.budget.as_dict() if coordinator.budget is not None else None,
+        "alerts": coordinator.detector.as_dict(),
+        "energy": coordinator.energy.as_dict(),
+        "history": {**coordinator.history.summary(), **coordinator.history.query()},
+        "data": coordinator.data.as_dict() if coordinator.data else None,
+    }
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+# Samples further apart than this are not integrated across (missed polls, restarts)
+DEFAULT_MAX_GAP = 300.0
+# Rolling windows for peak/average power, seconds
+WINDOWS = (300, 3600)
+_BUCKET = 60
+
+
+class EnergyAccumulator:
+    """Trapezoidal kWh integration of power samples with explicit gap handling.
+
+    Peak and time-weighted average power are kept in one-minute buckets
+    covering the longest window, so memory stays constant per device.
+    """
+
+    def __init__(self, max_gap: float = DEFAULT_MAX_GAP):
+        self.max_gap = max_gap
+        self.energy_kwh = 0.0
+        self.last_ts: Optional[float] = None
+        self.last_power: Optional[float] = None
+        # First sample since startup, where a restored state's downtime ends
+        self.first_ts: Optional[float] = None
+        self.gaps = 0
+        self.gap_seconds = 0.0
+        # [minute start, watt-seconds, seconds covered, peak watts]
+        self._buckets: Deque[List[float]] = deque(maxlen=max(WINDOWS) // _BUCKET + 1)
+
+    def add(self, ts: float, power: Optional[float]) -> None:
+        """Feed one sample (wall-clock seconds, watts); None power is skipped"""
+        if power is None:
+            return
+        if self.first_ts is None:
+            self.first_ts = ts
+        last_ts, last_power = self.last_ts, self.last_power
+        if last_ts is not None and last_power is not None:
+            dt = ts - last_ts
+            if dt <= 0 or dt > self.max_gap:
+                # A clock stepped back is a gap too, integration restarts from this sample
+                self.gaps += 1
+                self.gap_seconds += max(dt, 0.0)
+            else:
+                avg = (last_power + power) / 2.0
+                self.energy_kwh += avg * dt / 3_600_000.0
+                bucket = self._bucket(ts)
+                bucket[1] += avg * dt
+                bucket[2] += dt
+        bucket = self._bucket(ts)
+        bucket[3] = max(bucket[3], power)
+        self.last_ts, self.last_power = ts, power
+
+    def _bucket(self, ts: float) -> List[float]:
+        start = ts - ts % _BUCKET
+        buckets = self._buckets
+        if not buckets or buckets[-1][0] != start:
+            buckets.append([start, 0.0, 0.0, 0.0])
+        return buckets[-1]
+
+    def window(self, seconds: int, now: Optional[float] = None) -> Dict[str, Optional[float]]:
+        """Peak and time-weighted average power over the last `seconds`"""
+        now = self.last_ts if now is None else now
+        if now is None:
+            return {"peak": None, "average": None}
+        since = now - seconds
+        ws = covered = 0.0
+        peak: Optional[float] = None
+        for start, b_ws, b_sec, b_peak in self._buckets:
+            if start + _BUCKET <= since:
+                continue
+            ws += b_ws
+            covered += b_sec
+            peak = b_peak if peak is None else max(peak, b_peak)
+        return {"peak": peak, "average": round(ws / covered, 1) if covered else None}
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Compact persisted form"""
+        return {
+            "energy_kwh": self.energy_kwh,
+            "last_ts": self.last_ts,
+            "last_power": self.last_power,
+            "gaps": self.gaps,
+            "gap_seconds": self.gap_seconds,
+            "buckets": [list(b) for b in self._buckets],
+        }
+
+    def restore(self, state: Dict[str, Any]) -> None:
+        """Merge a persisted state in front of whatever was accumulated since startup"""
+        try:
+            self.energy_kwh += float(state.get("energy_kwh") or 0.0)
+            self.gaps += int(state.get("gaps") or 0)
+            self.gap_seconds += float(state.get("gap_seconds") or 0.0)
+            restored_ts = state.get("last_ts")
+            if restored_ts is not None and self.first_ts is not None and self.first_ts > restored_ts:
+                # the downtime itself is a gap
+                self.gaps += 1
+                self.gap_seconds += self.first_ts - restored_ts
+            elif self.last_ts is None:
+                self.last_ts, self.last_power = restored_ts, state.get("last_power")
+            current = list(self._buckets)
+            self._buckets.clear()
+            for b in state.get("buckets") or []:
+                if len(b) == 4 and (not current or b[0] < current[0][0]):
+                    self._buckets.append([float(x) for x in b])
+            self._buckets.extend(current)
+        except (TypeError, ValueError):
+            pass
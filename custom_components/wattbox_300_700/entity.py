@@ -0,0 +1,74 @@
+from __future__ import annotations
+
+from typing import Any, Dict, Optional
+
+from homeassistant.core import callback
+from homeassistant.helpers.dispatcher import async_dispatcher_connect
+from homeassistant.helpers.entity import Entity
+from homeassistant.helpers.update_coordinator import CoordinatorEntity
+
+from .const import DOMAIN, CONF_HOST, CONF_MODEL, CONF_FIRMWARE, DEFAULT_MODEL
+from .coordinator import WattBoxCoordinator
+from .names import names_signal
+from .parser import WattBoxChanges
+
+
+class WattBoxDeviceMixin(Entity):
+    """Entity of one WattBox: its device entry, renamed when the outlet names change.
+
+    Names come from the cache, the device is not asked during setup; a
+    rename is picked up from the next poll.
+    """
+
+    coordinator: WattBoxCoordinator
+
+    @property
+    def device_info(self) -> Dict[str, Any]:
+        data = self.coordinator.entry.data
+        return {
+            "identifiers": {(DOMAIN, data.get(CONF_HOST))},
+            "name": f"WattBox 300/700 ({data.get(CONF_HOST)})",
+            "manufacturer": "Snap One",
+            "model": data.get(CONF_MODEL, DEFAULT_MODEL),
+            "sw_version": data.get(CONF_FIRMWARE),
+        }
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        self.async_on_remove(
+            async_dispatcher_connect(self.hass, names_signal(self.coordinator.entry.entry_id), self._handle_names_update)
+        )
+
+    def _label(self) -> Optional[str]:
+        """Entity name derived from the outlet names; None keeps the current one"""
+        return None
+
+    @callback
+    def _handle_names_update(self) -> None:
+        label = self._label()
+        if label is not None and label != self._attr_name:
+            self._attr_name = label
+            self.async_write_ha_state()
+
+
+class WattBoxEntity(WattBoxDeviceMixin, CoordinatorEntity[WattBoxCoordinator]):
+    """Coordinator entity that only writes state when its own data changed"""
+
+    _last_available: Optional[bool] = None
+    _last_restored: Optional[bool] = None
+
+    def _is_changed(self, changes: WattBoxChanges) -> bool:
+        return bool(changes)
+
+    @callback
+    def _handle_coordinator_update(self) -> None:
+        available = self.available
+        restored = self.coordinator.restored
+        if (
+            available != self._last_available
+            or restored != self._last_restored
+            or self._is_changed(self.coordinator.changes)
+        ):
+            self._last_available = available
+            self._last_restored = restored
+            self.async_write_ha_state()
@@ -0,0 +1,84 @@
+from __future__ import annotations
+
+import asyncio
+import math
+import random
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Callable, Dict, List
+
+# Polls allowed in flight across every WattBox at once
+DEFAULT_FLEET_CONCURRENCY = 8
+# +/- fraction of the interval added to each aligned poll
+JITTER = 0.05
+
+
+@dataclass
+class FleetStats:
+    devices: int = 0
+    in_flight: int = 0
+    peak_in_flight: int = 0
+    polls: int = 0
+    waited: int = 0
+
+
+class FleetScheduler:
+    """Spreads polls of every WattBox evenly over time under one concurrency limit.
+
+    Each device gets a phase slot in [0, 1); its regular polls are aligned to
+    epoch + (m + phase) * interval so 50 PDUs on the same interval fire one
+    after another instead of in the same second. Fast polls (right after a
+    command or change) are not aligned, only gated by the concurrency limit.
+    """
+
+    def __init__(self, concurrency: int = DEFAULT_FLEET_CONCURRENCY):
+        self._sem = asyncio.Semaphore(concurrency)
+        self._epoch = time.monotonic()
+        self._devices: List[str] = []
+        self._phase: Dict[str, float] = {}
+        self.stats = FleetStats()
+
+    def register(self, key: str) -> Callable[[], None]:
+        """Add a device; returns a remover"""
+        if key not in self._devices:
+            self._devices.append(key)
+            self._rebalance()
+
+        def _remove() -> None:
+            if key in self._devices:
+                self._devices.remove(key)
+                self._rebalance()
+
+        return _remove
+
+    def _rebalance(self) -> None:
+        n = len(self._devices)
+        self._phase = {key: i / n for i, key in enumerate(self._devices)}
+        self.stats.devices = n
+
+    def align(self, key: str, interval: float, fast: bool = False) -> float:
+        """Delay until this device's next poll slot, roughly `interval` from now"""
+        if fast or key not in self._phase or interval <= 0:
+            return interval
+        now = time.monotonic()
+        phase = self._phase[key]
+        # first slot at least half an interval away keeps the spacing sane
+        m = math.ceil((now + interval / 2 - self._epoch) / interval - phase)
+        delay = self._epoch + (m + phase) * interval - now
+        return max(0.5, delay + random.uniform(-JITTER, JITTER) * interval)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        """Hold one of the fleet-wide poll slots"""
+        stats = self.stats
+        if self._sem.locked():
+            stats.waited += 1
+        async with self._sem:
+            stats.in_flight += 1
+            stats.polls += 1
+            stats.peak_in_flight = max(stats.peak_in_flight, stats.in_flight)
+            try:
+                yield
+            finally:
+                stats.in_flight -= 1
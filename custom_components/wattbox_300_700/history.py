@@ -0,0 +1,118 @@
+from __future__ import annotations
+
+import math
+from array import array
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from .parser import WattBoxData
+
+# One metric sample per successful poll: about 2.8 hours at the default 10s
+# interval, less while polling fast after commands
+DEFAULT_METRIC_SAMPLES = 1024
+# Outlet transitions are rarer than polls
+DEFAULT_OUTLET_EVENTS = 256
+
+_NAN = float("nan")
+
+
+class RingBuffer:
+    """Fixed-capacity columnar ring buffer over preallocated arrays.
+
+    Each column is an array of one typecode, so memory is allocated once and
+    never grows; the oldest row is overwritten when full.
+    """
+
+    def __init__(self, capacity: int, columns: Sequence[Tuple[str, str]]):
+        if capacity < 1:
+            raise ValueError("capacity must be >= 1")
+        self.capacity = capacity
+        self.names = tuple(name for name, _ in columns)
+        self._cols = [array(code, [0] * capacity) for _, code in columns]
+        self._head = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, *row: float) -> None:
+        head = self._head
+        for col, value in zip(self._cols, row):
+            col[head] = value
+        self._head = (head + 1) % self.capacity
+        if self._size < self.capacity:
+            self._size += 1
+
+    def rows(self) -> Iterator[Tuple[Any, ...]]:
+        """Rows oldest first"""
+        start = (self._head - self._size) % self.capacity
+        cols = self._cols
+        for k in range(self._size):
+            i = (start + k) % self.capacity
+            yield tuple(col[i] for col in cols)
+
+    def clear(self) -> None:
+        self._head = self._size = 0
+
+    @property
+    def nbytes(self) -> int:
+        return sum(col.itemsize * len(col) for col in self._cols)
+
+
+def _opt(value: Optional[float]) -> float:
+    return _NAN if value is None else value
+
+
+def _val(value: float) -> Optional[float]:
+    return None if math.isnan(value) else round(value, 2)
+
+
+class DeviceHistory:
+    """Short-term history of one WattBox: metrics per poll, outlet on/off transitions"""
+
+    def __init__(self, metric_samples: int = DEFAULT_METRIC_SAMPLES, outlet_events: int = DEFAULT_OUTLET_EVENTS):
+        # float32 is plenty for V/A/W; timestamps need doubles
+        self.metrics = RingBuffer(metric_samples, (("ts", "d"), ("voltage", "f"), ("current", "f"), ("power", "f")))
+        self.outlets = RingBuffer(outlet_events, (("ts", "d"), ("outlet", "H"), ("on", "b")))
+        # Last states the device reported, transitions are recorded against these
+        # rather than the coordinator data, which may hold optimistic edits
+        self._states: Optional[Sequence[bool]] = None
+
+    def add(self, ts: float, data: WattBoxData) -> None:
+        """Record one polled snapshot: a metric sample and any outlet transitions"""
+        self.metrics.append(ts, _opt(data.voltage), _opt(data.current), _opt(data.power))
+        self.add_states(ts, data.states)
+
+    def add_states(self, ts: float, states: Sequence[bool]) -> None:
+        """Record outlet transitions only, e.g. from a pushed status line"""
+        last = self._states
+        if last is not None and states is not last and states != last:
+            for i, on in enumerate(states):
+                if i >= len(last) or last[i] != on:
+                    self.outlets.append(ts, i, 1 if on else 0)
+        # Snapshot states are immutable tuples, kept as they are
+        self._states = states if type(states) is tuple else tuple(states)
+
+    def query(self, since: Optional[float] = None) -> Dict[str, List[Dict[str, Any]]]:
+        """Samples and transitions at or after `since` (wall-clock seconds), oldest first"""
+        since = -math.inf if since is None else since
+        metrics = [
+            {"ts": ts, "voltage": _val(v), "current": _val(a), "power": _val(w)}
+            for ts, v, a, w in self.metrics.rows()
+            if ts >= since
+        ]
+        outlets = [
+            {"ts": ts, "outlet": idx + 1, "on": bool(on)}
+            for ts, idx, on in self.outlets.rows()
+            if ts >= since
+        ]
+        return {"metrics": metrics, "outlets": outlets}
+
+    def summary(self) -> Dict[str, Any]:
+        """Sizes for diagnostics"""
+        return {
+            "metric_samples": len(self.metrics),
+            "metric_capacity": self.metrics.capacity,
+            "outlet_events": len(self.outlets),
+            "outlet_capacity": self.outlets.capacity,
+            "bytes": self.metrics.nbytes + self.outlets.nbytes,
+        }
@@ -0,0 +1,91 @@
+from __future__ import annotations
+
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, Optional
+
+# Samples kept per histogram; old ones roll off
+HISTOGRAM_SIZE = 256
+
+
+class RollingHistogram:
+    """The last HISTOGRAM_SIZE samples of one timing, percentiles computed on demand"""
+
+    __slots__ = ("_samples", "count", "last")
+
+    def __init__(self, size: int = HISTOGRAM_SIZE):
+        self._samples: Deque[float] = deque(maxlen=size)
+        self.count = 0
+        self.last: Optional[float] = None
+
+    def add(self, value: float) -> None:
+        self._samples.append(value)
+        self.count += 1
+        self.last = value
+
+    def percentile(self, pct: float) -> Optional[float]:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        k = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+        return ordered[k]
+
+    def as_dict(self, scale: float = 1000.0) -> Dict[str, Any]:
+        """Summary in milliseconds by default"""
+
+        def _fmt(v: Optional[float]) -> Optional[float]:
+            return None if v is None else round(v * scale, 2)
+
+        return {
+            "count": self.count,
+            "last": _fmt(self.last),
+            "p50": _fmt(self.percentile(50)),
+            "p95": _fmt(self.percentile(95)),
+            "p99": _fmt(self.percentile(99)),
+            "max": _fmt(max(self._samples) if self._samples else None),
+        }
+
+
+@dataclass
+class ClientMetrics:
+    """Per-device request timings (seconds) and failure counters"""
+
+    requests: int = 0
+    reused: int = 0
+    connects: int = 0
+    bytes_read: int = 0
+    timeouts: int = 0
+    early_closes: int = 0
+    parse_failures: int = 0
+    pushes: int = 0
+    keepalive: Optional[bool] = None
+    dns: RollingHistogram = field(default_factory=RollingHistogram)
+    connect: RollingHistogram = field(default_factory=RollingHistogram)
+    ttfb: RollingHistogram = field(default_factory=RollingHistogram)
+    body: RollingHistogram = field(default_factory=RollingHistogram)
+    parse: RollingHistogram = field(default_factory=RollingHistogram)
+    # Whole requests including connection setup; timeouts count as the timeout
+    total: RollingHistogram = field(default_factory=RollingHistogram)
+
+    @property
+    def errors(self) -> int:
+        return self.timeouts + self.early_closes + self.parse_failures
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "requests": self.requests,
+            "reused": self.reused,
+            "connects": self.connects,
+            "bytes_read": self.bytes_read,
+            "timeouts": self.timeouts,
+            "early_closes": self.early_closes,
+            "parse_failures": self.parse_failures,
+            "pushes": self.pushes,
+            "keepalive": self.keepalive,
+            "dns_ms": self.dns.as_dict(),
+            "connect_ms": self.connect.as_dict(),
+            "ttfb_ms": self.ttfb.as_dict(),
+            "body_ms": self.body.as_dict(),
+            "parse_ms": self.parse.as_dict(),
+            "total_ms": self.total.as_dict(),
+        }
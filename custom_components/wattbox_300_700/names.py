@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+import logging
+from typing import Sequence, Tuple
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.dispatcher import async_dispatcher_send
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_VERSION = 1
+# Names rarely change; coalesce writes
+SAVE_DELAY = 10
+
+
+def names_signal(entry_id: str) -> str:
+    """Dispatcher signal sent when an entry's outlet names changed"""
+    return f"{DOMAIN}_names_{entry_id}"
+
+
+class OutletNameCache:
+    """Outlet names persisted in HA storage, revalidated from the poll payload.
+
+    Loaded once at setup so entities get their names without a request to the
+    device; every poll that carries different names updates the store and
+    tells the entities to rename themselves.
+    """
+
+    def __init__(self, hass: HomeAssistant, entry_id: str):
+        self.hass = hass
+        self.entry_id = entry_id
+        self.names: Tuple[str, ...] = ()
+        self._store: Store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}.names")
+
+    def name(self, index: int) -> str:
+        """Name of outlet index (0-based), empty when unknown"""
+        return self.names[index] if index < len(self.names) else ""
+
+    async def async_load(self) -> None:
+        try:
+            stored = await self._store.async_load()
+        except Exception as e:
+            _LOGGER.debug("Could not load cached outlet names: %s", e)
+            return
+        if stored and isinstance(stored.get("names"), list):
+            self.names = tuple(str(n) for n in stored["names"])
+
+    @callback
+    def async_update(self, names: Sequence[str]) -> bool:
+        """Take names from a poll; returns True when they changed"""
+        if not names or names is self.names:
+            return False
+        names = tuple(names)
+        if names == self.names:
+            # Same names, keep the polled (interned) tuple
+            self.names = names
+            return False
+        self.names = names
+        self._store.async_delay_save(lambda: {"names": list(self.names)}, SAVE_DELAY)
+        async_dispatcher_send(self.hass, names_signal(self.entry_id))
+        return True
+
+    async def async_remove(self) -> None:
+        await self._store.async_remove()
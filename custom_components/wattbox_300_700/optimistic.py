@@ -0,0 +1,108 @@
+from __future__ import annotations
+
+import asyncio
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+from .metrics import RollingHistogram
+
+# Seconds the device gets to report a switched outlet before it is rolled back
+CONFIRM_TIMEOUT = 15.0
+
+
+@dataclass
+class PendingCommand:
+    """An outlet shown in its requested state until the device confirms it"""
+
+    index: int
+    on: bool
+    previous: bool
+    sent: float
+    deadline: float
+    future: asyncio.Future
+
+
+class OptimisticStates:
+    """Per-outlet pending commands overlaid on polled states.
+
+    Only polls started after a command was sent can confirm it; a command
+    still unconfirmed at its deadline is rolled back to what the device
+    reports. The newest command for an outlet replaces an older one.
+    """
+
+    def __init__(self, timeout: float = CONFIRM_TIMEOUT):
+        self.timeout = timeout
+        self.pending: Dict[int, PendingCommand] = {}
+        # Command sent -> first poll showing it
+        self.latency = RollingHistogram()
+        self.confirmed = 0
+        self.rolled_back = 0
+        self.superseded = 0
+
+    def start(self, index: int, on: bool, previous: bool, now: float, future: asyncio.Future) -> PendingCommand:
+        old = self.pending.get(index)
+        if old is not None and not old.future.done():
+            self.superseded += 1
+            # The older caller is answered by whatever happens to the new command
+            old.future.set_result(None)
+        if old is not None:
+            previous = old.previous
+        cmd = PendingCommand(index, on, previous, now, now + self.timeout, future)
+        self.pending[index] = cmd
+        return cmd
+
+    def overlay(self, states: List[bool]) -> List[bool]:
+        """Polled states with every pending command applied"""
+        if not self.pending:
+            return states
+        out = list(states)
+        for idx, cmd in self.pending.items():
+            if idx < len(out):
+                out[idx] = cmd.on
+        return out
+
+    def reconcile(self, states: List[bool], poll_started: float, now: float) -> Tuple[List[PendingCommand], List[PendingCommand]]:
+        """Settle pending commands against a polled snapshot; returns (confirmed, expired)"""
+        confirmed, expired = [], []
+        for idx, cmd in list(self.pending.items()):
+            if poll_started >= cmd.sent and idx < len(states) and states[idx] == cmd.on:
+                confirmed.append(cmd)
+            elif now >= cmd.deadline:
+                expired.append(cmd)
+            else:
+                continue
+            del self.pending[idx]
+        for cmd in confirmed:
+            self.confirmed += 1
+            self.latency.add(now - cmd.sent)
+            if not cmd.future.done():
+                cmd.future.set_result(True)
+        for cmd in expired:
+            self.fail(cmd)
+        return confirmed, expired
+
+    def fail(self, cmd: PendingCommand) -> None:
+        """Drop a command that was never confirmed or could not be sent.
+
+        The future resolves to False; a send error is raised by the caller
+        that sent the command, never left on a future nobody awaits.
+        """
+        if self.pending.get(cmd.index) is cmd:
+            del self.pending[cmd.index]
+        self.rolled_back += 1
+        if not cmd.future.done():
+            cmd.future.set_result(False)
+
+    def cancel(self) -> None:
+        for cmd in self.pending.values():
+            cmd.future.cancel()
+        self.pending.clear()
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "pending": sorted(i + 1 for i in self.pending),
+            "confirmed": self.confirmed,
+            "rolled_back": self.rolled_back,
+            "superseded": self.superseded,
+            "latency_ms": self.latency.as_dict(),
+        }
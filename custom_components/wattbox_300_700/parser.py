@@ -0,0 +1,452 @@
+from __future__ import annotations
+
+import dataclasses
+import logging
+import sys
+from dataclasses import dataclass, field
+from html import unescape
+from typing import Callable, Dict, FrozenSet, Generic, Hashable, Iterable, List, Optional, Sequence, Tuple, TypeVar
+
+_LOGGER = logging.getLogger(__name__)
+
+# The only tags read from wattbox_info.xml
+INFO_TAGS = frozenset({"outlet_status", "outlet_name", "voltage_value", "current_value", "power_value"})
+# Per-outlet metering, only on some models/firmware: one value per outlet, CSV.
+# The tag names are a guess, no recorded wattbox_info.xml carries them; a
+# device without them simply gets no per-outlet sensors over HTTP
+OUTLET_POWER_TAG = "outlet_power_value"
+OUTLET_CURRENT_TAG = "outlet_current_value"
+OUTLET_TAGS = frozenset({OUTLET_POWER_TAG, OUTLET_CURRENT_TAG})
+_MARKERS = {tag: (f"<{tag}>".encode(), f"</{tag}>".encode()) for tag in INFO_TAGS | OUTLET_TAGS}
+
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class _Interner(Generic[K, V]):
+    """Bounded map from a raw value to its one shared parsed form"""
+
+    def __init__(self, build: Callable[[K], V], limit: int = 1024):
+        self._build = build
+        self._limit = limit
+        self._items: Dict[K, V] = {}
+
+    def __call__(self, key: K) -> V:
+        item = self._items.get(key)
+        if item is None:
+            if len(self._items) >= self._limit:
+                self._items.clear()
+            item = self._items[key] = self._build(key)
+        return item
+
+
+class _StatesCache:
+    """Shared outlet states tuples and their bitmask, found by an equal tuple or by (mask, count).
+
+    The tuples are held here, so a mask is never looked up by an object that
+    has gone away.
+    """
+
+    def __init__(self, limit: int = 4096):
+        self._limit = limit
+        self._by_states: Dict[Tuple[bool, ...], Tuple[Tuple[bool, ...], int]] = {}
+        self._by_mask: Dict[Tuple[int, int], Tuple[bool, ...]] = {}
+
+    def _add(self, states: Tuple[bool, ...], mask: int) -> Tuple[Tuple[bool, ...], int]:
+        if len(self._by_states) >= self._limit:
+            self._by_states.clear()
+            self._by_mask.clear()
+        entry = self._by_states[states] = (states, mask)
+        self._by_mask[(mask, len(states))] = states
+        return entry
+
+    def shared(self, states: Tuple[bool, ...]) -> Tuple[Tuple[bool, ...], int]:
+        """The shared tuple equal to states, with its mask"""
+        entry = self._by_states.get(states)
+        if entry is None:
+            entry = self._add(tuple(bool(on) for on in states), mask_of(states))
+        return entry
+
+    def for_mask(self, mask: int, count: int) -> Tuple[bool, ...]:
+        states = self._by_mask.get((mask, count))
+        if states is None:
+            states = self._add(tuple(bool(mask >> i & 1) for i in range(count)), mask)[0]
+        return states
+
+
+# Every snapshot with the same outlet states / names shares one tuple
+_states = _StatesCache()
+_names = _Interner(lambda names: tuple(sys.intern(n) for n in names))
+
+
+def mask_of(states: Iterable[bool]) -> int:
+    """Outlet states as a bitmask, bit i -> index i"""
+    mask = 0
+    for i, on in enumerate(states):
+        if on:
+            mask |= 1 << i
+    return mask
+
+
+def states_for(mask: int, count: int) -> Tuple[bool, ...]:
+    """The shared states tuple of a bitmask"""
+    return _states.for_mask(mask, count)
+
+
+@dataclass(frozen=True, slots=True)
+class WattBoxData:
+    """One parsed snapshot, index 0 -> outlet 1; immutable, so it is shared rather than copied.
+
+    Outlet states are also kept as a bitmask (`mask`, bit i -> index i) for
+    cheap comparison. Whatever sequences are passed in, states and names end
+    up as tuples interned across snapshots, so an unchanged poll does not
+    hold a copy of them.
+    """
+
+    states: Tuple[bool, ...] = ()
+    names: Tuple[str, ...] = ()
+    voltage: Optional[float] = None
+    current: Optional[float] = None
+    power: Optional[float] = None
+    # Per-outlet W and A, None when the device does not meter outlets
+    outlet_power: Optional[Tuple[Optional[float], ...]] = None
+    outlet_current: Optional[Tuple[Optional[float], ...]] = None
+    mask: int = field(default=0, init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        set_ = object.__setattr__
+        states = self.states
+        shared, mask = _states.shared(states if type(states) is tuple else tuple(states))
+        if shared is not states:
+            set_(self, "states", shared)
+        set_(self, "mask", mask)
+        names = self.names
+        shared = _names(names if type(names) is tuple else tuple(names))
+        if shared is not names:
+            set_(self, "names", shared)
+        if self.outlet_power is not None and type(self.outlet_power) is not tuple:
+            set_(self, "outlet_power", tuple(self.outlet_power))
+        if self.outlet_current is not None and type(self.outlet_current) is not tuple:
+            set_(self, "outlet_current", tuple(self.outlet_current))
+
+    def with_mask(self, mask: int) -> WattBoxData:
+        """Copy with other outlet states, everything else shared"""
+        if mask == self.mask:
+            return self
+        return dataclasses.replace(self, states=states_for(mask, len(self.states)))
+
+    def as_dict(self) -> Dict[str, object]:
+        """Plain JSON-able form, as stored and shown in diagnostics"""
+        return {
+            "states": list(self.states),
+            "names": list(self.names),
+            "voltage": self.voltage,
+            "current": self.current,
+            "power": self.power,
+            "outlet_power": list(self.outlet_power) if self.outlet_power is not None else None,
+            "outlet_current": list(self.outlet_current) if self.outlet_current is not None else None,
+        }
+
+
+METRIC_KEYS = ("voltage", "current", "power")
+OUTLET_METRIC_KEYS = ("outlet_power", "outlet_current")
+
+_EMPTY: FrozenSet = frozenset()
+# Every subset of METRIC_KEYS by bitmask, so a diff does not build one
+_METRIC_SETS = tuple(frozenset(k for i, k in enumerate(METRIC_KEYS) if bits >> i & 1) for bits in range(8))
+
+
+@dataclass(frozen=True, slots=True)
+class WattBoxChanges:
+    """What differs between two snapshots: outlet indices (0-based) and metric keys.
+
+    `metered` holds the outlet indices whose per-outlet power or current changed.
+    """
+
+    outlets: FrozenSet[int] = _EMPTY
+    metrics: FrozenSet[str] = _EMPTY
+    names: bool = False
+    metered: FrozenSet[int] = _EMPTY
+
+    def __bool__(self) -> bool:
+        return bool(self.outlets or self.metrics or self.names or self.metered)
+
+
+_NO_CHANGES = WattBoxChanges()
+# Only device-wide metrics changed, what most polls come down to
+_METRIC_CHANGES = (_NO_CHANGES, *(WattBoxChanges(metrics=keys) for keys in _METRIC_SETS[1:]))
+
+
+def _diff_values(a: Optional[Sequence], b: Optional[Sequence]) -> set:
+    a, b = a or (), b or ()
+    return {i for i in range(max(len(a), len(b))) if i >= len(a) or i >= len(b) or a[i] != b[i]}
+
+
+def diff(old: Optional[WattBoxData], new: WattBoxData) -> WattBoxChanges:
+    """Compare two snapshots; everything counts as changed when there is no old one"""
+    if old is None:
+        everything = frozenset(range(len(new.states)))
+        return WattBoxChanges(everything, frozenset(METRIC_KEYS), True, everything)
+    if old is new:
+        return _NO_CHANGES
+
+    a, b = old.states, new.states
+    if a is b:
+        # Interned: the same tuple whenever the states are equal
+        outlets = _EMPTY
+    else:
+        flipped = old.mask ^ new.mask
+        outlets = frozenset(i for i in range(max(len(a), len(b))) if flipped >> i & 1 or i >= len(a) or i >= len(b))
+    changed_metrics = (old.voltage != new.voltage) | (old.current != new.current) << 1 | (old.power != new.power) << 2
+    metered = _EMPTY
+    if old.outlet_power is not new.outlet_power or old.outlet_current is not new.outlet_current:
+        changed = _diff_values(old.outlet_power, new.outlet_power) | _diff_values(old.outlet_current, new.outlet_current)
+        if changed:
+            metered = frozenset(changed)
+    if not (outlets or metered) and old.names is new.names:
+        return _METRIC_CHANGES[changed_metrics]
+    names = old.names is not new.names and old.names != new.names
+    return WattBoxChanges(outlets, _METRIC_SETS[changed_metrics], names, metered)
+
+
+def _split_csv(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    return [p for p in (part.strip() for part in text.split(",")) if p]
+
+
+def _decode(raw: bytes) -> str:
+    # Tag text never holds markup: that is a body garbled in transit, not a value
+    if b"<" in raw or b">" in raw:
+        raise ValueError(f"markup inside a tag in wattbox_info.xml: {raw[:32]!r}")
+    text = raw.decode("utf-8", "ignore")
+    return unescape(text) if "&" in text else text
+
+
+def _status_mask(text: str) -> Tuple[int, int]:
+    mask = count = 0
+    for part in text.split(","):
+        part = part.strip()
+        if part:
+            if part == "1":
+                mask |= 1 << count
+            elif part != "0":
+                raise ValueError(f"bad outlet state {part[:16]!r}")
+            count += 1
+    return mask, count
+
+
+# Raw tag bytes -> shared tuple: a repeated outlet_status/outlet_name is one
+# lookup, neither decoded nor split again
+_status_tag = _Interner(lambda raw: states_for(*_status_mask(_decode(raw))))
+_names_tag = _Interner(lambda raw: _names(tuple(_split_csv(_decode(raw)))))
+
+
+def _to_int(raw: Optional[bytes]) -> Optional[int]:
+    """An absent or empty tag is None; anything else must be a number"""
+    if raw is None or not raw.strip():
+        return None
+    return int(raw)
+
+
+# Per-outlet readings above these are garbage, not load
+MAX_OUTLET_POWER = 2000.0
+MAX_OUTLET_CURRENT = 20.0
+
+
+def in_range(value: Optional[float], limit: float) -> Optional[float]:
+    return value if value is not None and 0 <= value <= limit else None
+
+
+def scale_values(text: Optional[str], divisor: float, count: int, limit: float) -> Optional[Tuple[Optional[float], ...]]:
+    """Parse, scale and validate a per-outlet CSV in one pass.
+
+    A value that is not a number or lies outside 0..limit becomes None. A list
+    whose length does not match the outlet count is dropped as a whole, its
+    values could not be matched to outlets.
+    """
+    if text is None:
+        return None
+    # Empty parts are skipped like in outlet_status (trailing comma, whitespace)
+    parts = _split_csv(text)
+    if len(parts) != count:
+        _LOGGER.debug("Ignoring per-outlet values for %d outlets, expected %d", len(parts), count)
+        return None
+    out: List[Optional[float]] = []
+    for p in parts:
+        try:
+            v = float(p) / divisor
+        except ValueError:
+            out.append(None)
+            continue
+        out.append(in_range(v, limit))
+    return tuple(out)
+
+
+def _build_layout(
+    outlet_tags: Optional[FrozenSet[str]],
+) -> Tuple[FrozenSet[str], Tuple[Tuple[str, bytes, bytes], ...]]:
+    """Tags required and (tag, open, close) of the tags wanted, for a set of known outlet tags"""
+    wanted = INFO_TAGS | (OUTLET_TAGS if outlet_tags is None else outlet_tags)
+    return INFO_TAGS | (outlet_tags or frozenset()), tuple((tag, *_MARKERS[tag]) for tag in sorted(wanted))
+
+
+# Built once per outlet_tags value rather than per parse
+_layout = _Interner(_build_layout, 8)
+
+
+class InfoParser:
+    """Incremental single-pass scanner for wattbox_info.xml.
+
+    Feed raw body chunks as they arrive; feed() returns True once every wanted
+    tag has been seen so the caller can stop feeding it. Only the text of those
+    tags is decoded, the rest of the document is never touched.
+
+    outlet_tags are the per-outlet metering tags this device is known to send;
+    they are wanted and required like INFO_TAGS. None means not known yet:
+    every tag in OUTLET_TAGS is looked for but none is required.
+    """
+
+    __slots__ = ("_voltage_divisor", "_current_divisor", "_buf", "_required", "_wanted", "_found")
+
+    def __init__(
+        self,
+        voltage_divisor: float = 10.0,
+        current_divisor: float = 10.0,
+        outlet_tags: Optional[FrozenSet[str]] = None,
+    ) -> None:
+        # Firmware reports tenths: 1115 -> 111.5 V, 105 -> 10.5 A
+        self._voltage_divisor = voltage_divisor
+        self._current_divisor = current_divisor
+        self._buf: Optional[bytearray] = None
+        self._required, self._wanted = _layout(outlet_tags)
+        # Raw text of each tag seen, undecoded
+        self._found: Dict[str, bytes] = {}
+
+    @property
+    def outlet_tags(self) -> FrozenSet[str]:
+        """Per-outlet metering tags read so far"""
+        return frozenset(OUTLET_TAGS & self._found.keys())
+
+    @property
+    def done(self) -> bool:
+        return len(self._found) == len(self._wanted)
+
+    def feed(self, chunk: bytes) -> bool:
+        found = self._found
+        if len(found) == len(self._wanted):
+            return True
+        buf = self._buf
+        if buf:
+            buf += chunk
+        else:
+            # Scanned in place; only copied when tags are still missing
+            buf = chunk
+        for tag, open_tag, close_tag in self._wanted:
+            if tag in found:
+                continue
+            start = buf.find(open_tag)
+            if start < 0:
+                continue
+            start += len(open_tag)
+            end = buf.find(close_tag, start)
+            if end < 0:
+                continue
+            raw = buf[start:end]
+            found[tag] = raw if type(raw) is bytes else bytes(raw)
+        if len(found) == len(self._wanted):
+            return True
+        if buf is chunk:
+            self._buf = bytearray(chunk)
+        return False
+
+    def result(self, truncated: bool = False, previous: Optional[WattBoxData] = None) -> WattBoxData:
+        """Build the snapshot from what was read; previous itself when nothing differs from it.
+
+        A body that ended without error may lack optional tags; a body cut off
+        by a read error must have delivered every tag, or the snapshot would
+        report half the metrics as missing.
+        """
+        found = self._found
+        if "outlet_status" not in found:
+            _LOGGER.error("Failed to parse wattbox_info.xml: outlet_status not found (%d bytes)", len(self._buf or b""))
+            raise ValueError("outlet_status not found in XML")
+        if truncated:
+            missing = self._required - found.keys()
+            if missing:
+                raise ValueError(f"wattbox_info.xml cut off before {', '.join(sorted(missing))}")
+        if self._buf and not truncated:
+            # Not every tag was read, so the whole body is buffered: a tag with
+            # only one of its markers left is mangled rather than absent
+            for tag, open_tag, close_tag in self._wanted:
+                if tag not in found and (open_tag in self._buf or close_tag in self._buf):
+                    raise ValueError(f"<{tag}> is mangled in wattbox_info.xml")
+
+        v_raw = _to_int(found.get("voltage_value"))
+        a_raw = _to_int(found.get("current_value"))
+        w_raw = _to_int(found.get("power_value"))     # 600 -> 600 W
+
+        states = _status_tag(found["outlet_status"])
+        names = _names_tag(found.get("outlet_name", b""))
+        voltage = (v_raw / self._voltage_divisor) if v_raw is not None else None
+        current = (a_raw / self._current_divisor) if a_raw is not None else None
+        power = float(w_raw) if w_raw is not None else None
+        # Same units as the device-wide values: whole W, current in divisor steps
+        outlet_power = outlet_current = None
+        if OUTLET_POWER_TAG in found:
+            outlet_power = scale_values(_decode(found[OUTLET_POWER_TAG]), 1.0, len(states), MAX_OUTLET_POWER)
+        if OUTLET_CURRENT_TAG in found:
+            outlet_current = scale_values(
+                _decode(found[OUTLET_CURRENT_TAG]), self._current_divisor, len(states), MAX_OUTLET_CURRENT
+            )
+
+        if (
+            previous is not None
+            and previous.states is states
+            and previous.names is names
+            and previous.voltage == voltage
+            and previous.current == current
+            and previous.power == power
+            and previous.outlet_power == outlet_power
+            and previous.outlet_current == outlet_current
+        ):
+            return previous
+        return WattBoxData(
+            states=states,
+            names=names,
+            voltage=voltage,
+            current=current,
+            power=power,
+            outlet_power=outlet_power,
+            outlet_current=outlet_current,
+        )
+
+
+# Device identity in wattbox_info.xml, read by the setup probe only
+IDENTITY_TAGS = ("hardware_version", "serial_number", "host_name")
+
+
+def read_tags(body: bytes, tags: Iterable[str]) -> Dict[str, str]:
+    """Text of each tag present in a complete body; for one-off reads, not the poll path"""
+    found = {}
+    for tag in tags:
+        open_tag, close_tag = f"<{tag}>".encode(), f"</{tag}>".encode()
+        start = body.find(open_tag)
+        if start < 0:
+            continue
+        start += len(open_tag)
+        end = body.find(close_tag, start)
+        if end < 0:
+            continue
+        text = unescape(body[start:end].decode("utf-8", "ignore")).strip()
+        if text:
+            found[tag] = text
+    return found
+
+
+def parse_info(body: bytes, voltage_divisor: float = 10.0, current_divisor: float = 10.0) -> WattBoxData:
+    """Parse a complete wattbox_info.xml body"""
+    parser = InfoParser(voltage_divisor, current_divisor)
+    parser.feed(body)
+    return parser.result()
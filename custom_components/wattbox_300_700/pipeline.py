@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import dataclasses
+import time
+from typing import List, Optional
+
+from .transport import WattBoxTransport
+from .detection import PowerDetector, PowerEvent
+from .fleet import FleetScheduler
+from .parser import OUTLET_METRIC_KEYS, WattBoxChanges, WattBoxData, diff
+from .scheduler import AdaptiveInterval
+
+# Regular poll interval while the transport pushes outlet changes: a safety
+# check and the source of voltage/current/power readings
+PUSH_FALLBACK_INTERVAL = 120.0
+
+
+class PollPipeline:
+    """One device's poll step: fleet slot, conditional fetch, parse, detect, diff, next delay.
+
+    Free of Home Assistant so the coordinator and the tools/ benchmarks run
+    exactly the same code.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        client: WattBoxTransport,
+        outlets: int,
+        interval: AdaptiveInterval,
+        fleet: FleetScheduler,
+        detector: Optional[PowerDetector] = None,
+    ):
+        self.key = key
+        self.client = client
+        self.outlets = outlets
+        self.interval = interval
+        self.fleet = fleet
+        self.detector = detector
+        # Alerts the last run started or cleared
+        self.events: List[PowerEvent] = []
+        # Last snapshot parsed from the device, before any optimistic edits
+        self.device_data: Optional[WattBoxData] = None
+        # What the last run changed relative to the data it was given
+        self.changes = WattBoxChanges()
+        # Snapshot the config flow's probe already fetched: the first run uses it instead of polling
+        self.preloaded: Optional[WattBoxData] = None
+        self.started = 0.0
+        self.latency = 0.0
+        # Seconds until the next regular poll, already aligned to the fleet
+        self.delay = interval.current
+
+    def pad(self, data: WattBoxData) -> WattBoxData:
+        """Fit a snapshot to the configured outlet count; returned as is when it already does"""
+        n = self.outlets
+        fixes = {}
+        if len(data.states) != n:
+            fixes["states"] = (data.states + (False,) * n)[:n]
+        for key in OUTLET_METRIC_KEYS:
+            values = getattr(data, key)
+            if values is not None and len(values) != n:
+                fixes[key] = (values + (None,) * n)[:n]
+        return dataclasses.replace(data, **fixes) if fixes else data
+
+    def set_interval(self, seconds: float) -> float:
+        fast = seconds < self.interval.base
+        if not fast and self.client.push_active:
+            seconds = max(seconds, PUSH_FALLBACK_INTERVAL)
+        self.delay = self.fleet.align(self.key, seconds, fast=fast)
+        return self.delay
+
+    def apply_push(self, states: List[bool]) -> Optional[WattBoxData]:
+        """Fold pushed outlet states into the device snapshot; None before the first poll"""
+        if self.device_data is None:
+            return None
+        self.device_data = self.pad(dataclasses.replace(self.device_data, states=states))
+        return self.device_data
+
+    def activity(self) -> float:
+        """A command was sent: poll fast until the device settles again"""
+        return self.set_interval(self.interval.activity())
+
+    async def run(self, current: Optional[WattBoxData]) -> WattBoxData:
+        """Poll once; returns `current` itself when nothing changed"""
+        try:
+            async with self.fleet.slot():
+                self.started = time.monotonic()
+                fresh, self.preloaded = self.preloaded, None
+                if fresh is None:
+                    fresh = await self.client.poll()
+                if fresh is None and self.device_data is None:
+                    fresh = await self.client.get_info()
+        except Exception:
+            self.events = []
+            self.set_interval(self.interval.failure())
+            raise
+        self.latency = time.monotonic() - self.started
+
+        if fresh is None:
+            # Payload unchanged: no parse, compare against local edits only
+            fresh = self.device_data
+        else:
+            fresh = self.device_data = self.pad(fresh)
+
+        self.events = self.detector.update(fresh) if self.detector else []
+        self.changes = diff(current, fresh)
+        # Keep polling fast for as long as an alert is active
+        active = self.detector is not None and self.detector.active
+        self.set_interval(self.interval.success(bool(self.changes) or active, self.latency))
+        return fresh if self.changes else current
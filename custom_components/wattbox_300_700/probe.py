@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Dict, Optional
+
+import async_timeout
+
+from .parser import WattBoxData
+
+if TYPE_CHECKING:
+    from .transport import WattBoxTransport
+
+# The config flow waits this long for the device, not the poll timeout
+PROBE_TIMEOUT = 5.0
+# A probe taken by the config flow stands in for the first poll if the entry
+# is set up within this many seconds
+PROBE_MAX_AGE = 60.0
+
+
+@dataclass(frozen=True)
+class DeviceProbe:
+    """What one request tells about a device: a full snapshot plus its identity"""
+
+    data: WattBoxData
+    model: Optional[str] = None
+    firmware: Optional[str] = None
+    serial: Optional[str] = None
+    taken: float = field(default_factory=time.monotonic)
+
+    @property
+    def outlets(self) -> int:
+        return len(self.data.states)
+
+
+async def async_probe(client: WattBoxTransport, timeout: float = PROBE_TIMEOUT) -> DeviceProbe:
+    """Probe a device once; raises WattBoxAuthError on bad credentials"""
+    async with async_timeout.timeout(timeout):
+        probe = await client.probe()
+    if not probe.outlets:
+        raise ValueError(f"{client.host} reported no outlets")
+    return probe
+
+
+class ProbeCache:
+    """Probes of devices being added, by host, handed over to their first refresh"""
+
+    def __init__(self, max_age: float = PROBE_MAX_AGE):
+        self.max_age = max_age
+        self._probes: Dict[str, DeviceProbe] = {}
+
+    def put(self, host: str, probe: DeviceProbe) -> None:
+        self._probes[host] = probe
+
+    def take(self, host: str) -> Optional[DeviceProbe]:
+        """The probe of host if still fresh; each probe is handed out once"""
+        probe = self._probes.pop(host, None)
+        if probe is None or time.monotonic() - probe.taken > self.max_age:
+            return None
+        return probe
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+# Never poll faster than this many times the device's own response time
+LATENCY_FACTOR = 5.0
+
+
+class AdaptiveInterval:
+    """Poll interval that speeds up on activity and backs off when idle or failing.
+
+    - a command or an observed change drops to `minimum`
+    - unchanged polls ramp back to `base`, then after `idle_polls` more
+      keep doubling up to `maximum`
+    - failures back off exponentially from `base` up to `maximum`
+    """
+
+    def __init__(self, base: float, minimum: float, maximum: float, idle_polls: int = 3, factor: float = 2.0):
+        self.minimum = max(0.5, float(minimum))
+        self.maximum = max(self.minimum, float(maximum))
+        self.base = min(max(float(base), self.minimum), self.maximum)
+        self.idle_polls = idle_polls
+        self.factor = factor
+        self.current = self.base
+        self._idle = 0
+        self.failures = 0
+
+    def activity(self) -> float:
+        """A command was sent or a change seen: poll fast"""
+        self._idle = 0
+        self.current = self.minimum
+        return self.current
+
+    def success(self, changed: bool, latency: float = 0.0) -> float:
+        self.failures = 0
+        if changed:
+            self.activity()
+        elif self.current < self.base:
+            self.current = min(self.current * self.factor, self.base)
+        else:
+            self._idle += 1
+            if self._idle > self.idle_polls:
+                self.current = min(self.current * self.factor, self.maximum)
+        # Slow devices get proportionally more breathing room
+        self.current = min(max(self.current, latency * LATENCY_FACTOR), self.maximum)
+        return self.current
+
+    def failure(self) -> float:
+        self.failures += 1
+        self._idle = 0
+        self.current = min(max(self.current, self.base) * self.factor, self.maximum)
+        return self.current
@@ -1,75 +1,319 @@
 from __future__ import annotations
 
 import logging
-from datetime import timedelta
-from typing import Any, Optional
+from typing import Any
 
-from homeassistant.components.sensor import SensorEntity
+from homeassistant.components.sensor import SensorDeviceClass, SensorEntity, SensorStateClass
 from homeassistant.config_entries import ConfigEntry
-from homeassistant.core import HomeAssistant
-from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, UpdateFailed
+from homeassistant.const import EntityCategory
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.restore_state import ExtraStoredData, RestoreEntity
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 
-from .const import DOMAIN, CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL
-from .api import WattBoxHTTPClient
+from .const import DOMAIN
+from .coordinator import WattBoxCoordinator
+from .energy import WINDOWS
+from .entity import WattBoxEntity
+from .parser import WattBoxChanges
 
 _LOGGER = logging.getLogger(__name__)
 
+# Per-outlet metrics: WattBoxData attribute, unit, device class
+OUTLET_METRICS = (
+    ("outlet_power", "W", SensorDeviceClass.POWER),
+    ("outlet_current", "A", SensorDeviceClass.CURRENT),
+)
 
-async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, add_entities: AddEntitiesCallback) -> None:
-    client: WattBoxHTTPClient = hass.data[DOMAIN][entry.entry_id]["client"]
-    scan_interval = entry.options.get(CONF_SCAN_INTERVAL, entry.data.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL))
-
-    async def _update() -> dict[str, Optional[float]]:
-        try:
-            return await client.get_metrics()
-        except Exception as e:
-            _LOGGER.warning("WattBox metrics poll failed: %s", e)
-            raise UpdateFailed(str(e)) from e
-
-    coordinator = DataUpdateCoordinator(
-        hass,
-        _LOGGER,
-        name="wattbox_300_700_sensor",
-        update_method=_update,
-        update_interval=timedelta(seconds=scan_interval),
-    )
 
-    try:
-        await coordinator.async_config_entry_first_refresh()
-    except Exception as e:
-        _LOGGER.warning("Initial metrics refresh failed, continuing: %s", e)
-        coordinator.async_set_updated_data({"voltage": None, "current": None, "power": None})
+async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, add_entities: AddEntitiesCallback) -> None:
+    coordinator: WattBoxCoordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
 
     add_entities(
         [
             WBMetricSensor(coordinator, entry, "Voltage", "voltage", "V"),
             WBMetricSensor(coordinator, entry, "Current", "current", "A"),
             WBMetricSensor(coordinator, entry, "Power", "power", "W"),
-        ],
-        True,
+            WBEnergySensor(coordinator, entry),
+            WBPollIntervalSensor(coordinator, entry),
+            WBResponseTimeSensor(coordinator, entry),
+            WBRequestErrorsSensor(coordinator, entry),
+            WBCommandLatencySensor(coordinator, entry),
+            WBSequenceSensor(coordinator, entry),
+        ]
     )
 
+    # Per-outlet sensors only for what the device meters, which the first poll
+    # (or the restored snapshot) tells
+    added: set[str] = set()
+
+    @callback
+    def _add_outlet_sensors() -> None:
+        data = coordinator.data
+        entities = []
+        for key, unit, device_class in OUTLET_METRICS:
+            if key in added or data is None or getattr(data, key) is None:
+                continue
+            added.add(key)
+            entities += [
+                WBOutletMetricSensor(coordinator, entry, i + 1, key, unit, device_class) for i in range(coordinator.outlets)
+            ]
+        if entities:
+            add_entities(entities)
+
+    _add_outlet_sensors()
+    entry.async_on_unload(coordinator.async_add_listener(_add_outlet_sensors))
+
 
-class WBMetricSensor(SensorEntity):
-    def __init__(self, coordinator: DataUpdateCoordinator, entry: ConfigEntry, name: str, key: str, unit: str):
-        self.coordinator = coordinator
+class WBMetricSensor(WattBoxEntity, SensorEntity):
+    def __init__(self, coordinator: WattBoxCoordinator, entry: ConfigEntry, name: str, key: str, unit: str):
+        super().__init__(coordinator)
         self._entry = entry
         self._key = key
         self._attr_name = f"WattBox {name}"
         self._attr_native_unit_of_measurement = unit
         self._attr_unique_id = f"wb_300_700_{entry.data.get('host')}_{key}"
-        self._attr_device_info = {
-            "identifiers": {(DOMAIN, entry.data.get("host"))},
-            "name": f"WattBox 300/700 ({entry.data.get('host')})",
-            "manufacturer": "Snap One",
-            "model": "WattBox 300/700",
+
+    def _is_changed(self, changes: WattBoxChanges) -> bool:
+        return self._key in changes.metrics
+
+    @property
+    def native_value(self) -> Any:
+        data = self.coordinator.data
+        return getattr(data, self._key, None) if data else None
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any] | None:
+        return {"restored": True} if self.coordinator.restored else None
+
+
+class WBOutletMetricSensor(WattBoxEntity, SensorEntity):
+    """Power or current of one outlet, on models that meter outlets"""
+
+    _attr_state_class = SensorStateClass.MEASUREMENT
+
+    def __init__(
+        self,
+        coordinator: WattBoxCoordinator,
+        entry: ConfigEntry,
+        outlet: int,
+        key: str,
+        unit: str,
+        device_class: SensorDeviceClass,
+    ):
+        super().__init__(coordinator)
+        self._outlet = outlet
+        self._key = key
+        self._attr_native_unit_of_measurement = unit
+        self._attr_device_class = device_class
+        self._attr_name = self._label()
+        self._attr_unique_id = f"wb_300_700_{entry.data.get('host')}_{key.replace('outlet', f'outlet_{outlet}')}"
+
+    def _label(self) -> str:
+        name = self.coordinator.names.name(self._outlet - 1)
+        what = "Power" if self._key == "outlet_power" else "Current"
+        return f"{self._outlet} - {name} {what}" if name else f"WattBox Outlet {self._outlet} {what}"
+
+    def _is_changed(self, changes: WattBoxChanges) -> bool:
+        return (self._outlet - 1) in changes.metered
+
+    @property
+    def native_value(self) -> Any:
+        data = self.coordinator.data
+        values = getattr(data, self._key, None) if data else None
+        idx = self._outlet - 1
+        return values[idx] if values is not None and idx < len(values) else None
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any] | None:
+        return {"restored": True} if self.coordinator.restored else None
+
+
+class EnergyStoredData(ExtraStoredData):
+    """Persisted EnergyAccumulator state"""
+
+    def __init__(self, state: dict[str, Any]):
+        self.state = state
+
+    def as_dict(self) -> dict[str, Any]:
+        return self.state
+
+
+class WBEnergySensor(WattBoxEntity, SensorEntity, RestoreEntity):
+    """kWh integrated from the power samples of every poll, with rolling peak/average power"""
+
+    _attr_device_class = SensorDeviceClass.ENERGY
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+    _attr_native_unit_of_measurement = "kWh"
+
+    def __init__(self, coordinator: WattBoxCoordinator, entry: ConfigEntry):
+        super().__init__(coordinator)
+        self._attr_name = "WattBox Energy"
+        self._attr_unique_id = f"wb_300_700_{entry.data.get('host')}_energy"
+        self._written: Any = None
+
+    async def async_added_to_hass(self) -> None:
+        await super().async_added_to_hass()
+        last = await self.async_get_last_extra_data()
+        if last is not None:
+            self.coordinator.energy.restore(last.as_dict())
+
+    @property
+    def extra_restore_state_data(self) -> EnergyStoredData:
+        return EnergyStoredData(self.coordinator.energy.as_dict())
+
+    @property
+    def native_value(self) -> Any:
+        return round(self.coordinator.energy.energy_kwh, 3)
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:
+        energy = self.coordinator.energy
+        attrs: dict[str, Any] = {"gaps": energy.gaps}
+        for seconds in WINDOWS:
+            w = energy.window(seconds)
+            label = f"{seconds // 60}m" if seconds < 3600 else f"{seconds // 3600}h"
+            attrs[f"peak_power_{label}"] = w["peak"]
+            attrs[f"average_power_{label}"] = w["average"]
+        return attrs
+
+    def _is_changed(self, changes: WattBoxChanges) -> bool:
+        # Energy keeps growing on unchanged payloads, so compare what is shown
+        value = self.native_value
+        if value == self._written:
+            return False
+        self._written = value
+        return True
+
+
+class WBDiagnosticSensor(WattBoxEntity, SensorEntity):
+    """Diagnostic value read from the coordinator/client on every update"""
+
+    _attr_entity_category = EntityCategory.DIAGNOSTIC
+
+    def __init__(self, coordinator: WattBoxCoordinator, entry: ConfigEntry, name: str, key: str):
+        super().__init__(coordinator)
+        self._attr_name = f"WattBox {name}"
+        self._attr_unique_id = f"wb_300_700_{entry.data.get('host')}_{key}"
+        self._attr_native_value = self._value()
+
+    def _value(self) -> Any:
+        raise NotImplementedError
+
+    @property
+    def available(self) -> bool:
+        # Still meaningful while the device is failing and backing off
+        return True
+
+    def _is_changed(self, changes: WattBoxChanges) -> bool:
+        value = self._value()
+        if value == self._attr_native_value:
+            return False
+        self._attr_native_value = value
+        return True
+
+
+class WBPollIntervalSensor(WBDiagnosticSensor):
+    """Current adaptive poll interval in seconds"""
+
+    _attr_native_unit_of_measurement = "s"
+
+    def __init__(self, coordinator: WattBoxCoordinator, entry: ConfigEntry):
+        super().__init__(coordinator, entry, "Poll Interval", "poll_interval")
+
+    def _value(self) -> Any:
+        return round(self.coordinator.interval.current, 1)
+
+
+class WBResponseTimeSensor(WBDiagnosticSensor):
+    """Median time to first byte of recent requests, ms"""
+
+    _attr_native_unit_of_measurement = "ms"
+
+    def __init__(self, coordinator: WattBoxCoordinator, entry: ConfigEntry):
+        super().__init__(coordinator, entry, "Response Time", "response_time")
+
+    def _value(self) -> Any:
+        p50 = self.coordinator.client.metrics.ttfb.percentile(50)
+        return None if p50 is None else round(p50 * 1000)
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:
+        ttfb = self.coordinator.client.metrics.ttfb.as_dict()
+        return {"p95": ttfb["p95"], "p99": ttfb["p99"]}
+
+
+class WBRequestErrorsSensor(WBDiagnosticSensor):
+    """Timeouts, early closes and parse failures since startup"""
+
+    _attr_state_class = SensorStateClass.TOTAL_INCREASING
+
+    def __init__(self, coordinator: WattBoxCoordinator, entry: ConfigEntry):
+        super().__init__(coordinator, entry, "Request Errors", "request_errors")
+
+    def _value(self) -> Any:
+        return self.coordinator.client.metrics.errors
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:
+        m = self.coordinator.client.metrics
+        return {"timeouts": m.timeouts, "early_closes": m.early_closes, "parse_failures": m.parse_failures}
+
+
+class WBCommandLatencySensor(WBDiagnosticSensor):
+    """Median time from a switch command to the poll that confirmed it, ms"""
+
+    _attr_native_unit_of_measurement = "ms"
+
+    def __init__(self, coordinator: WattBoxCoordinator, entry: ConfigEntry):
+        super().__init__(coordinator, entry, "Command Latency", "command_latency")
+
+    def _value(self) -> Any:
+        p50 = self.coordinator.optimistic.latency.percentile(50)
+        return None if p50 is None else round(p50 * 1000)
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:
+        optimistic = self.coordinator.optimistic
+        latency = optimistic.latency.as_dict()
+        return {
+            "p95": latency["p95"],
+            "max": latency["max"],
+            "confirmed": optimistic.confirmed,
+            "rolled_back": optimistic.rolled_back,
         }
 
+
+class WBSequenceSensor(WattBoxEntity, SensorEntity):
+    """State of the outlet sequence: idle, running, done, cancelled or failed, with its progress"""
+
+    _attr_icon = "mdi:format-list-numbered"
+
+    def __init__(self, coordinator: WattBoxCoordinator, entry: ConfigEntry):
+        super().__init__(coordinator)
+        self._attr_name = "WattBox Sequence"
+        self._attr_unique_id = f"wb_300_700_{entry.data.get('host')}_sequence"
+        self._written: Any = None
+
+    @property
+    def available(self) -> bool:
+        # A sequence can be followed and cancelled while polls fail
+        return True
+
     @property
     def native_value(self) -> Any:
-        data = self.coordinator.data or {}
-        return data.get(self._key)
+        return self.coordinator.sequencer.progress.status
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any]:
+        attrs = self.coordinator.sequencer.progress.as_dict()
+        del attrs["status"]
+        if self.coordinator.budget is not None:
+            attrs["power_budget"] = self.coordinator.budget.as_dict()
+        return attrs
 
-    async def async_update(self) -> None:
-        await self.coordinator.async_request_refresh()
+    def _is_changed(self, changes: WattBoxChanges) -> bool:
+        shown = self.coordinator.sequencer.progress.as_dict()
+        if shown == self._written:
+            return False
+        self._written = shown
+        return True
@@ -0,0 +1,304 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .const import DEFAULT_SEQUENCE_DELAY
+from .parser import WattBoxData
+
+_LOGGER = logging.getLogger(__name__)
+
+# Assumed draw of an outlet nothing is known about, W
+DEFAULT_OUTLET_LOAD = 100.0
+# A reservation is dropped by the first poll after it, or at the latest after this
+RESERVATION_HOLD = 30.0
+# Longest a switch-on waits for room in the power budget before the sequence fails
+BUDGET_TIMEOUT = 120.0
+
+ACTION_ON = "on"
+ACTION_OFF = "off"
+ACTION_RESET = "reset"
+SEQUENCE_ACTIONS = (ACTION_ON, ACTION_OFF, ACTION_RESET)
+
+IDLE = "idle"
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+# Switch these outlet indices (0-based) on or off and wait until they are
+SwitchOutlets = Callable[[List[int], bool], Awaitable[None]]
+# Reset these outlet indices (0-based) on the device and wait until they are back on
+ResetOutlets = Callable[[List[int]], Awaitable[None]]
+
+
+class BudgetExceeded(Exception):
+    """No room in the fleet power budget within BUDGET_TIMEOUT"""
+
+
+@dataclass
+class _Reservation:
+    key: str
+    watts: float
+    since: float
+    expires: float
+
+
+class FleetPowerBudget:
+    """Fleet-wide cap on power, counting loads just switched on.
+
+    Every device reports its live power after each poll. A switch-on first
+    reserves its estimated load and waits while live power plus the other
+    reservations would exceed the limit; the reservation lasts until a poll
+    of that device started after it (the load is then part of the live
+    reading) or RESERVATION_HOLD. Each entry may set a limit, the smallest
+    one applies; without any, nothing ever waits.
+    """
+
+    def __init__(self, hold: float = RESERVATION_HOLD):
+        self.hold = hold
+        self._limits: Dict[str, float] = {}
+        self._power: Dict[str, float] = {}
+        self._reserved: List[_Reservation] = []
+        self._changed = asyncio.Event()
+        self.waits = 0
+
+    @property
+    def limit(self) -> Optional[float]:
+        return min(self._limits.values()) if self._limits else None
+
+    def set_limit(self, key: str, limit: Optional[float]) -> Callable[[], None]:
+        """Limit in W from one entry, None or 0 for none; returns a remover of the device"""
+        if limit:
+            self._limits[key] = float(limit)
+        else:
+            self._limits.pop(key, None)
+
+        def _remove() -> None:
+            self._limits.pop(key, None)
+            self._power.pop(key, None)
+            self._reserved = [r for r in self._reserved if r.key != key]
+            self._changed.set()
+
+        return _remove
+
+    @property
+    def load(self) -> float:
+        """Live fleet power plus what is reserved"""
+        return sum(self._power.values()) + sum(r.watts for r in self._reserved)
+
+    def report(self, key: str, power: Optional[float], polled_at: float) -> None:
+        """Live power of a device from a poll started at polled_at"""
+        self._power[key] = power or 0.0
+        self._reserved = [r for r in self._reserved if r.key != key or r.since > polled_at]
+        self._changed.set()
+
+    def _expire(self, now: float) -> None:
+        self._reserved = [r for r in self._reserved if r.expires > now]
+
+    async def reserve(self, key: str, watts: float, timeout: float = BUDGET_TIMEOUT) -> float:
+        """Wait for room for `watts` more and reserve it; returns the seconds waited"""
+        started = now = time.monotonic()
+        while True:
+            self._expire(now)
+            limit = self.limit
+            if limit is None or self.load + watts <= limit:
+                break
+            if now - started >= timeout:
+                raise BudgetExceeded(f"no room for {watts:.0f} W within {limit:.0f} W after {timeout:.0f}s")
+            if now == started:
+                self.waits += 1
+            # Woken by a poll or a removed device, else by the next expiry
+            wake = min([r.expires for r in self._reserved] + [started + timeout]) - now
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), max(0.01, wake))
+            except asyncio.TimeoutError:
+                pass
+            now = time.monotonic()
+        now = time.monotonic()
+        self._reserved.append(_Reservation(key, watts, now, now + self.hold))
+        return now - started
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "power": round(sum(self._power.values()), 1),
+            "reserved": round(sum(r.watts for r in self._reserved), 1),
+            "waits": self.waits,
+        }
+
+
+def estimate_load(data: Optional[WattBoxData], index: int, learned: Dict[int, float]) -> float:
+    """Watts outlet index will likely draw once on.
+
+    Its last metered draw when known, else the average of the outlets on
+    right now, else DEFAULT_OUTLET_LOAD.
+    """
+    if index in learned:
+        return learned[index]
+    if data is not None and data.power:
+        on = sum(data.states)
+        if on:
+            return data.power / on
+    return DEFAULT_OUTLET_LOAD
+
+
+@dataclass(frozen=True)
+class SequenceStep:
+    """Outlets (0-based) switched together, then `delay` seconds before the next step.
+
+    A reset step has the device itself power the outlets off and back on, so
+    they come back even when the sequence never gets to finish.
+    """
+
+    outlets: Tuple[int, ...]
+    on: bool
+    delay: float = 0.0
+    reset: bool = False
+
+
+def build_plan(
+    action: str,
+    outlets: Sequence[int],
+    delay: float = DEFAULT_SEQUENCE_DELAY,
+    delays: Optional[Dict[int, float]] = None,
+) -> List[SequenceStep]:
+    """Steps for an action on outlets (0-based) in the given order.
+
+    Outlets go on one at a time, each followed by its own delay from `delays`
+    or `delay`. Off needs no spacing unless a delay is given per outlet. A
+    reset resets the outlets one at a time with the device's own reset, never
+    by switching them off from here: an outlet feeding the network or Home
+    Assistant itself must not be left off when the sequence stops halfway.
+    """
+    delays = delays or {}
+    if action == ACTION_OFF:
+        if not delays:
+            return [SequenceStep(tuple(outlets), False)]
+        return [SequenceStep((i,), False, delays.get(i, delay)) for i in outlets]
+    reset = action == ACTION_RESET
+    steps = [SequenceStep((i,), True, delays.get(i, delay), reset) for i in outlets]
+    if steps:
+        # Nothing follows the last outlet
+        last = steps[-1]
+        steps[-1] = SequenceStep(last.outlets, last.on, 0.0, last.reset)
+    return steps
+
+
+@dataclass
+class SequenceProgress:
+    status: str = IDLE
+    action: Optional[str] = None
+    total: int = 0
+    done: int = 0
+    # Outlet numbers (1-based) of the step in progress
+    current: List[int] = field(default_factory=list)
+    started: Optional[float] = None
+    elapsed: float = 0.0
+    budget_wait: float = 0.0
+    error: Optional[str] = None
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "status": self.status,
+            "action": self.action,
+            "progress": f"{self.done}/{self.total}",
+            "current": list(self.current),
+            "elapsed": round(self.elapsed, 1),
+            "budget_wait": round(self.budget_wait, 1),
+            "error": self.error,
+        }
+
+
+class PowerSequencer:
+    """Runs one outlet sequence at a time for a device, in a single task.
+
+    Steps switch their outlets through `switch`, or reset them through `reset`
+    (both wait until the device confirms them); every switch-on and reset
+    first reserves its estimated load in the fleet budget. on_progress is
+    called after every change of `progress`.
+    """
+
+    def __init__(
+        self,
+        key: str,
+        switch: SwitchOutlets,
+        budget: Optional[FleetPowerBudget] = None,
+        estimate: Callable[[int], float] = lambda index: DEFAULT_OUTLET_LOAD,
+        on_progress: Callable[[], None] = lambda: None,
+        reset: Optional[ResetOutlets] = None,
+    ):
+        self._key = key
+        self._switch = switch
+        self._reset = reset
+        self._budget = budget
+        self._estimate = estimate
+        self._on_progress = on_progress
+        self._task: Optional[asyncio.Task] = None
+        self.progress = SequenceProgress()
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def start(self, action: str, steps: Iterable[SequenceStep]) -> asyncio.Task:
+        """Start a sequence; one already running is cancelled first"""
+        self.cancel()
+        steps = list(steps)
+        self.progress = SequenceProgress(
+            status=RUNNING,
+            action=action,
+            total=sum(len(s.outlets) for s in steps),
+            started=time.monotonic(),
+        )
+        self._notify()
+        self._task = asyncio.create_task(self._run(self.progress, steps))
+        return self._task
+
+    def cancel(self) -> bool:
+        """Stop the running sequence after its current step; False when none runs"""
+        if not self.running:
+            return False
+        self._task.cancel()
+        return True
+
+    def _notify(self) -> None:
+        try:
+            self._on_progress()
+        except Exception:
+            _LOGGER.exception("Sequence progress listener failed")
+
+    async def _run(self, progress: SequenceProgress, steps: List[SequenceStep]) -> SequenceProgress:
+        try:
+            for step in steps:
+                progress.current = [i + 1 for i in step.outlets]
+                self._notify()
+                if step.on and self._budget is not None:
+                    for i in step.outlets:
+                        progress.budget_wait += await self._budget.reserve(self._key, self._estimate(i))
+                if step.reset:
+                    if self._reset is None:
+                        raise RuntimeError("this sequencer cannot reset outlets")
+                    await self._reset(list(step.outlets))
+                else:
+                    await self._switch(list(step.outlets), step.on)
+                progress.done += len(step.outlets)
+                progress.elapsed = time.monotonic() - progress.started
+                self._notify()
+                if step.delay > 0:
+                    await asyncio.sleep(step.delay)
+            progress.status = DONE
+        except asyncio.CancelledError:
+            progress.status = CANCELLED
+        except Exception as e:
+            progress.status = FAILED
+            progress.error = str(e) or type(e).__name__
+            _LOGGER.warning("%s: %s sequence stopped at outlets %s: %s", self._key, progress.action, progress.current, e)
+        progress.current = []
+        progress.elapsed = time.monotonic() - progress.started
+        self._notify()
+        return progress
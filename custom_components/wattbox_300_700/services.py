@@ -0,0 +1,128 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+import voluptuous as vol
+
+from homeassistant.core import HomeAssistant, ServiceCall, ServiceResponse, SupportsResponse
+from homeassistant.exceptions import HomeAssistantError, ServiceValidationError
+from homeassistant.helpers import config_validation as cv, device_registry as dr
+
+from .const import (
+    DOMAIN,
+    CONF_SEQUENCE_DELAY,
+    DEFAULT_SEQUENCE_DELAY,
+    SERVICE_SET_OUTLETS,
+    SERVICE_GET_HISTORY,
+    SERVICE_SEQUENCE_OUTLETS,
+    SERVICE_CANCEL_SEQUENCE,
+    ATTR_ACTION,
+    ATTR_DELAY,
+    ATTR_DEVICE_ID,
+    ATTR_OUTLET,
+    ATTR_OUTLETS,
+    ATTR_SECONDS,
+)
+from .sequencer import SEQUENCE_ACTIONS, build_plan
+
+SET_OUTLETS_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_DEVICE_ID): cv.string,
+        vol.Required(ATTR_OUTLETS): {vol.All(vol.Coerce(int), vol.Range(min=1)): cv.boolean},
+    }
+)
+
+GET_HISTORY_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_DEVICE_ID): cv.string,
+        vol.Optional(ATTR_SECONDS): vol.All(vol.Coerce(float), vol.Range(min=0)),
+    }
+)
+
+_OUTLET_NUMBER = vol.All(vol.Coerce(int), vol.Range(min=1))
+_DELAY = vol.All(vol.Coerce(float), vol.Range(min=0, max=600))
+
+SEQUENCE_OUTLETS_SCHEMA = vol.Schema(
+    {
+        vol.Required(ATTR_DEVICE_ID): cv.string,
+        vol.Required(ATTR_ACTION): vol.In(SEQUENCE_ACTIONS),
+        # In order; an outlet may carry its own delay: [1, {"outlet": 3, "delay": 10}, 2]
+        vol.Optional(ATTR_OUTLETS): [
+            vol.Any(_OUTLET_NUMBER, {vol.Required(ATTR_OUTLET): _OUTLET_NUMBER, vol.Optional(ATTR_DELAY): _DELAY})
+        ],
+        vol.Optional(ATTR_DELAY): _DELAY,
+    }
+)
+
+DEVICE_SCHEMA = vol.Schema({vol.Required(ATTR_DEVICE_ID): cv.string})
+
+
+def _entry_data(hass: HomeAssistant, device_id: str) -> dict:
+    """hass.data entry for the config entry that owns a device"""
+    device = dr.async_get(hass).async_get(device_id)
+    if device is not None:
+        for entry_id in device.config_entries:
+            if entry_id in hass.data.get(DOMAIN, {}):
+                return hass.data[DOMAIN][entry_id]
+    raise HomeAssistantError(f"No loaded WattBox for device {device_id}")
+
+
+def _check_outlet(coordinator, outlet: int) -> int:
+    """Index (0-based) of an outlet number the WattBox has"""
+    if outlet > coordinator.outlets:
+        raise ServiceValidationError(f"Outlet {outlet} does not exist, the WattBox has {coordinator.outlets}")
+    return outlet - 1
+
+
+async def async_setup_services(hass: HomeAssistant) -> None:
+    if hass.services.has_service(DOMAIN, SERVICE_SET_OUTLETS):
+        return
+
+    async def _set_outlets(call: ServiceCall) -> None:
+        coordinator = _entry_data(hass, call.data[ATTR_DEVICE_ID])["coordinator"]
+        wanted = {_check_outlet(coordinator, outlet): on for outlet, on in call.data[ATTR_OUTLETS].items()}
+        # Shown at once like a switch; the client sends them as one batch and
+        # each waits until a poll confirms it
+        await asyncio.gather(*(coordinator.async_switch_outlet(i, on) for i, on in wanted.items()))
+
+    async def _get_history(call: ServiceCall) -> ServiceResponse:
+        data = _entry_data(hass, call.data[ATTR_DEVICE_ID])
+        seconds = call.data.get(ATTR_SECONDS)
+        since = time.time() - seconds if seconds is not None else None
+        return data["coordinator"].history.query(since)
+
+    async def _sequence_outlets(call: ServiceCall) -> None:
+        coordinator = _entry_data(hass, call.data[ATTR_DEVICE_ID])["coordinator"]
+        order, delays = [], {}
+        for item in call.data.get(ATTR_OUTLETS) or range(1, coordinator.outlets + 1):
+            outlet = item[ATTR_OUTLET] if isinstance(item, dict) else item
+            order.append(_check_outlet(coordinator, outlet))
+            if isinstance(item, dict) and ATTR_DELAY in item:
+                delays[outlet - 1] = item[ATTR_DELAY]
+        delay = call.data.get(ATTR_DELAY, coordinator.entry.data.get(CONF_SEQUENCE_DELAY, DEFAULT_SEQUENCE_DELAY))
+        action = call.data[ATTR_ACTION]
+        # Runs in the background; progress is on the sequence sensor
+        coordinator.sequencer.start(action, build_plan(action, order, delay, delays))
+
+    async def _cancel_sequence(call: ServiceCall) -> None:
+        _entry_data(hass, call.data[ATTR_DEVICE_ID])["coordinator"].sequencer.cancel()
+
+    hass.services.async_register(DOMAIN, SERVICE_SET_OUTLETS, _set_outlets, schema=SET_OUTLETS_SCHEMA)
+    hass.services.async_register(DOMAIN, SERVICE_SEQUENCE_OUTLETS, _sequence_outlets, schema=SEQUENCE_OUTLETS_SCHEMA)
+    hass.services.async_register(DOMAIN, SERVICE_CANCEL_SEQUENCE, _cancel_sequence, schema=DEVICE_SCHEMA)
+    hass.services.async_register(
+        DOMAIN,
+        SERVICE_GET_HISTORY,
+        _get_history,
+        schema=GET_HISTORY_SCHEMA,
+        supports_response=SupportsResponse.ONLY,
+    )
+
+
+async def async_unload_services(hass: HomeAssistant) -> None:
+    if not hass.data.get(DOMAIN):
+        hass.services.async_remove(DOMAIN, SERVICE_SET_OUTLETS)
+        hass.services.async_remove(DOMAIN, SERVICE_GET_HISTORY)
+        hass.services.async_remove(DOMAIN, SERVICE_SEQUENCE_OUTLETS)
+        hass.services.async_remove(DOMAIN, SERVICE_CANCEL_SEQUENCE)
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+import logging
+from typing import Optional
+
+from homeassistant.core import HomeAssistant, callback
+from homeassistant.helpers.storage import Store
+
+from .const import DOMAIN
+from .parser import WattBoxData
+
+_LOGGER = logging.getLogger(__name__)
+
+STORAGE_VERSION = 1
+# Outlet states change often during a busy minute; one write covers them all
+SAVE_DELAY = 30
+
+
+class SnapshotStore:
+    """Last snapshot read from the device, persisted for a fast start"""
+
+    def __init__(self, hass: HomeAssistant, entry_id: str):
+        self._store: Store = Store(hass, STORAGE_VERSION, f"{DOMAIN}.{entry_id}.snapshot")
+        self._data: Optional[WattBoxData] = None
+
+    async def async_load(self) -> Optional[WattBoxData]:
+        try:
+            stored = await self._store.async_load()
+        except Exception as e:
+            _LOGGER.debug("Could not load the saved snapshot: %s", e)
+            return None
+        if not stored:
+            return None
+        try:
+            return WattBoxData(
+                states=[bool(s) for s in stored["states"]],
+                names=[str(n) for n in stored.get("names") or []],
+                voltage=stored.get("voltage"),
+                current=stored.get("current"),
+                power=stored.get("power"),
+                outlet_power=stored.get("outlet_power"),
+                outlet_current=stored.get("outlet_current"),
+            )
+        except (KeyError, TypeError, ValueError) as e:
+            _LOGGER.debug("Ignoring an unreadable saved snapshot: %s", e)
+            return None
+
+    @callback
+    def async_save(self, data: WattBoxData) -> None:
+        """Schedule a save of a newly polled snapshot; repeated calls with the same one are free"""
+        if data is self._data:
+            return
+        self._data = data
+        self._store.async_delay_save(self._data.as_dict, SAVE_DELAY)
+
+    async def async_remove(self) -> None:
+        await self._store.async_remove()
@@ -1,120 +1,75 @@
 from __future__ import annotations
 
 import logging
-from datetime import timedelta
-from typing import Any, List
+from typing import Any
 
 from homeassistant.components.switch import SwitchEntity
 from homeassistant.config_entries import ConfigEntry
 from homeassistant.core import HomeAssistant
-from homeassistant.helpers.update_coordinator import (
-    DataUpdateCoordinator,
-    UpdateFailed,
-    CoordinatorEntity,
-)
 from homeassistant.helpers.entity_platform import AddEntitiesCallback
 
-from .const import (
-    DOMAIN,
-    CONF_MODEL,
-    CONF_OUTLETS,
-    CONF_SCAN_INTERVAL,
-    DEFAULT_SCAN_INTERVAL,
-    DEFAULT_MODEL,
-    outlets_for,
-)
-from .api import WattBoxHTTPClient
+from .const import DOMAIN
+from .transport import WattBoxTransport
+from .coordinator import WattBoxCoordinator
+from .entity import WattBoxEntity
+from .parser import WattBoxChanges
 
 _LOGGER = logging.getLogger(__name__)
 
 
 async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry, add_entities: AddEntitiesCallback) -> None:
-    client: WattBoxHTTPClient = hass.data[DOMAIN][entry.entry_id]["client"]
-
-    model = entry.data.get(CONF_MODEL, DEFAULT_MODEL)
-    outlets = entry.data.get(CONF_OUTLETS) or outlets_for(model)
-    if not outlets or outlets < 1:
-        outlets = outlets_for(model or DEFAULT_MODEL)
-
-    scan_interval = entry.data.get(CONF_SCAN_INTERVAL, DEFAULT_SCAN_INTERVAL)
-
-    names: List[str] = []
-    try:
-        names = await client.get_outlet_names()
-    except Exception as e:
-        _LOGGER.debug("Could not load outlet names: %s", e)
-
-    async def _update() -> list[bool]:
-        try:
-            states = await client.get_outlet_states()
-            if len(states) < outlets:
-                states += [False] * (outlets - len(states))
-            return states[:outlets]
-        except Exception as e:
-            _LOGGER.warning("WattBox poll failed: %s", e)
-            raise UpdateFailed(str(e))
-
-    coordinator = DataUpdateCoordinator(
-        hass,
-        _LOGGER,
-        name="wattbox_300_700_switch",
-        update_method=_update,
-        update_interval=timedelta(seconds=scan_interval),
-    )
-
-    try:
-        await coordinator.async_config_entry_first_refresh()
-    except Exception as e:
-        _LOGGER.warning("Initial refresh failed, creating entities anyway: %s", e)
-        coordinator.async_set_updated_data([False] * outlets)
-
-    hass.data.setdefault(DOMAIN, {}).setdefault(entry.entry_id, {})["switch_coordinator"] = coordinator
-
-    entities: list[WBOutletSwitch] = []
-    for i in range(outlets):
-        n = i + 1
-        if i < len(names) and names[i]:
-            label = f"{n} - {names[i]}"
-        else:
-            label = f"WattBox Outlet {n}"
-        entities.append(WBOutletSwitch(client, coordinator, n, entry, label))
-
-    add_entities(entities, True)
-
-
-class WBOutletSwitch(CoordinatorEntity, SwitchEntity):
+    client: WattBoxTransport = hass.data[DOMAIN][entry.entry_id]["client"]
+    coordinator: WattBoxCoordinator = hass.data[DOMAIN][entry.entry_id]["coordinator"]
+
+    add_entities([WBOutletSwitch(client, coordinator, i + 1, entry) for i in range(coordinator.outlets)])
+
+
+def _label(outlet: int, name: str) -> str:
+    return f"{outlet} - {name}" if name else f"WattBox Outlet {outlet}"
+
+
+class WBOutletSwitch(WattBoxEntity, SwitchEntity):
     """One WattBox outlet switch"""
 
-    def __init__(self, client: WattBoxHTTPClient, coordinator: DataUpdateCoordinator, outlet: int, entry: ConfigEntry, label: str):
+    def __init__(self, client: WattBoxTransport, coordinator: WattBoxCoordinator, outlet: int, entry: ConfigEntry):
         super().__init__(coordinator)
         self._client = client
         self._outlet = outlet
         self._entry = entry
-        self._attr_name = label
+        self._attr_name = self._label()
+        self._last_pending = False
         self._attr_unique_id = f"wb_300_700_{entry.data.get('host')}_outlet_{outlet}"
-        self._attr_device_info = {
-            "identifiers": {(DOMAIN, entry.data.get("host"))},
-            "name": f"WattBox 300/700 ({entry.data.get('host')})",
-            "manufacturer": "Snap One",
-            "model": entry.data.get(CONF_MODEL, DEFAULT_MODEL),
-        }
+
+    def _label(self) -> str:
+        return _label(self._outlet, self.coordinator.names.name(self._outlet - 1))
+
+    def _is_changed(self, changes: WattBoxChanges) -> bool:
+        pending = (self._outlet - 1) in self.coordinator.optimistic.pending
+        if pending != self._last_pending:
+            # Confirmed in the state already shown: only the attribute changes
+            self._last_pending = pending
+            return True
+        return (self._outlet - 1) in changes.outlets
+
+    @property
+    def extra_state_attributes(self) -> dict[str, Any] | None:
+        attrs: dict[str, Any] = {}
+        # Saved state from before the restart until the first poll answers
+        if self.coordinator.restored:
+            attrs["restored"] = True
+        # Shown optimistically, the device has not confirmed it yet
+        if (self._outlet - 1) in self.coordinator.optimistic.pending:
+            attrs["pending"] = True
+        return attrs or None
 
     @property
     def is_on(self) -> bool:
-        data = self.coordinator.data or []
+        data = self.coordinator.data.states if self.coordinator.data else []
         idx = self._outlet - 1
         return bool(data[idx]) if idx < len(data) else False
 
     async def async_turn_on(self, **kwargs: Any) -> None:
-        try:
-            await self._client.set_outlet(self._outlet, True)
-        except Exception as e:
-            _LOGGER.warning("Turn on outlet %s failed: %s", self._outlet, e)
-        await self.coordinator.async_request_refresh()
+        await self.coordinator.async_switch_outlet(self._outlet - 1, True)
 
     async def async_turn_off(self, **kwargs: Any) -> None:
-        try:
-            await self._client.set_outlet(self._outlet, False)
-        except Exception as e:
-            _LOGGER.warning("Turn off outlet %s failed: %s", self._outlet, e)
-        await self.coordinator.async_request_refresh()
\ No newline at end of file
+        await self.coordinator.async_switch_outlet(self._outlet - 1, False)
@@ -0,0 +1,322 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import re
+import time
+from collections import deque
+from typing import Deque, List, Optional, Tuple
+
+from .parser import MAX_OUTLET_CURRENT, MAX_OUTLET_POWER, WattBoxData, in_range
+from .probe import DeviceProbe
+from .transport import ACTION_OFF, ACTION_ON, ACTION_RESET, WattBoxAuthError, WattBoxError, WattBoxTransport
+
+_LOGGER = logging.getLogger(__name__)
+
+DEFAULT_TELNET_PORT = 23
+
+_ACTIONS = {ACTION_OFF: "OFF", ACTION_ON: "ON", ACTION_RESET: "RESET"}
+_NAME_RE = re.compile(r"\{([^}]*)\}")
+
+
+def _value(line: str, query: str) -> str:
+    """Payload of a '?Query=payload' reply"""
+    prefix = query + "="
+    if not line.startswith(prefix):
+        raise ValueError(f"unexpected reply to {query}: {line[:64]!r}")
+    return line[len(prefix):]
+
+
+def parse_outlet_status(payload: str) -> List[bool]:
+    return [p.strip() == "1" for p in payload.split(",") if p.strip()]
+
+
+def parse_power_status(payload: str) -> Tuple[Optional[float], Optional[float], Optional[float]]:
+    """'current,power,voltage,safe' -> (voltage, current, power)"""
+    parts = payload.split(",")
+    if len(parts) < 3:
+        raise ValueError(f"short PowerStatus: {payload!r}")
+    current, power, voltage = (float(p) for p in parts[:3])
+    return voltage, current, power
+
+
+def parse_outlet_names(payload: str) -> List[str]:
+    return [n.strip() for n in _NAME_RE.findall(payload)]
+
+
+def parse_outlet_power_status(payload: str) -> Tuple[int, float, float]:
+    """'outlet,power,current,voltage' -> (outlet, power, current)"""
+    parts = payload.split(",")
+    if len(parts) < 3:
+        raise ValueError(f"short OutletPowerStatus: {payload!r}")
+    return int(parts[0]), float(parts[1]), float(parts[2])
+
+
+class WattBoxTelnetClient(WattBoxTransport):
+    """Integration-protocol client over one persistent telnet/TCP session.
+
+    Requests are pipelined on the socket and answered in order; lines starting
+    with '~' are unsolicited updates from the device. The session is opened
+    on first use and again after any error.
+    """
+
+    def __init__(self, host: str, user: str, pw: str, port: int = DEFAULT_TELNET_PORT):
+        super().__init__(host)
+        if ":" in self._host:
+            self._addr, _, p = self._host.rpartition(":")
+            self._port = int(p)
+        else:
+            self._addr, self._port = self._host, port
+        self._user = user
+        self._pw = pw
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._read_task: Optional[asyncio.Task] = None
+        self._connect_lock = asyncio.Lock()
+        # Replies still owed by the device, oldest first
+        self._waiting: Deque[asyncio.Future] = deque()
+        # Names are only asked once per session
+        self._names: Optional[List[str]] = None
+        # Raw replies of the last poll, see poll()
+        self._last: Optional[Tuple[Optional[str], ...]] = None
+        # Whether ?OutletPowerStatus is answered; None until asked once
+        self._metered: Optional[bool] = None
+        # Outlets in the last ?OutletStatus, each is asked for its metering
+        self._outlet_count = 0
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None and not self._writer.is_closing()
+
+    @property
+    def push_active(self) -> bool:
+        # The device sends ~OutletStatus on every change to a logged-in session
+        return self.connected
+
+    # ---------- Session ----------
+
+    async def _read_until(self, reader: asyncio.StreamReader, *markers: bytes) -> bytes:
+        buf = b""
+        while not any(m in buf for m in markers):
+            chunk = await reader.read(256)
+            if not chunk:
+                raise ConnectionError("connection closed during login")
+            buf += chunk
+        return buf
+
+    async def _login(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        await self._read_until(reader, b"Username:")
+        writer.write(f"{self._user}\n".encode())
+        await self._read_until(reader, b"Password:")
+        writer.write(f"{self._pw}\n".encode())
+        reply = await self._read_until(reader, b"Logged In", b"Invalid")
+        if b"Invalid" in reply:
+            raise WattBoxAuthError(f"{self._host} rejected the login")
+
+    async def _ensure_connected(self) -> None:
+        if self.connected:
+            return
+        async with self._connect_lock:
+            if self.connected:
+                return
+            started = time.monotonic()
+            reader, writer = await asyncio.open_connection(self._addr, self._port)
+            try:
+                await self._login(reader, writer)
+            except BaseException:
+                writer.close()
+                raise
+            self.metrics.connects += 1
+            self.metrics.connect.add(time.monotonic() - started)
+            self.metrics.keepalive = True
+            self._reader, self._writer = reader, writer
+            self._names = None
+            self._last = None
+            self._read_task = asyncio.create_task(self._read_loop(reader))
+
+    def _disconnect(self, exc: BaseException) -> None:
+        """Close the session and fail every reply still owed"""
+        was_connected = self._writer is not None
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+        if self._read_task is not None and self._read_task is not asyncio.current_task():
+            self._read_task.cancel()
+        self._read_task = None
+        while self._waiting:
+            fut = self._waiting.popleft()
+            if not fut.done():
+                fut.set_exception(exc)
+        if was_connected:
+            self._notify_push(None)
+
+    async def _read_loop(self, reader: asyncio.StreamReader) -> None:
+        exc: BaseException = ConnectionError("connection closed by the device")
+        try:
+            while True:
+                raw = await reader.readline()
+                if not raw:
+                    self.metrics.early_closes += 1
+                    break
+                self.metrics.bytes_read += len(raw)
+                line = raw.decode("utf-8", "ignore").strip()
+                if line:
+                    self._dispatch(line)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            exc = e
+        if self._reader is reader:
+            self._disconnect(exc)
+
+    def _dispatch(self, line: str) -> None:
+        if line.startswith("~"):
+            self._on_update(line)
+        elif self._waiting:
+            fut = self._waiting.popleft()
+            if not fut.done():
+                fut.set_result(line)
+        else:
+            _LOGGER.debug("%s: unexpected line %r", self._host, line)
+
+    def _on_update(self, line: str) -> None:
+        """An unsolicited '~' line"""
+        if line.startswith("~OutletStatus="):
+            self._notify_push(parse_outlet_status(line[len("~OutletStatus="):]))
+        else:
+            _LOGGER.debug("%s: update %s", self._host, line)
+
+    async def _request(self, line: str) -> str:
+        """Send one line and wait for its reply"""
+        async with self._deadline():
+            reused = self.connected
+            await self._ensure_connected()
+            fut = asyncio.get_running_loop().create_future()
+            # Queued and written without yielding, so replies stay in order
+            self._waiting.append(fut)
+            started = time.monotonic()
+            self._writer.write(f"{line}\n".encode())
+            try:
+                await self._writer.drain()
+                reply = await fut
+            except BaseException:
+                # Timed out or lost: later replies can no longer be matched
+                fut.cancel()
+                self._disconnect(ConnectionError("request failed"))
+                raise
+        self.metrics.requests += 1
+        if reused:
+            self.metrics.reused += 1
+        self.metrics.ttfb.add(time.monotonic() - started)
+        if reply.startswith("#Error"):
+            raise WattBoxError(f"{self._host} rejected {line!r}")
+        return reply
+
+    # ---------- Transport ----------
+
+    async def _send(self, command: str) -> None:
+        async with self._guarded():
+            reply = await self._request(command)
+        if reply != "OK":
+            raise WattBoxError(f"{self._host} answered {command!r} with {reply[:64]!r}")
+
+    def _outlet_command(self, outlet: int, action: int) -> str:
+        return f"!OutletSet={outlet},{_ACTIONS[action]}"
+
+    def _auto_reboot_command(self, enabled: bool) -> str:
+        return f"!AutoReboot={1 if enabled else 0}"
+
+    async def _optional(self, line: str) -> Optional[str]:
+        """A query the model may not support: None when it answers #Error"""
+        try:
+            return await self._request(line)
+        except WattBoxError:
+            return None
+
+    async def _fetch(self) -> Tuple[Optional[str], ...]:
+        """Raw replies: outlet status, power status, then one per metered outlet"""
+        queries = [self._request("?OutletStatus"), self._request("?PowerStatus")]
+        # Starts with the second poll, the first one tells how many outlets to ask
+        metered = self._outlet_count if self._metered is not False else 0
+        queries += [self._optional(f"?OutletPowerStatus={i}") for i in range(1, metered + 1)]
+        ask_names = self._names is None
+        if ask_names:
+            queries.append(self._request("?OutletName"))
+        async with self._guarded():
+            replies = await asyncio.gather(*queries)
+        if ask_names:
+            self._names = self._parse(lambda: parse_outlet_names(_value(replies.pop(), "?OutletName")))
+        if metered and self._metered is None:
+            self._metered = any(r is not None for r in replies[2:])
+            if not self._metered:
+                _LOGGER.debug("%s does not meter outlets", self._host)
+                # The unanswered probe is no change for poll() to report
+                del replies[2:]
+        return tuple(replies)
+
+    def _parse(self, fn):
+        t = time.monotonic()
+        try:
+            return fn()
+        except ValueError:
+            self.metrics.parse_failures += 1
+            raise
+        finally:
+            self.metrics.parse.add(time.monotonic() - t)
+
+    def _build(self, status: str, power: str, *metering: Optional[str]) -> WattBoxData:
+        def _do() -> WattBoxData:
+            voltage, current, watts = parse_power_status(_value(power, "?PowerStatus"))
+            states = parse_outlet_status(_value(status, "?OutletStatus"))
+            self._outlet_count = len(states)
+            outlet_power = outlet_current = None
+            if self._metered and len(metering) == len(states):
+                outlet_power: List[Optional[float]] = [None] * len(states)
+                outlet_current: List[Optional[float]] = [None] * len(states)
+                for reply in metering:
+                    if reply is None:
+                        continue
+                    outlet, w, a = parse_outlet_power_status(_value(reply, "?OutletPowerStatus"))
+                    if 1 <= outlet <= len(states):
+                        outlet_power[outlet - 1] = in_range(w, MAX_OUTLET_POWER)
+                        outlet_current[outlet - 1] = in_range(a, MAX_OUTLET_CURRENT)
+            return WattBoxData(
+                states=states,
+                names=self._names or (),
+                voltage=voltage,
+                current=current,
+                power=watts,
+                outlet_power=outlet_power,
+                outlet_current=outlet_current,
+            )
+
+        return self._parse(_do)
+
+    async def get_info(self) -> WattBoxData:
+        return self._build(*await self._fetch())
+
+    async def probe(self) -> DeviceProbe:
+        data = await self.get_info()
+        queries = ("?Model", "?Firmware", "?ServiceTag")
+        async with self._guarded():
+            replies = await asyncio.gather(*(self._optional(q) for q in queries))
+        model, firmware, serial = (
+            _value(reply, query).strip() or None if reply is not None else None
+            for reply, query in zip(replies, queries)
+        )
+        return DeviceProbe(data, model=model, firmware=firmware, serial=serial)
+
+    async def poll(self) -> Optional[WattBoxData]:
+        """Ask ?OutletStatus and ?PowerStatus, None when both replies are unchanged"""
+        replies = await self._fetch()
+        if replies == self._last:
+            return None
+        data = self._build(*replies)
+        self._last = replies
+        return data
+
+    async def async_close(self) -> None:
+        await super().async_close()
+        # Closing on purpose is not a lost push session
+        self._push_listeners.clear()
+        self._disconnect(ConnectionError("client closed"))
@@ -0,0 +1,278 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Dict, Iterable, List, Optional, Tuple
+
+import async_timeout
+
+from .breaker import CLOSED, OPEN, CircuitBreaker
+from .metrics import ClientMetrics
+from .parser import WattBoxData
+from .probe import DeviceProbe
+
+_LOGGER = logging.getLogger(__name__)
+
+# Commands arriving within this window go out as one batch
+COMMAND_WINDOW = 0.05
+# The devices handle concurrent requests badly
+COMMAND_CONCURRENCY = 2
+
+# Outlet actions understood by every transport
+ACTION_OFF = 0
+ACTION_ON = 1
+ACTION_RESET = 3
+
+# Request timeout: ADAPTIVE_FACTOR x the p99 request time once ADAPTIVE_SAMPLES
+# requests were seen, never below MIN_TIMEOUT nor above MAX_TIMEOUT
+MAX_TIMEOUT = 8.0
+MIN_TIMEOUT = 2.0
+ADAPTIVE_FACTOR = 4.0
+ADAPTIVE_SAMPLES = 20
+
+# (kind, outlet): a newer switch command replaces an older one, a reset is never dropped for it
+CommandKey = Tuple[str, int]
+# Called with pushed outlet states, or None when the push session was lost
+PushListener = Callable[[Optional[List[bool]]], None]
+
+
+class WattBoxError(Exception):
+    """The device rejected a request"""
+
+
+class WattBoxAuthError(WattBoxError):
+    """The device rejected the credentials"""
+
+
+class CircuitOpenError(WattBoxError):
+    """Failing fast: the device stopped answering and is not due for a retry yet"""
+
+
+class WattBoxTransport:
+    """Base of the device clients: command queue plus the API the integration uses.
+
+    Subclasses talk to the device (HTTP CGI, integration-protocol socket) and
+    implement _send, _outlet_command, _auto_reboot_command, get_info and poll.
+    """
+
+    def __init__(self, host: str):
+        self._host = host.rstrip("/")
+        self._timeout = MAX_TIMEOUT
+        self.breaker = CircuitBreaker()
+        # Command queue: key -> (command, futures waiting on it), last write wins
+        self._pending: Dict[CommandKey, Tuple[str, List[asyncio.Future]]] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._batch_listeners: List[Callable[[], None]] = []
+        self._push_listeners: List[PushListener] = []
+        self.metrics = ClientMetrics()
+
+    @property
+    def host(self) -> str:
+        return self._host
+
+    @property
+    def push_active(self) -> bool:
+        """True while the device is pushing outlet changes on its own"""
+        return False
+
+    def _notify_push(self, states: Optional[List[bool]]) -> None:
+        self.metrics.pushes += states is not None
+        for cb in list(self._push_listeners):
+            try:
+                cb(states)
+            except Exception:
+                _LOGGER.exception("Push listener failed")
+
+    @property
+    def timeout(self) -> float:
+        """Current per-request timeout, adapted to how fast this device answers"""
+        total = self.metrics.total
+        if total.count < ADAPTIVE_SAMPLES:
+            return self._timeout
+        return min(max(total.percentile(99) * ADAPTIVE_FACTOR, MIN_TIMEOUT), self._timeout)
+
+    @asynccontextmanager
+    async def _deadline(self) -> AsyncIterator[None]:
+        timeout = self.timeout
+        started = time.monotonic()
+        try:
+            async with async_timeout.timeout(timeout):
+                yield
+        except asyncio.TimeoutError:
+            self.metrics.timeouts += 1
+            # Counts as the full timeout so a device slowing down raises it again
+            self.metrics.total.add(timeout)
+            raise
+        self.metrics.total.add(time.monotonic() - started)
+
+    @asynccontextmanager
+    async def _guarded(self) -> AsyncIterator[None]:
+        """Run one device operation through the circuit breaker"""
+        breaker = self.breaker
+        if not breaker.allow():
+            raise CircuitOpenError(f"{self._host} is not responding, not retrying yet")
+        was_open = breaker.state != CLOSED
+        try:
+            yield
+        except (ValueError, WattBoxError):
+            # The device answered, if badly
+            breaker.success()
+            raise
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as e:
+            breaker.failure()
+            if breaker.state == OPEN and not was_open:
+                _LOGGER.warning(
+                    "%s stopped answering (%s), failing fast for %.0fs",
+                    self._host, str(e) or type(e).__name__, breaker.retry_at - time.monotonic(),
+                )
+            raise
+        if was_open:
+            _LOGGER.info("%s is answering again", self._host)
+        breaker.success()
+
+    # ---------- Transport specific ----------
+
+    async def _send(self, command: str) -> None:
+        """Deliver one queued command to the device"""
+        raise NotImplementedError
+
+    def _outlet_command(self, outlet: int, action: int) -> str:
+        """Command for an outlet action, outlet 0 meaning all"""
+        raise NotImplementedError
+
+    def _auto_reboot_command(self, enabled: bool) -> str:
+        raise NotImplementedError
+
+    async def get_info(self) -> WattBoxData:
+        """Fetch outlet states, names and metrics once"""
+        raise NotImplementedError
+
+    async def poll(self) -> Optional[WattBoxData]:
+        """Like get_info, but None when nothing changed since the last poll"""
+        raise NotImplementedError
+
+    async def probe(self) -> DeviceProbe:
+        """Like get_info, plus the model, firmware and serial number the device reports"""
+        raise NotImplementedError
+
+    # ---------- Command queue ----------
+
+    async def _enqueue(self, commands: Dict[CommandKey, str]) -> None:
+        """Queue commands and wait until the batch carrying them was sent"""
+        loop = asyncio.get_running_loop()
+        futures = []
+        for key, command in commands.items():
+            fut = loop.create_future()
+            waiting = self._pending[key][1] if key in self._pending else []
+            waiting.append(fut)
+            self._pending[key] = (command, waiting)
+            futures.append(fut)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush())
+
+        results = await asyncio.gather(*futures, return_exceptions=True)
+        for r in results:
+            if isinstance(r, BaseException):
+                raise r
+
+    async def _flush(self) -> None:
+        sem = asyncio.Semaphore(COMMAND_CONCURRENCY)
+
+        async def _deliver(command: str, waiting: List[asyncio.Future]) -> None:
+            async with sem:
+                try:
+                    await self._send(command)
+                except Exception as e:
+                    for f in waiting:
+                        if not f.done():
+                            f.set_exception(e)
+                    return
+            for f in waiting:
+                if not f.done():
+                    f.set_result(None)
+
+        batch: Dict[CommandKey, Tuple[str, List[asyncio.Future]]] = {}
+        try:
+            while self._pending:
+                await asyncio.sleep(COMMAND_WINDOW)
+                batch, self._pending = self._pending, {}
+                await asyncio.gather(*(_deliver(command, waiting) for command, waiting in batch.values()))
+                batch = {}
+        except asyncio.CancelledError:
+            # Closed mid-batch: nobody may be left waiting on a command
+            self._fail_waiting(batch.values())
+            raise
+
+        for cb in list(self._batch_listeners):
+            try:
+                cb()
+            except Exception:
+                _LOGGER.exception("Command batch listener failed")
+
+    def _fail_waiting(self, queued: Iterable[Tuple[str, List[asyncio.Future]]]) -> None:
+        exc = WattBoxError(f"{self._host} client closed before the command was sent")
+        for _, waiting in queued:
+            for f in waiting:
+                if not f.done():
+                    f.set_exception(exc)
+
+    # ---------- Public API ----------
+
+    async def async_close(self) -> None:
+        """Cancel queued commands; their callers get a WattBoxError"""
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+        pending, self._pending = self._pending, {}
+        self._fail_waiting(pending.values())
+
+    def add_batch_listener(self, cb: Callable[[], None]) -> Callable[[], None]:
+        """Call cb once each time the command queue drains; returns a remover"""
+        self._batch_listeners.append(cb)
+        return lambda: self._batch_listeners.remove(cb)
+
+    def add_push_listener(self, cb: PushListener) -> Callable[[], None]:
+        """Call cb with outlet states the device pushes; returns a remover"""
+        self._push_listeners.append(cb)
+        return lambda: self._push_listeners.remove(cb)
+
+    async def get_outlet_states(self) -> List[bool]:
+        """Return list of outlet states as booleans, index 0 -> outlet 1"""
+        return list((await self.get_info()).states)
+
+    async def set_outlet(self, outlet: int, on: bool) -> None:
+        """Turn one outlet on or off"""
+        if outlet < 0:
+            raise ValueError("outlet must be >= 0")
+        await self.set_outlets({outlet: on})
+
+    async def set_outlets(self, outlets: Dict[int, bool]) -> None:
+        """Switch several outlets in one batch"""
+        if any(outlet < 0 for outlet in outlets):
+            raise ValueError("outlet must be >= 0")
+        await self._enqueue(
+            {("switch", outlet): self._outlet_command(outlet, ACTION_ON if on else ACTION_OFF) for outlet, on in outlets.items()}
+        )
+
+    async def reset_outlet(self, outlet: int) -> None:
+        # 0 means reset all
+        if outlet < 0:
+            raise ValueError("outlet must be >= 0")
+        await self._enqueue({("reset", outlet): self._outlet_command(outlet, ACTION_RESET)})
+
+    async def set_auto_reboot(self, enabled: bool) -> None:
+        """Enable or disable auto reboot for all outlets"""
+        await self._enqueue({("auto_reboot", 0): self._auto_reboot_command(enabled)})
+
+    async def get_outlet_names(self) -> list[str]:
+        """Return the outlet names"""
+        return list((await self.get_info()).names)
+
+    async def get_metrics(self) -> Dict[str, Optional[float]]:
+        """Return voltage V, current A, power W if present"""
+        data = await self.get_info()
+        return {"voltage": data.voltage, "current": data.current, "power": data.power}
@@ -0,0 +1,9 @@
+"""Import the integration and the tools without Home Assistant, see tools/_wattbox.py."""
+from __future__ import annotations
+
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "tools"))
+
+import _wattbox  # noqa: E402,F401  (registers the package)
@@ -0,0 +1,91 @@
+"""CircuitBreaker transitions and the adaptive request timeout clamp."""
+from __future__ import annotations
+
+import pytest
+
+from wattbox_300_700.breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+from wattbox_300_700.transport import (
+    ADAPTIVE_FACTOR,
+    ADAPTIVE_SAMPLES,
+    MAX_TIMEOUT,
+    MIN_TIMEOUT,
+    WattBoxTransport,
+)
+
+
+def _breaker() -> CircuitBreaker:
+    return CircuitBreaker(threshold=3, base_backoff=5.0, max_backoff=20.0, jitter=0.0)
+
+
+def test_opens_after_consecutive_failures():
+    breaker = _breaker()
+    breaker.failure(0.0)
+    breaker.failure(0.0)
+    breaker.success()
+    # A success in between starts the count over
+    breaker.failure(0.0)
+    breaker.failure(0.0)
+    assert breaker.state == CLOSED and breaker.allow(0.0)
+    breaker.failure(1.0)
+    assert breaker.state == OPEN and breaker.retry_at == 6.0
+    assert not breaker.allow(5.9)
+    assert breaker.rejected == 1
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.failure(0.0)
+    assert breaker.allow(5.0)
+    assert breaker.state == HALF_OPEN
+    # Only the probe goes out until it has an outcome
+    assert not breaker.allow(5.0)
+    breaker.success()
+    assert breaker.state == CLOSED and breaker.allow(5.0)
+
+
+def test_failed_probe_reopens_for_longer_up_to_the_cap():
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.failure(0.0)
+    opened = []
+    now = 0.0
+    for _ in range(4):
+        now = breaker.retry_at
+        assert breaker.allow(now)
+        breaker.failure(now)
+        opened.append(breaker.retry_at - now)
+    assert opened == [10.0, 20.0, 20.0, 20.0]
+    assert breaker.trips == 5
+
+
+def test_released_probe_frees_the_slot():
+    breaker = _breaker()
+    for _ in range(3):
+        breaker.failure(0.0)
+    assert breaker.allow(5.0)
+    breaker.release()
+    assert breaker.state == HALF_OPEN and breaker.allow(5.0)
+
+
+def _transport(seconds: float, samples: int = ADAPTIVE_SAMPLES) -> WattBoxTransport:
+    client = WattBoxTransport("wattbox.local")
+    for _ in range(samples):
+        client.metrics.total.add(seconds)
+    return client
+
+
+@pytest.mark.parametrize(
+    "seconds, expected",
+    [
+        (0.01, MIN_TIMEOUT),
+        (1.0, 1.0 * ADAPTIVE_FACTOR),
+        (5.0, MAX_TIMEOUT),
+    ],
+)
+def test_timeout_is_clamped(seconds, expected):
+    assert _transport(seconds).timeout == pytest.approx(expected)
+
+
+def test_timeout_stays_at_the_maximum_until_enough_samples():
+    assert _transport(0.01, ADAPTIVE_SAMPLES - 1).timeout == MAX_TIMEOUT
@@ -0,0 +1,57 @@
+"""PowerDetector: alerts start past the threshold and clear only past the hysteresis band."""
+from __future__ import annotations
+
+from typing import List, Optional
+
+from wattbox_300_700.detection import OVER_CURRENT, OVER_VOLTAGE, UNDER_VOLTAGE, PowerDetector
+from wattbox_300_700.parser import WattBoxData
+
+
+def _feed(detector: PowerDetector, voltages: List[Optional[float]], current: float = 1.0) -> list:
+    """(kind, active) of every event, per reading"""
+    return [
+        [(e.kind, e.active) for e in detector.update(WattBoxData(voltage=v, current=current))]
+        for v in voltages
+    ]
+
+
+def test_over_voltage_rises_and_falls_with_hysteresis():
+    detector = PowerDetector(over_voltage=132.0, voltage_hysteresis=2.0)
+    events = _feed(detector, [131.0, 132.0, 132.5, 131.0, 130.5, 129.9, 131.5])
+    # At the threshold is not past it; inside the band (130..132) stays active
+    assert events == [[], [], [(OVER_VOLTAGE, True)], [], [], [(OVER_VOLTAGE, False)], []]
+    assert not detector.active
+
+
+def test_under_voltage_rises_and_falls_with_hysteresis():
+    detector = PowerDetector(under_voltage=108.0, voltage_hysteresis=2.0)
+    events = _feed(detector, [110.0, 107.9, 109.0, 109.9, 110.1])
+    assert events == [[], [(UNDER_VOLTAGE, True)], [], [], [(UNDER_VOLTAGE, False)]]
+
+
+def test_values_inside_the_band_do_not_toggle():
+    detector = PowerDetector(over_voltage=132.0, voltage_hysteresis=2.0)
+    _feed(detector, [133.0])
+    # Hovering around the threshold after it tripped keeps one alert
+    assert _feed(detector, [131.9, 132.1, 130.5, 132.4, 131.0]) == [[]] * 5
+    assert detector.is_active(OVER_VOLTAGE)
+
+
+def test_extreme_is_the_worst_reading_while_active():
+    detector = PowerDetector(over_current=15.0, current_hysteresis=0.5)
+    for current in (15.5, 17.0, 16.0):
+        detector.update(WattBoxData(current=current))
+    assert detector.limits[OVER_CURRENT].extreme == 17.0
+    (event,) = detector.update(WattBoxData(current=14.0))
+    assert (event.active, event.value, event.extreme) == (False, 14.0, 17.0)
+
+
+def test_missing_readings_and_disabled_checks():
+    detector = PowerDetector(under_voltage=0, over_voltage=None, over_current=15.0)
+    assert detector.is_active(UNDER_VOLTAGE) is None
+    assert detector.is_active(OVER_VOLTAGE) is None
+    assert _feed(detector, [None, 50.0]) == [[], []]
+    detector.update(WattBoxData(current=16.0))
+    # A poll without current neither clears nor re-raises the alert
+    assert detector.update(WattBoxData(current=None)) == []
+    assert detector.active
@@ -0,0 +1,103 @@
+"""EnergyAccumulator: trapezoid integration, gaps, one-minute buckets and restore."""
+from __future__ import annotations
+
+import pytest
+
+from wattbox_300_700.energy import EnergyAccumulator
+
+
+def test_trapezoid_integration():
+    acc = EnergyAccumulator()
+    acc.add(0.0, 100.0)
+    acc.add(10.0, 300.0)
+    # 200 W on average for 10 s
+    assert acc.energy_kwh == pytest.approx(2000 / 3_600_000)
+    assert acc.gaps == 0
+
+
+def test_missing_power_is_skipped():
+    acc = EnergyAccumulator()
+    acc.add(0.0, 100.0)
+    acc.add(5.0, None)
+    acc.add(10.0, 100.0)
+    assert acc.energy_kwh == pytest.approx(1000 / 3_600_000)
+
+
+def test_gap_is_not_integrated_and_restarts_from_the_next_sample():
+    acc = EnergyAccumulator(max_gap=60.0)
+    acc.add(0.0, 100.0)
+    acc.add(1000.0, 100.0)
+    assert acc.energy_kwh == 0.0
+    assert (acc.gaps, acc.gap_seconds) == (1, 1000.0)
+    acc.add(1010.0, 100.0)
+    assert acc.energy_kwh == pytest.approx(1000 / 3_600_000)
+
+
+def test_clock_stepping_back_is_a_gap():
+    acc = EnergyAccumulator()
+    acc.add(100.0, 100.0)
+    acc.add(50.0, 100.0)
+    assert acc.energy_kwh == 0.0
+    assert (acc.gaps, acc.gap_seconds) == (1, 0.0)
+    # Integration goes on from the stepped clock
+    assert acc.last_ts == 50.0
+    acc.add(60.0, 100.0)
+    assert acc.energy_kwh == pytest.approx(1000 / 3_600_000)
+
+
+def test_buckets_roll_over_each_minute():
+    acc = EnergyAccumulator()
+    for ts, power in ((0.0, 100.0), (30.0, 100.0), (60.0, 500.0), (90.0, 500.0)):
+        acc.add(ts, power)
+    buckets = acc.as_dict()["buckets"]
+    assert [b[0] for b in buckets] == [0.0, 60.0]
+    # The sample at 60 s closes the interval 30-60 into the new minute
+    assert buckets[1][1] == pytest.approx(300.0 * 30 + 500.0 * 30)
+    assert buckets[0][3] == 100.0 and buckets[1][3] == 500.0
+    window = acc.window(300)
+    assert window["peak"] == 500.0
+    assert window["average"] == pytest.approx((100.0 * 30 + 300.0 * 30 + 500.0 * 30) / 90, abs=0.1)
+
+
+def test_window_leaves_out_old_minutes():
+    acc = EnergyAccumulator()
+    acc.add(0.0, 1000.0)
+    acc.add(30.0, 1000.0)
+    for ts in range(600, 700, 30):
+        acc.add(float(ts), 10.0)
+    assert acc.window(300)["peak"] == 10.0
+    assert acc.window(3600)["peak"] == 1000.0
+
+
+def test_restore_after_restart_counts_the_downtime_as_a_gap():
+    before = EnergyAccumulator()
+    before.add(0.0, 100.0)
+    before.add(36.0, 100.0)
+    saved = before.as_dict()
+
+    after = EnergyAccumulator()
+    after.add(636.0, 200.0)
+    after.add(646.0, 200.0)
+    after.restore(saved)
+    assert after.energy_kwh == pytest.approx((100.0 * 36 + 200.0 * 10) / 3_600_000)
+    assert (after.gaps, after.gap_seconds) == (1, 600.0)
+    assert [b[0] for b in after.as_dict()["buckets"]] == [0.0, 600.0]
+
+
+def test_restore_before_the_first_sample_continues_the_integration():
+    before = EnergyAccumulator()
+    before.add(0.0, 100.0)
+    before.add(10.0, 100.0)
+
+    after = EnergyAccumulator()
+    after.restore(before.as_dict())
+    after.add(20.0, 100.0)
+    assert after.energy_kwh == pytest.approx(2000 / 3_600_000)
+    assert after.gaps == 0
+
+
+def test_restore_ignores_a_corrupt_state():
+    acc = EnergyAccumulator()
+    acc.add(0.0, 100.0)
+    acc.restore({"energy_kwh": "not a number"})
+    assert acc.energy_kwh == 0.0 and acc.last_ts == 0.0
@@ -0,0 +1,60 @@
+"""OptimisticStates: pending commands are confirmed, contradicted or rolled back at their deadline."""
+from __future__ import annotations
+
+import asyncio
+
+from wattbox_300_700.optimistic import OptimisticStates
+
+
+def test_confirmed_by_a_later_poll():
+    async def main():
+        opt = OptimisticStates(timeout=15.0)
+        cmd = opt.start(0, False, True, 100.0, asyncio.get_running_loop().create_future())
+        assert opt.overlay([True, True]) == [False, True]
+        # A poll started before the command cannot confirm it, even when it agrees
+        assert opt.reconcile([False, True], 99.0, 101.0) == ([], [])
+        assert opt.reconcile([False, True], 100.5, 101.5) == ([cmd], [])
+        assert cmd.future.result() is True
+        assert not opt.pending and opt.confirmed == 1 and opt.latency.count == 1
+
+    asyncio.run(main())
+
+
+def test_contradicted_until_the_deadline_then_rolled_back():
+    async def main():
+        opt = OptimisticStates(timeout=15.0)
+        cmd = opt.start(1, True, False, 100.0, asyncio.get_running_loop().create_future())
+        # The device still reports the old state: shown as requested until the deadline
+        assert opt.reconcile([True, False], 105.0, 110.0) == ([], [])
+        assert opt.overlay([True, False]) == [True, True]
+        assert opt.reconcile([True, False], 114.0, 115.0) == ([], [cmd])
+        assert cmd.future.result() is False
+        assert opt.overlay([True, False]) == [True, False]
+        assert opt.rolled_back == 1 and opt.confirmed == 0
+
+    asyncio.run(main())
+
+
+def test_newer_command_supersedes_and_keeps_the_original_state():
+    async def main():
+        loop = asyncio.get_running_loop()
+        opt = OptimisticStates(timeout=15.0)
+        first = opt.start(0, False, True, 100.0, loop.create_future())
+        second = opt.start(0, True, False, 101.0, loop.create_future())
+        assert first.future.result() is None and opt.superseded == 1
+        # Rolling back restores what the device showed before either command
+        assert second.previous is True
+        opt.fail(second)
+        assert second.future.result() is False and not opt.pending
+
+    asyncio.run(main())
+
+
+def test_cancel_drops_every_pending_command():
+    async def main():
+        opt = OptimisticStates()
+        cmd = opt.start(2, True, False, 0.0, asyncio.get_running_loop().create_future())
+        opt.cancel()
+        assert cmd.future.cancelled() and not opt.pending
+
+    asyncio.run(main())
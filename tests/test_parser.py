@@ -0,0 +1,82 @@
+"""wattbox_info.xml parsing: garbled bodies are rejected, never turned into a wrong snapshot."""
+from __future__ import annotations
+
+import asyncio
+import random
+
+import pytest
+
+import _wattbox
+from simulator import PASSWORD, USER, Faults, Simulator
+from wattbox_300_700.api import WattBoxHTTPClient
+from wattbox_300_700.parser import InfoParser, parse_info
+
+FIXTURES = _wattbox.fixtures()
+GARBAGE = b"<<garbage&&"
+
+
+@pytest.mark.parametrize(
+    "old, new",
+    [
+        (b"<outlet_status>1,1,0", b"<outlet_status>1,1<<garbage&&,0"),
+        (b"<outlet_status>1,1,0", b"<outlet_status>1,x,0"),
+        (b"<voltage_value>1198", b"<voltage_value>11x98"),
+        (b"<outlet_name>Modem,", b"<outlet_name>Mo<<garbage&&dem,"),
+        (b"</current_value>", b"</current_v<<garbage&&alue>"),
+        (b"<power_value>", b"<power_v<<garbage&&alue>"),
+    ],
+)
+def test_garbled_tags_raise(old, new):
+    body = FIXTURES["WB-300-IP-3"]
+    assert old in body
+    with pytest.raises(ValueError):
+        parse_info(body.replace(old, new, 1))
+
+
+def test_trailing_comma_and_empty_values_still_parse():
+    body = FIXTURES["WB-300-IP-3"].replace(b"1,1,0<", b"1,1,0,<").replace(b">62<", b"><")
+    data = parse_info(body)
+    assert data.states == (True, True, False)
+    assert data.power is None
+
+
+@pytest.mark.parametrize("model", sorted(FIXTURES))
+def test_random_garbage_never_yields_a_wrong_snapshot(model):
+    body = FIXTURES[model]
+    clean = parse_info(body)
+    rng = random.Random(model)
+    for _ in range(500):
+        cut = rng.randrange(len(body) // 4, len(body))
+        garbled = body[:cut] + GARBAGE + body[cut:]
+        parser = InfoParser()
+        # Arrives in pieces like over HTTP
+        for i in range(0, len(garbled), 256):
+            parser.feed(garbled[i:i + 256])
+        try:
+            data = parser.result()
+        except ValueError:
+            continue
+        assert data == clean, garbled[max(cut - 40, 0):cut + 40]
+
+
+def test_simulator_malformed_bodies_are_rejected():
+    async def main():
+        async with Simulator(1, Faults(malformed=1.0)) as sim:
+            dev = sim.devices[0]
+            client = WattBoxHTTPClient(None, sim.hosts[0], USER, PASSWORD)
+            rejected = 0
+            try:
+                for i in range(200):
+                    dev.set(i % len(dev.states) + 1, i % 3 != 0)
+                    try:
+                        data = await client.get_info()
+                    except ValueError:
+                        rejected += 1
+                        continue
+                    assert list(data.states) == dev.states
+                    assert list(data.names) == dev.names
+            finally:
+                await client.async_close()
+            assert rejected and client.metrics.parse_failures == rejected
+
+    asyncio.run(main())
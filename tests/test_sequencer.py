@@ -0,0 +1,88 @@
+"""FleetPowerBudget reservations and the step order of build_plan."""
+from __future__ import annotations
+
+import asyncio
+import time
+
+import pytest
+
+from wattbox_300_700.sequencer import (
+    ACTION_OFF,
+    ACTION_ON,
+    ACTION_RESET,
+    BudgetExceeded,
+    FleetPowerBudget,
+    SequenceStep,
+    build_plan,
+)
+
+
+def test_smallest_limit_applies_and_leaves_with_its_entry():
+    budget = FleetPowerBudget()
+    assert budget.limit is None
+    remove_a = budget.set_limit("a", 1500)
+    budget.set_limit("b", 900)
+    budget.set_limit("c", 0)
+    assert budget.limit == 900
+    budget.report("a", 400.0, 0.0)
+    remove_a()
+    assert budget.limit == 900 and budget.load == 0.0
+
+
+def test_reserve_counts_until_a_later_poll_reports_the_load():
+    async def main():
+        budget = FleetPowerBudget()
+        budget.set_limit("a", 1000)
+        budget.report("a", 300.0, time.monotonic())
+        await budget.reserve("a", 200.0)
+        assert budget.waits == 0
+        assert budget.load == 500.0
+        # A poll that started before the switch-on does not include its load yet
+        budget.report("a", 300.0, time.monotonic() - 10)
+        assert budget.load == 500.0
+        budget.report("a", 500.0, time.monotonic())
+        assert budget.load == 500.0
+
+    asyncio.run(main())
+
+
+def test_reserve_waits_for_room_then_fails_after_its_timeout():
+    async def main():
+        budget = FleetPowerBudget()
+        budget.set_limit("a", 1000)
+        budget.report("a", 900.0, time.monotonic())
+        waiting = asyncio.ensure_future(budget.reserve("a", 200.0, timeout=5.0))
+        await asyncio.sleep(0.02)
+        assert not waiting.done() and budget.waits == 1
+        # Another device's poll frees nothing, this one's drop does
+        budget.report("b", 0.0, time.monotonic())
+        await asyncio.sleep(0.02)
+        assert not waiting.done()
+        budget.report("a", 700.0, time.monotonic())
+        assert await waiting > 0
+        assert budget.load == 900.0
+        with pytest.raises(BudgetExceeded):
+            await budget.reserve("a", 200.0, timeout=0.05)
+
+    asyncio.run(main())
+
+
+def test_on_and_reset_plans_keep_the_order_one_outlet_per_step():
+    plan = build_plan(ACTION_ON, [4, 0, 2], delay=2.0, delays={0: 10.0})
+    assert plan == [
+        SequenceStep((4,), True, 2.0),
+        SequenceStep((0,), True, 10.0),
+        # Nothing follows the last outlet
+        SequenceStep((2,), True, 0.0),
+    ]
+    reset = build_plan(ACTION_RESET, [1, 3], delay=1.0)
+    assert [(s.outlets, s.on, s.reset, s.delay) for s in reset] == [((1,), True, True, 1.0), ((3,), True, True, 0.0)]
+
+
+def test_off_plan_is_one_step_unless_delays_are_given():
+    assert build_plan(ACTION_OFF, [2, 0, 1]) == [SequenceStep((2, 0, 1), False)]
+    assert build_plan(ACTION_OFF, [2, 0], delays={2: 5.0}, delay=1.0) == [
+        SequenceStep((2,), False, 5.0),
+        SequenceStep((0,), False, 1.0),
+    ]
+    assert build_plan(ACTION_ON, []) == []
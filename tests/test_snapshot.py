@@ -0,0 +1,62 @@
+"""Allocation budget of the poll parse path, measured like tools/bench_snapshot.py (which also times it)."""
+from __future__ import annotations
+
+import pytest
+
+import _wattbox
+from bench_snapshot import churn, diff_lists, parse_compact, parse_lists, poller, retained, variants
+from wattbox_300_700.parser import InfoParser, WattBoxData, _StatesCache, diff, parse_info, states_for
+
+FIXTURES = _wattbox.fixtures()
+POLLS = 200
+
+
+@pytest.fixture(params=sorted(FIXTURES))
+def body(request) -> bytes:
+    return FIXTURES[request.param]
+
+
+def test_unchanged_body_returns_previous_snapshot(body):
+    previous = parse_info(body)
+    parser = InfoParser()
+    parser.feed(body)
+    assert parser.result(previous=previous) is previous
+    assert not diff(previous, previous)
+
+
+def test_unchanged_body_allocates_close_to_nothing(body):
+    poll = poller(parse_compact, diff, [body])
+    assert retained(poll, POLLS) < 16
+    # The scanner itself and the raw tag bytes, no snapshot or diff
+    assert churn(poller(parse_compact, diff, [body]), POLLS) < 600
+
+
+def test_changed_metrics_allocate_less_than_lists(body):
+    bodies = variants(body)
+    compact = churn(poller(parse_compact, diff, bodies), POLLS)
+    assert compact < 1024
+    assert compact < churn(poller(parse_lists, diff_lists, bodies), POLLS)
+    assert retained(poller(parse_compact, diff, bodies), POLLS) < 256
+
+
+def test_metric_only_diff_is_shared(body):
+    a, b = (parse_info(v) for v in variants(body, 2))
+    assert diff(a, b) is diff(b, a)
+    assert diff(a, b).metrics == {"voltage"} and not diff(a, b).outlets
+
+
+def test_mask_follows_states():
+    data = WattBoxData(states=[True, False, 1])
+    assert data.mask == 0b101
+    assert data.states is states_for(0b101, 3)
+    assert data.with_mask(0b010).states == (False, True, False)
+    assert data.with_mask(0b101) is data
+
+
+def test_states_cache_survives_clearing():
+    cache = _StatesCache(limit=2)
+    tuples = [cache.for_mask(mask, 4) for mask in range(6)]
+    for mask, states in enumerate(tuples):
+        shared, shared_mask = cache.shared(states)
+        assert shared == states and shared_mask == mask
+        assert cache.for_mask(mask, 4) is shared
@@ -0,0 +1,197 @@
+"""HTTP and telnet clients against tools/simulator.py: poll, set/reset, push and reconnect."""
+from __future__ import annotations
+
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, List, Optional, Tuple
+
+import pytest
+
+from simulator import PASSWORD, USER, Faults, SimulatedWattBox, Simulator
+from wattbox_300_700.api import WattBoxHTTPClient
+from wattbox_300_700.const import MODEL_CHOICES
+from wattbox_300_700.fleet import FleetScheduler
+from wattbox_300_700.pipeline import PollPipeline
+from wattbox_300_700.scheduler import AdaptiveInterval
+from wattbox_300_700.telnet import WattBoxTelnetClient
+from wattbox_300_700.transport import WattBoxAuthError, WattBoxTransport
+
+TRANSPORTS = ("http", "telnet")
+
+
+def _client(sim: Simulator, transport: str, index: int = 0, pw: str = PASSWORD) -> WattBoxTransport:
+    if transport == "telnet":
+        return WattBoxTelnetClient(sim.telnet_hosts[index], USER, pw)
+    return WattBoxHTTPClient(None, sim.hosts[index], USER, pw)
+
+
+@asynccontextmanager
+async def _device(
+    transport: str, faults: Optional[Faults] = None, reset_delay: float = 3.0
+) -> AsyncIterator[Tuple[SimulatedWattBox, WattBoxTransport]]:
+    async with Simulator(1, faults, reset_delay, telnet=transport == "telnet") as sim:
+        client = _client(sim, transport)
+        try:
+            yield sim.devices[0], client
+        finally:
+            await client.async_close()
+
+
+def _steady(dev: SimulatedWattBox) -> None:
+    """Readings without noise, so an unchanged device answers the same every time"""
+    dev.readings = lambda: (dev.voltage, dev.power / dev.voltage, dev.power)
+
+
+@pytest.mark.parametrize("transport", TRANSPORTS)
+def test_get_info_matches_every_model(transport):
+    async def main():
+        async with Simulator(len(MODEL_CHOICES), telnet=transport == "telnet") as sim:
+            for i, dev in enumerate(sim.devices):
+                dev.states[0] = False
+                client = _client(sim, transport, i)
+                try:
+                    data = await client.get_info()
+                finally:
+                    await client.async_close()
+                assert list(data.states) == dev.states, dev.model
+                assert list(data.names) == dev.names
+                assert data.power == pytest.approx(dev.power, abs=0.5)
+                assert data.voltage == pytest.approx(dev.voltage, abs=0.2)
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("transport", TRANSPORTS)
+def test_poll_is_none_until_the_device_changes(transport):
+    async def main():
+        async with _device(transport) as (dev, client):
+            _steady(dev)
+            first = await client.poll()
+            assert first is not None
+            assert await client.poll() is None
+            dev.set(2, False)
+            changed = await client.poll()
+            assert changed is not None and changed.states[1] is False
+            assert changed.power < first.power
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("transport", TRANSPORTS)
+def test_set_outlets_batches_one_command_per_outlet(transport):
+    async def main():
+        async with _device(transport) as (dev, client):
+            await asyncio.gather(
+                client.set_outlet(1, False),
+                client.set_outlet(2, True),
+                # Replaces the command above within the same window
+                client.set_outlet(2, False),
+            )
+            assert dev.commands == 2
+            assert dev.states[:2] == [False, False]
+            data = await client.get_info()
+            assert data.states[:2] == (False, False)
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("transport", TRANSPORTS)
+def test_reset_comes_back_on(transport):
+    async def main():
+        async with _device(transport, reset_delay=0.2) as (dev, client):
+            await asyncio.gather(client.reset_outlet(1), client.set_outlet(1, True))
+            # A switch command never swallows the reset queued for the same outlet
+            assert dev.commands == 2
+            await client.reset_outlet(2)
+            assert (await client.get_info()).states[1] is False
+            await asyncio.sleep(0.4)
+            assert (await client.get_info()).states[1] is True
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("transport", TRANSPORTS)
+def test_bad_credentials(transport):
+    async def main():
+        async with Simulator(1, telnet=transport == "telnet") as sim:
+            client = _client(sim, transport, pw="wrong")
+            try:
+                with pytest.raises(WattBoxAuthError):
+                    await client.get_info()
+            finally:
+                await client.async_close()
+
+    asyncio.run(main())
+
+
+@pytest.mark.parametrize("transport", TRANSPORTS)
+def test_pipeline_keeps_the_snapshot_until_the_device_changes(transport):
+    async def main():
+        async with _device(transport) as (dev, client):
+            _steady(dev)
+            fleet = FleetScheduler()
+            fleet.register(client.host)
+            interval = AdaptiveInterval(base=10.0, minimum=1.0, maximum=40.0)
+            pipeline = PollPipeline(client.host, client, len(dev.states), interval, fleet)
+            data = await pipeline.run(None)
+            for _ in range(3):
+                assert await pipeline.run(data) is data
+                assert not pipeline.changes
+            dev.set(1, False)
+            changed = await pipeline.run(data)
+            assert pipeline.changes.outlets == {0}
+            assert changed.states[0] is False and changed.mask == data.mask & ~1
+
+    asyncio.run(main())
+
+
+def test_telnet_pushes_outlet_changes():
+    async def main():
+        async with _device("telnet") as (dev, client):
+            pushed: List[Optional[List[bool]]] = []
+            client.add_push_listener(pushed.append)
+            assert not client.push_active
+            await client.get_info()
+            assert client.push_active
+            dev.set(3, False)
+            await asyncio.sleep(0.05)
+            assert pushed == [dev.states]
+
+    asyncio.run(main())
+
+
+def test_telnet_reconnects_after_the_device_hangs_up():
+    async def main():
+        async with _device("telnet") as (dev, client):
+            pushed: List[Optional[List[bool]]] = []
+            client.add_push_listener(pushed.append)
+            await client.get_info()
+            await dev.close_sessions()
+            await asyncio.sleep(0.05)
+            # The push session is gone: listeners hear None, polling takes over
+            assert pushed == [None]
+            assert not client.push_active
+            dev.set(1, False)
+            data = await client.get_info()
+            assert data.states[0] is False
+            assert client.metrics.connects == 2
+            assert client.push_active
+
+    asyncio.run(main())
+
+
+def test_http_recovers_from_early_closes():
+    async def main():
+        async with _device("http", Faults(early_close=1.0)) as (dev, client):
+            for _ in range(3):
+                try:
+                    await client.get_info()
+                except Exception:
+                    pass
+            assert client.metrics.early_closes == 3
+            dev.faults.early_close = 0.0
+            data = await client.get_info()
+            assert list(data.states) == dev.states
+            assert await client.poll() is not None
+
+    asyncio.run(main())
@@ -0,0 +1,24 @@
+"""Import integration modules without loading Home Assistant.
+
+The package __init__ pulls in homeassistant; the modules used here (parser,
+api, ...) do not, so register a bare package pointing at the source tree.
+"""
+from __future__ import annotations
+
+import sys
+import types
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+PACKAGE_DIR = ROOT / "custom_components" / "wattbox_300_700"
+FIXTURES_DIR = Path(__file__).resolve().parent / "fixtures"
+
+if "wattbox_300_700" not in sys.modules:
+    _pkg = types.ModuleType("wattbox_300_700")
+    _pkg.__path__ = [str(PACKAGE_DIR)]
+    sys.modules["wattbox_300_700"] = _pkg
+
+
+def fixtures() -> dict[str, bytes]:
+    """Recorded wattbox_info.xml bodies keyed by model"""
+    return {p.stem.upper(): p.read_bytes() for p in sorted(FIXTURES_DIR.glob("*.xml"))}
@@ -0,0 +1,265 @@
+"""Benchmark the device clients and the coordinator poll pipeline against the simulator.
+
+    python tools/bench.py [--devices 1 10 100] [--seconds 5] [--commands 30] [--transport telnet]
+
+For each fleet size it reports:
+  client    back-to-back client.poll() calls: polls/s and CPU ms per poll
+  pipeline  back-to-back PollPipeline.run() (fleet gate, fetch, parse, diff)
+  command   p50/p99 latency from set_outlet() to the state showing up in a
+            pipeline running on its own adaptive schedule (or pushed by the
+            device, with --transport telnet)
+
+The simulator runs in a separate process so CPU time is the client side only
+(use --in-process to share the loop, e.g. where subprocesses are awkward).
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import _wattbox  # noqa: F401  (registers the package)
+from simulator import PASSWORD, USER, Faults, Simulator
+from wattbox_300_700.api import WattBoxHTTPClient
+from wattbox_300_700.telnet import WattBoxTelnetClient
+from wattbox_300_700.transport import WattBoxTransport
+from wattbox_300_700.const import MODEL_CHOICES
+from wattbox_300_700.fleet import FleetScheduler
+from wattbox_300_700.parser import WattBoxData
+from wattbox_300_700.pipeline import PollPipeline
+from wattbox_300_700.scheduler import AdaptiveInterval
+
+
+def percentile(values: List[float], pct: float) -> float:
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    k = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[k]
+
+
+@dataclass(eq=False)
+class Device:
+    host: str
+    model: str
+    client: WattBoxTransport
+    pipeline: PollPipeline
+    data: Optional[WattBoxData] = None
+    kick: asyncio.Event = field(default_factory=asyncio.Event)
+    # (outlet index, wanted state, t0, future resolved with the latency)
+    pending: List[Tuple[int, bool, float, asyncio.Future]] = field(default_factory=list)
+    failures: int = 0
+
+
+def make_client(transport: str, host: str) -> WattBoxTransport:
+    if transport == "telnet":
+        return WattBoxTelnetClient(host, USER, PASSWORD)
+    return WattBoxHTTPClient(None, host, USER, PASSWORD, verify_ssl=False)
+
+
+def make_devices(
+    hosts: List[str], models: List[str], fleet: FleetScheduler, base: float, minimum: float, transport: str = "http"
+) -> List[Device]:
+    devices = []
+    for host, model in zip(hosts, models):
+        client = make_client(transport, host)
+        interval = AdaptiveInterval(base=base, minimum=minimum, maximum=base * 4)
+        fleet.register(host)
+        pipeline = PollPipeline(host, client, MODEL_CHOICES[model], interval, fleet)
+        dev = Device(host, model, client, pipeline)
+
+        def _batch_done(dev: Device = dev) -> None:
+            # what WattBoxCoordinator.async_commands_done does
+            dev.pipeline.activity()
+            dev.kick.set()
+
+        def _pushed(states: Optional[List[bool]], dev: Device = dev) -> None:
+            # what WattBoxCoordinator.async_handle_push does
+            if states is None:
+                dev.pipeline.set_interval(dev.pipeline.interval.current)
+                dev.kick.set()
+            elif dev.pipeline.apply_push(states) is not None:
+                settle(dev)
+
+        client.add_batch_listener(_batch_done)
+        client.add_push_listener(_pushed)
+        devices.append(dev)
+    return devices
+
+
+def settle(dev: Device) -> None:
+    """Resolve pending commands the device's latest states confirm"""
+    states = dev.pipeline.device_data.states if dev.pipeline.device_data else []
+    now = time.monotonic()
+    for item in list(dev.pending):
+        idx, wanted, t0, fut = item
+        if idx < len(states) and states[idx] == wanted:
+            dev.pending.remove(item)
+            fut.set_result(now - t0)
+
+
+async def _loop_for(seconds: float, devices: List[Device], step) -> Tuple[int, float, float]:
+    """Run step(dev) back-to-back on every device; returns polls, wall s, cpu s"""
+    stop = time.monotonic() + seconds
+    count = 0
+
+    async def _one(dev: Device) -> None:
+        nonlocal count
+        while time.monotonic() < stop:
+            try:
+                await step(dev)
+            except Exception:
+                dev.failures += 1
+            count += 1
+
+    cpu0, wall0 = time.process_time(), time.monotonic()
+    await asyncio.gather(*(_one(d) for d in devices))
+    return count, time.monotonic() - wall0, time.process_time() - cpu0
+
+
+async def bench_client(devices: List[Device], seconds: float) -> Tuple[int, float, float]:
+    async def step(dev: Device) -> None:
+        await dev.client.poll()
+
+    return await _loop_for(seconds, devices, step)
+
+
+async def bench_pipeline(devices: List[Device], seconds: float) -> Tuple[int, float, float]:
+    async def step(dev: Device) -> None:
+        dev.data = await dev.pipeline.run(dev.data)
+
+    return await _loop_for(seconds, devices, step)
+
+
+async def bench_commands(devices: List[Device], commands: int, rng: random.Random) -> Tuple[List[float], int]:
+    """Command-to-state latency with every pipeline on its own adaptive schedule; returns latencies, timeouts"""
+    stop = asyncio.Event()
+
+    async def _scheduled(dev: Device) -> None:
+        while not stop.is_set():
+            try:
+                dev.data = await dev.pipeline.run(dev.data)
+            except Exception:
+                dev.failures += 1
+            settle(dev)
+            try:
+                await asyncio.wait_for(dev.kick.wait(), dev.pipeline.delay)
+            except asyncio.TimeoutError:
+                pass
+            dev.kick.clear()
+
+    async def _command(dev: Device) -> float:
+        states = dev.pipeline.device_data.states if dev.pipeline.device_data else []
+        idx = rng.randrange(len(states)) if states else 0
+        wanted = not states[idx] if states else True
+        fut = asyncio.get_running_loop().create_future()
+        dev.pending.append((idx, wanted, time.monotonic(), fut))
+        await dev.client.set_outlet(idx + 1, wanted)
+        return await asyncio.wait_for(fut, 30)
+
+    loops = [asyncio.create_task(_scheduled(d)) for d in devices]
+    await asyncio.sleep(1.0)  # let every pipeline take its first snapshot
+    latencies: List[float] = []
+    timeouts = 0
+    try:
+        while len(latencies) + timeouts < commands:
+            # at most one command in flight per device
+            batch = rng.sample(devices, min(len(devices), commands - len(latencies) - timeouts))
+            for result in await asyncio.gather(*(_command(d) for d in batch), return_exceptions=True):
+                if isinstance(result, float):
+                    latencies.append(result)
+                else:
+                    timeouts += 1
+            await asyncio.sleep(rng.uniform(0.1, 0.5))
+    finally:
+        stop.set()
+        for d in devices:
+            d.kick.set()
+        await asyncio.gather(*loops, return_exceptions=True)
+    return latencies, timeouts
+
+
+async def _start_simulator(args: argparse.Namespace, n: int):
+    telnet = args.transport == "telnet"
+    if args.in_process:
+        faults = Faults(args.latency, early_close=args.early_close, malformed=args.malformed)
+        sim = await Simulator(n, faults, args.reset_delay, telnet=telnet).start()
+        return sim, sim.telnet_hosts if telnet else sim.hosts, [d.model for d in sim.devices]
+    proc = await asyncio.create_subprocess_exec(
+        sys.executable, str(Path(__file__).with_name("simulator.py")),
+        "--devices", str(n), "--latency", str(args.latency), "--reset-delay", str(args.reset_delay),
+        "--early-close", str(args.early_close), "--malformed", str(args.malformed),
+        *(["--telnet"] if telnet else []),
+        stdout=asyncio.subprocess.PIPE,
+    )
+    info = json.loads(await proc.stdout.readline())
+    return proc, info["telnet_hosts" if telnet else "hosts"], info["models"]
+
+
+async def _stop_simulator(handle) -> None:
+    if isinstance(handle, Simulator):
+        await handle.close()
+    else:
+        handle.terminate()
+        await handle.wait()
+
+
+async def run(args: argparse.Namespace) -> None:
+    rng = random.Random(args.seed)
+    print(f"{'devices':>7} {'stage':<9}{'polls/s':>10}{'cpu ms/poll':>13}{'p50 ms':>9}{'p99 ms':>9}{'failures':>10}")
+    for n in args.devices:
+        handle, hosts, models = await _start_simulator(args, n)
+        fleet = FleetScheduler(args.concurrency)
+        devices = make_devices(hosts, models, fleet, args.base, args.minimum, args.transport)
+        try:
+            for name, fn in (("client", bench_client), ("pipeline", bench_pipeline)):
+                for d in devices:
+                    d.failures = 0
+                polls, wall, cpu = await fn(devices, args.seconds)
+                fails = sum(d.failures for d in devices)
+                print(f"{n:>7} {name:<9}{polls / wall:>10.1f}{cpu / max(polls, 1) * 1000:>13.3f}{'':>9}{'':>9}{fails:>10}")
+
+            latencies, timeouts = await bench_commands(devices, args.commands, rng)
+            print(
+                f"{n:>7} {'command':<9}{'':>10}{'':>13}"
+                f"{percentile(latencies, 50) * 1000:>9.0f}{percentile(latencies, 99) * 1000:>9.0f}"
+                f"{timeouts:>10}"
+            )
+        finally:
+            for d in devices:
+                await d.client.async_close()
+            await _stop_simulator(handle)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--devices", type=int, nargs="+", default=[1, 10, 100])
+    ap.add_argument("--seconds", type=float, default=5.0, help="duration of each throughput stage")
+    ap.add_argument("--commands", type=int, default=30)
+    ap.add_argument("--concurrency", type=int, default=8, help="fleet-wide poll limit")
+    ap.add_argument("--base", type=float, default=2.0, help="base poll interval for the command stage")
+    ap.add_argument("--minimum", type=float, default=0.5, help="fast poll interval after commands")
+    ap.add_argument("--latency", type=float, default=0.0, help="simulated device latency")
+    ap.add_argument("--early-close", type=float, default=0.0, help="probability the device hangs up mid-body")
+    ap.add_argument("--malformed", type=float, default=0.0, help="probability of a garbled body")
+    ap.add_argument("--reset-delay", type=float, default=3.0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--transport", choices=["http", "telnet"], default="http")
+    ap.add_argument("--in-process", action="store_true", help="run the simulator in this process")
+    ap.add_argument("--verbose", action="store_true", help="show the integration's own log output")
+    args = ap.parse_args()
+    if not args.verbose:
+        # injected faults would otherwise bury the table in parse errors
+        logging.getLogger("wattbox_300_700").setLevel(logging.CRITICAL)
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
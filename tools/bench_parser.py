@@ -0,0 +1,66 @@
+"""Micro-benchmark: streaming InfoParser vs a full ElementTree parse.
+
+    python tools/bench_parser.py [--number N] [--chunk BYTES]
+"""
+from __future__ import annotations
+
+import argparse
+import timeit
+import xml.etree.ElementTree as ET
+
+import _wattbox  # noqa: F401  (registers the package)
+from wattbox_300_700.parser import InfoParser, WattBoxData
+
+
+def tree_parse(body: bytes) -> WattBoxData:
+    """What api.py did before: join, decode, build the whole tree, find() each tag"""
+    root = ET.fromstring(b"".join([body]).decode("utf-8", "ignore"))
+
+    def _csv(tag: str) -> list[str]:
+        node = root.find(tag)
+        if node is None or node.text is None:
+            return []
+        csv = node.text.replace("\r", "").replace("\n", "").strip()
+        return [p.strip() for p in csv.split(",") if p.strip() != ""]
+
+    def _int(tag: str):
+        node = root.find(tag)
+        return int(node.text.strip()) if node is not None and node.text else None
+
+    v, a, w = _int("voltage_value"), _int("current_value"), _int("power_value")
+    return WattBoxData(
+        states=[p == "1" for p in _csv("outlet_status")],
+        names=_csv("outlet_name"),
+        voltage=v / 10.0 if v is not None else None,
+        current=a / 10.0 if a is not None else None,
+        power=float(w) if w is not None else None,
+    )
+
+
+def stream_parse(chunks: list[bytes]):
+    parser = InfoParser()
+    for c in chunks:
+        if parser.feed(c):
+            break
+    return parser.result()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--number", type=int, default=5000)
+    ap.add_argument("--chunk", type=int, default=536, help="simulated read size in bytes")
+    args = ap.parse_args()
+
+    print(f"{'model':<18}{'bytes':>7}{'tree us':>10}{'stream us':>11}{'speedup':>9}")
+    for model, body in _wattbox.fixtures().items():
+        chunks = [body[i:i + args.chunk] for i in range(0, len(body), args.chunk)]
+        assert stream_parse(chunks) == tree_parse(body), model
+        tree = min(timeit.repeat(lambda: tree_parse(body), number=args.number, repeat=3))
+        stream = min(timeit.repeat(lambda: stream_parse(chunks), number=args.number, repeat=3))
+        tree_us = tree / args.number * 1e6
+        stream_us = stream / args.number * 1e6
+        print(f"{model:<18}{len(body):>7}{tree_us:>10.1f}{stream_us:>11.1f}{tree_us / stream_us:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
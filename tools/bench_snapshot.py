@@ -0,0 +1,143 @@
+"""Memory and time per poll: compact WattBoxData vs the old list-based snapshot.
+
+Replays recorded wattbox_info.xml bodies whose voltage changes on every poll
+while states and names stay the same, which is what a WattBox looks like most
+of the day, and the same body over and over (nothing changed).
+
+    python tools/bench_snapshot.py [--polls N] [--number N]
+
+For each model and case prints the parse + diff time per poll (timeit), the
+bytes a kept snapshot holds on to and the bytes allocated per poll
+(tracemalloc). tests/test_snapshot.py holds the compact snapshot to the
+allocation figures.
+"""
+from __future__ import annotations
+
+import argparse
+import re
+import timeit
+import tracemalloc
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+
+import _wattbox  # noqa: F401  (registers the package)
+from wattbox_300_700.parser import InfoParser, WattBoxData, diff
+
+_VOLTAGE_RE = re.compile(rb"<voltage_value>\d+</voltage_value>")
+
+
+@dataclass
+class ListSnapshot:
+    """The snapshot as it was: mutable, fresh lists on every poll"""
+
+    states: List[bool] = field(default_factory=list)
+    names: List[str] = field(default_factory=list)
+    voltage: Optional[float] = None
+    current: Optional[float] = None
+    power: Optional[float] = None
+
+
+def _csv(text: Optional[str]) -> List[str]:
+    if not text:
+        return []
+    return [p for p in (part.strip() for part in text.split(",")) if p]
+
+
+def _scan(body: bytes) -> InfoParser:
+    parser = InfoParser(outlet_tags=frozenset())
+    parser.feed(body)
+    return parser
+
+
+def parse_lists(body: bytes, previous: Optional[ListSnapshot] = None) -> ListSnapshot:
+    found = {tag: raw.decode() for tag, raw in _scan(body)._found.items()}
+    v, a, w = (int(found[t]) for t in ("voltage_value", "current_value", "power_value"))
+    return ListSnapshot(
+        states=[p == "1" for p in _csv(found["outlet_status"])],
+        names=_csv(found["outlet_name"]),
+        voltage=v / 10.0,
+        current=a / 10.0,
+        power=float(w),
+    )
+
+
+def diff_lists(old: Optional[ListSnapshot], new: ListSnapshot) -> tuple:
+    if old is None:
+        return set(range(len(new.states))), True
+    a, b = old.states, new.states
+    outlets = {i for i in range(max(len(a), len(b))) if i >= len(a) or i >= len(b) or a[i] != b[i]}
+    return outlets, old.names != new.names
+
+
+def parse_compact(body: bytes, previous: Optional[WattBoxData] = None) -> WattBoxData:
+    return _scan(body).result(previous=previous)
+
+
+def variants(body: bytes, count: int = 16) -> List[bytes]:
+    """The same body with a different voltage reading each"""
+    return [_VOLTAGE_RE.sub(f"<voltage_value>{1150 + i}</voltage_value>".encode(), body) for i in range(count)]
+
+
+def poller(parse: Callable, compare: Callable, bodies: List[bytes]) -> Callable[[], object]:
+    """One poll per call: parse the next body and diff it against the last snapshot"""
+    state = {"last": None, "i": 0}
+
+    def _poll():
+        body = bodies[state["i"] % len(bodies)]
+        state["i"] += 1
+        snap = parse(body, state["last"])
+        compare(state["last"], snap)
+        state["last"] = snap
+        return snap
+
+    return _poll
+
+
+def retained(poll: Callable[[], object], polls: int) -> float:
+    """Bytes held per snapshot when `polls` of them are kept alive"""
+    poll()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    kept = [poll() for _ in range(polls)]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del kept
+    return (after - before) / polls
+
+
+def churn(poll: Callable[[], object], polls: int) -> float:
+    """Bytes allocated per poll, freed or not (sum of per-poll peaks)"""
+    poll()
+    tracemalloc.start()
+    total = 0
+    for _ in range(polls):
+        tracemalloc.reset_peak()
+        base = tracemalloc.get_traced_memory()[0]
+        poll()
+        total += tracemalloc.get_traced_memory()[1] - base
+    tracemalloc.stop()
+    return total / polls
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--polls", type=int, default=1000, help="polls traced by tracemalloc")
+    ap.add_argument("--number", type=int, default=5000, help="polls timed by timeit")
+    args = ap.parse_args()
+
+    print(f"{'model':<18}{'case':<9}{'snapshot':<9}{'us/poll':>9}{'B kept':>8}{'B/poll':>8}")
+    for model, body in _wattbox.fixtures().items():
+        assert list(parse_compact(body).states) == parse_lists(body).states, model
+        for case, bodies in (("changed", variants(body)), ("same", [body])):
+            for label, parse, compare in (("lists", parse_lists, diff_lists), ("compact", parse_compact, diff)):
+                poll = poller(parse, compare, bodies)
+                seconds = min(timeit.repeat(poll, number=args.number, repeat=3))
+                kept = retained(poller(parse, compare, bodies), args.polls)
+                allocated = churn(poller(parse, compare, bodies), args.polls)
+                print(
+                    f"{model:<18}{case:<9}{label:<9}{seconds / args.number * 1e6:>9.1f}{kept:>8.0f}{allocated:>8.0f}"
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,398 @@
+"""Local WattBox simulator built on aiohttp's test server.
+
+Serves wattbox_info.xml and control.cgi for every model in MODEL_CHOICES,
+keeps outlet state (including reset timing) and can inject latency, early
+connection closes and malformed XML. With --telnet every device also
+answers the integration protocol on a TCP port (login, ?OutletStatus,
+?PowerStatus, ?OutletName, !OutletSet, ~OutletStatus pushes). With
+--metered the devices also report per-outlet power and current
+(?OutletPowerStatus=n, and outlet_power_value/outlet_current_value over
+HTTP, tag names the parser guesses; no recorded body has them).
+
+    python tools/simulator.py --devices 10 [--telnet] [--metered] [--latency 0.05] [--early-close 0.1] [--malformed 0.02]
+
+Prints one JSON line with the listening ports, then serves until interrupted.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from dataclasses import dataclass, field
+from typing import List, Optional
+
+from aiohttp import BasicAuth, hdrs, web
+from aiohttp.test_utils import TestServer
+
+import _wattbox  # noqa: F401  (registers the package)
+from wattbox_300_700.const import MODEL_CHOICES
+
+USER = "wattbox"
+PASSWORD = "wattbox"
+
+_serials = itertools.count()
+
+
+@dataclass
+class Faults:
+    """Per-request fault injection"""
+
+    latency: float = 0.0          # seconds added before answering
+    jitter: float = 0.0           # +/- seconds of random extra latency
+    early_close: float = 0.0      # probability of closing mid-body
+    malformed: float = 0.0        # probability of a garbled body
+    seed: Optional[int] = None
+
+    def __post_init__(self) -> None:
+        self.rng = random.Random(self.seed)
+
+    async def delay(self) -> None:
+        d = self.latency + (self.rng.uniform(-self.jitter, self.jitter) if self.jitter else 0.0)
+        if d > 0:
+            await asyncio.sleep(d)
+
+
+@dataclass
+class SimulatedWattBox:
+    model: str
+    faults: Faults = field(default_factory=Faults)
+    reset_delay: float = 3.0
+    voltage: float = 120.0
+    metered: bool = False
+    serial: str = field(default_factory=lambda: f"SIM{next(_serials):010d}")
+
+    def __post_init__(self) -> None:
+        n = MODEL_CHOICES[self.model]
+        rng = self.faults.rng
+        self.names: List[str] = [f"Outlet {i + 1}" for i in range(n)]
+        self.states: List[bool] = [True] * n
+        # Watts each outlet draws while on
+        self.loads: List[float] = [round(rng.uniform(5, 120), 1) for _ in range(n)]
+        self._reset_tasks: dict[int, asyncio.Task] = {}
+        # Logged-in integration-protocol sessions, told about outlet changes
+        self._sessions: set[asyncio.StreamWriter] = set()
+        self._handlers: dict[asyncio.Task, asyncio.StreamWriter] = {}
+        self.requests = 0
+        self.commands = 0
+
+    # ---------- device behaviour ----------
+
+    @property
+    def power(self) -> float:
+        return sum(w for w, on in zip(self.loads, self.states) if on)
+
+    def readings(self) -> tuple[float, float, float]:
+        """Voltage, current, power with a little noise on the voltage"""
+        power = self.power
+        v = self.voltage + self.faults.rng.choice((-0.1, 0.0, 0.0, 0.1))
+        return v, power / v, power
+
+    def outlet_readings(self) -> list[tuple[float, float]]:
+        """Power and current per outlet"""
+        return [(w, w / self.voltage) if on else (0.0, 0.0) for w, on in zip(self.loads, self.states)]
+
+    def set(self, outlet: int, on: bool) -> None:
+        for i in self._targets(outlet):
+            self._cancel_reset(i)
+            self.states[i] = on
+        self._push_status()
+
+    def reset(self, outlet: int) -> None:
+        for i in self._targets(outlet):
+            self._cancel_reset(i)
+            self.states[i] = False
+            self._reset_tasks[i] = asyncio.get_running_loop().create_task(self._power_back(i))
+        self._push_status()
+
+    async def _power_back(self, i: int) -> None:
+        await asyncio.sleep(self.reset_delay)
+        self.states[i] = True
+        self._reset_tasks.pop(i, None)
+        self._push_status()
+
+    def _cancel_reset(self, i: int) -> None:
+        task = self._reset_tasks.pop(i, None)
+        if task is not None:
+            task.cancel()
+
+    def _targets(self, outlet: int) -> range:
+        return range(len(self.states)) if outlet == 0 else range(outlet - 1, outlet)
+
+    def _status_csv(self) -> str:
+        return ",".join("1" if s else "0" for s in self.states)
+
+    def info_xml(self) -> bytes:
+        v, a, power = self.readings()
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?>\n<request>\n'
+            "<host_name>WattBox</host_name>\n"
+            f"<hardware_version>{self.model}</hardware_version>\n"
+            f"<serial_number>{self.serial}</serial_number>\n"
+            "<auto_reboot>0</auto_reboot>\n"
+            f"<outlet_name>{','.join(self.names)}</outlet_name>\n"
+            f"<outlet_status>{self._status_csv()}</outlet_status>\n"
+            f"<outlet_method>{','.join('1' for _ in self.states)}</outlet_method>\n"
+            "<safe_voltage_status>1</safe_voltage_status>\n"
+            f"<voltage_value>{round(v * 10)}</voltage_value>\n"
+            f"<current_value>{round(a * 10)}</current_value>\n"
+            f"<power_value>{round(power)}</power_value>\n"
+            f"{self._outlet_xml()}"
+            "<cloud_status>0</cloud_status>\n<has_ups>0</has_ups>\n</request>\n"
+        ).encode()
+
+    def _outlet_xml(self) -> str:
+        if not self.metered:
+            return ""
+        readings = self.outlet_readings()
+        return (
+            f"<outlet_power_value>{','.join(str(round(w)) for w, _ in readings)}</outlet_power_value>\n"
+            f"<outlet_current_value>{','.join(str(round(a * 10)) for _, a in readings)}</outlet_current_value>\n"
+        )
+
+    # ---------- HTTP ----------
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/wattbox_info.xml", self._handle_info)
+        app.router.add_get("/control.cgi", self._handle_control)
+        return app
+
+    def _authorized(self, request: web.Request) -> bool:
+        try:
+            auth = BasicAuth.decode(request.headers.get(hdrs.AUTHORIZATION, ""))
+        except ValueError:
+            return False
+        return auth.login == USER and auth.password == PASSWORD
+
+    async def _handle_info(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        if not self._authorized(request):
+            return web.Response(status=401, headers={hdrs.WWW_AUTHENTICATE: 'Basic realm="WattBox"'})
+        await self.faults.delay()
+        body = self.info_xml()
+        rng = self.faults.rng
+        if rng.random() < self.faults.malformed:
+            cut = rng.randrange(len(body) // 4, len(body))
+            body = body[:cut] + b"<<garbage&&" + body[cut:]
+        if rng.random() < self.faults.early_close:
+            # Like the real firmware: announce the full length, send part, hang up
+            resp = web.StreamResponse(headers={hdrs.CONTENT_TYPE: "text/xml", hdrs.CONTENT_LENGTH: str(len(body))})
+            await resp.prepare(request)
+            await resp.write(body[: rng.randrange(1, len(body))])
+            request.transport.close()
+            return resp
+        return web.Response(body=body, content_type="text/xml")
+
+    async def _handle_control(self, request: web.Request) -> web.Response:
+        self.requests += 1
+        if not self._authorized(request):
+            return web.Response(status=401)
+        await self.faults.delay()
+        try:
+            outlet = int(request.query["outlet"])
+            command = int(request.query["command"])
+        except (KeyError, ValueError):
+            return web.Response(status=400)
+        self.commands += 1
+        if command in (0, 1):
+            self.set(outlet, command == 1)
+        elif command == 3:
+            self.reset(outlet)
+        return web.Response(text="OK")
+
+
+    # ---------- integration protocol ----------
+
+    async def handle_telnet(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        task = asyncio.current_task()
+        self._handlers[task] = writer
+        try:
+            writer.write(b"Please Login to Continue\r\nUsername: ")
+            user = (await reader.readline()).decode(errors="ignore").strip()
+            writer.write(b"Password: ")
+            pw = (await reader.readline()).decode(errors="ignore").strip()
+            if (user, pw) != (USER, PASSWORD):
+                writer.write(b"Invalid Login\r\n")
+                await writer.drain()
+                return
+            writer.write(b"Successfully Logged In!\r\n")
+            self._sessions.add(writer)
+            rng = self.faults.rng
+            while True:
+                raw = await reader.readline()
+                if not raw:
+                    break
+                self.requests += 1
+                await self.faults.delay()
+                if rng.random() < self.faults.early_close:
+                    break
+                reply = self._telnet_reply(raw.decode(errors="ignore").strip())
+                if rng.random() < self.faults.malformed:
+                    reply = reply[: len(reply) // 2] + "<<garbage&&"
+                writer.write(f"{reply}\r\n".encode())
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._handlers.pop(task, None)
+            self._sessions.discard(writer)
+            writer.close()
+
+    async def close_sessions(self) -> None:
+        # Closing the sockets ends each handler's read loop
+        handlers = list(self._handlers.items())
+        for _, writer in handlers:
+            writer.close()
+        await asyncio.gather(*(task for task, _ in handlers), return_exceptions=True)
+
+    def _telnet_reply(self, line: str) -> str:
+        if line == "?OutletStatus":
+            return f"?OutletStatus={self._status_csv()}"
+        if line == "?PowerStatus":
+            v, a, w = self.readings()
+            return f"?PowerStatus={a:.2f},{w:.2f},{v:.2f},1"
+        if line == "?OutletName":
+            return "?OutletName=" + ",".join(f"{{{n}}}" for n in self.names)
+        if line.startswith("?OutletPowerStatus="):
+            try:
+                outlet_no = int(line[len("?OutletPowerStatus="):])
+            except ValueError:
+                return "#Error"
+            if not self.metered or not 1 <= outlet_no <= len(self.states):
+                return "#Error"
+            w, a = self.outlet_readings()[outlet_no - 1]
+            return f"?OutletPowerStatus={outlet_no},{w:.2f},{a:.2f},{self.voltage:.2f}"
+        if line == "?Model":
+            return f"?Model={self.model}"
+        if line == "?Firmware":
+            return "?Firmware=SIM1.0"
+        if line == "?ServiceTag":
+            return f"?ServiceTag={self.serial}"
+        if line.startswith("!OutletSet="):
+            try:
+                outlet, action = line[len("!OutletSet="):].split(",")
+                outlet_no = int(outlet)
+            except ValueError:
+                return "#Error"
+            if not 0 <= outlet_no <= len(self.states):
+                return "#Error"
+            self.commands += 1
+            if action == "ON" or action == "OFF":
+                self.set(outlet_no, action == "ON")
+            elif action == "RESET":
+                self.reset(outlet_no)
+            else:
+                return "#Error"
+            return "OK"
+        if line.startswith("!AutoReboot="):
+            return "OK"
+        return "#Error"
+
+    def _push_status(self) -> None:
+        line = f"~OutletStatus={self._status_csv()}\r\n".encode()
+        for writer in list(self._sessions):
+            if writer.is_closing():
+                self._sessions.discard(writer)
+            else:
+                writer.write(line)
+
+
+class Simulator:
+    """N simulated WattBoxes, one test server (port) each"""
+
+    def __init__(
+        self,
+        devices: int,
+        faults: Optional[Faults] = None,
+        reset_delay: float = 3.0,
+        seed: int = 0,
+        telnet: bool = False,
+        metered: bool = False,
+    ):
+        models = list(MODEL_CHOICES)
+        faults = faults or Faults()
+        self.devices = [
+            SimulatedWattBox(
+                models[i % len(models)],
+                Faults(faults.latency, faults.jitter, faults.early_close, faults.malformed, seed + i),
+                reset_delay,
+                metered=metered,
+            )
+            for i in range(devices)
+        ]
+        self.servers: List[TestServer] = []
+        self.telnet = telnet
+        self.telnet_servers: List[asyncio.AbstractServer] = []
+
+    @property
+    def hosts(self) -> List[str]:
+        return [f"127.0.0.1:{s.port}" for s in self.servers]
+
+    @property
+    def telnet_hosts(self) -> List[str]:
+        return [f"127.0.0.1:{s.sockets[0].getsockname()[1]}" for s in self.telnet_servers]
+
+    async def start(self) -> "Simulator":
+        for dev in self.devices:
+            server = TestServer(dev.app(), host="127.0.0.1")
+            await server.start_server()
+            self.servers.append(server)
+            if self.telnet:
+                self.telnet_servers.append(await asyncio.start_server(dev.handle_telnet, "127.0.0.1", 0))
+        return self
+
+    async def close(self) -> None:
+        for server in self.servers:
+            await server.close()
+        for tserver in self.telnet_servers:
+            tserver.close()
+        for dev in self.devices:
+            await dev.close_sessions()
+        for tserver in self.telnet_servers:
+            await tserver.wait_closed()
+
+    async def __aenter__(self) -> "Simulator":
+        return await self.start()
+
+    async def __aexit__(self, *exc) -> None:
+        await self.close()
+
+
+async def _serve(args: argparse.Namespace) -> None:
+    faults = Faults(args.latency, args.jitter, args.early_close, args.malformed)
+    async with Simulator(args.devices, faults, args.reset_delay, args.seed, args.telnet, args.metered) as sim:
+        info = {"hosts": sim.hosts, "models": [d.model for d in sim.devices]}
+        if args.telnet:
+            info["telnet_hosts"] = sim.telnet_hosts
+        print(json.dumps(info), flush=True)
+        started = time.monotonic()
+        try:
+            while True:
+                await asyncio.sleep(3600)
+        finally:
+            total = sum(d.requests for d in sim.devices)
+            print(json.dumps({"requests": total, "seconds": round(time.monotonic() - started, 1)}), flush=True)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Serve simulated WattBoxes")
+    ap.add_argument("--devices", type=int, default=1)
+    ap.add_argument("--latency", type=float, default=0.0)
+    ap.add_argument("--jitter", type=float, default=0.0)
+    ap.add_argument("--early-close", type=float, default=0.0)
+    ap.add_argument("--malformed", type=float, default=0.0)
+    ap.add_argument("--reset-delay", type=float, default=3.0)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--telnet", action="store_true", help="also serve the integration protocol over TCP")
+    ap.add_argument("--metered", action="store_true", help="report per-outlet power and current")
+    try:
+        asyncio.run(_serve(ap.parse_args()))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
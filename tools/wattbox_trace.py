@@ -0,0 +1,519 @@
+"""Record wattbox_info.xml / control.cgi exchanges with a WattBox and replay them offline.
+
+    python tools/wattbox_trace.py record HOST -u USER -p PASSWORD -o box.trace [--seconds 600] [--interval 10]
+    python tools/wattbox_trace.py proxy HOST -o box.trace [--port 8080]
+    python tools/wattbox_trace.py show box.trace [more.trace ...]
+    python tools/wattbox_trace.py replay box.trace [more.trace ...] [--devices 20] [--rate 10] [--stage pipeline]
+
+record polls wattbox_info.xml itself. proxy listens locally and forwards to
+the device, recording every request passing through (point Home Assistant
+or bench.py at it to capture control.cgi and real poll timing). Either way
+nothing is parsed; timings, status, validators and bodies are kept as the
+device sent them, including bodies it cut off and requests it never
+answered.
+
+A trace is gzipped JSON lines: a header, every distinct body once, then one
+line per exchange (offset, path, status, validators, time to first byte,
+body time, cut off or not). Credentials are not recorded.
+
+replay serves the traces from local servers on their own thread and event
+loop (no device, no network) and drives WattBoxHTTPClient.poll() or
+PollPipeline.run() plus the recorded commands along the recorded schedule:
+--rate 10 issues requests ten times as fast, --latency-scale stretches the
+device's own timings. It reports throughput, request latency percentiles,
+event-loop lag and memory.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import base64
+import gzip
+import json
+import logging
+import resource
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from dataclasses import MISSING, dataclass, field, fields
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import aiohttp
+from aiohttp import hdrs, web
+from aiohttp.test_utils import TestServer
+
+import _wattbox  # noqa: F401  (registers the package)
+from bench import percentile
+from wattbox_300_700.api import WattBoxHTTPClient
+from wattbox_300_700.fleet import FleetScheduler
+from wattbox_300_700.parser import parse_info
+from wattbox_300_700.pipeline import PollPipeline
+from wattbox_300_700.scheduler import AdaptiveInterval
+
+TRACE_VERSION = 1
+INFO_PATH = "wattbox_info.xml"
+# Response headers worth keeping: validators and what the body claimed to be
+KEPT_HEADERS = (
+    hdrs.ETAG, hdrs.LAST_MODIFIED, hdrs.CONTENT_TYPE, hdrs.CONTENT_LENGTH, hdrs.CONNECTION, hdrs.WWW_AUTHENTICATE,
+)
+# Status of an exchange the device never answered
+NO_RESPONSE = 0
+# Event-loop lag is sampled this often during a replay
+LAG_PERIOD = 0.01
+
+
+@dataclass
+class Exchange:
+    """One request and what the device did with it"""
+
+    at: float                 # seconds since the start of the recording
+    path: str                 # wattbox_info.xml or control.cgi?outlet=..&command=..
+    status: int               # NO_RESPONSE when it never answered
+    ttfb: float               # until the headers, or until giving up
+    body_time: float = 0.0
+    body: int = -1            # index into Trace.bodies
+    cut: bool = False         # the device hung up mid-body
+    headers: Dict[str, str] = field(default_factory=dict)
+
+    @property
+    def is_info(self) -> bool:
+        return self.path.split("?", 1)[0] == INFO_PATH
+
+
+_DEFAULTS = {
+    f.name: f.default_factory() if f.default_factory is not MISSING else f.default for f in fields(Exchange)
+}
+# Always written: fields without a default
+_REQUIRED = frozenset(name for name, default in _DEFAULTS.items() if default is MISSING)
+
+
+class Trace:
+    def __init__(self, host: str = "", recorded: Optional[str] = None):
+        self.host = host
+        self.recorded = recorded or datetime.now(timezone.utc).isoformat(timespec="seconds")
+        self.bodies: List[bytes] = []
+        self.exchanges: List[Exchange] = []
+        self._index: Dict[bytes, int] = {}
+
+    def add(self, exchange: Exchange, body: Optional[bytes] = None) -> None:
+        if body is not None:
+            exchange.body = self._index.get(body, -1)
+            if exchange.body < 0:
+                exchange.body = self._index[body] = len(self.bodies)
+                self.bodies.append(body)
+        self.exchanges.append(exchange)
+
+    def body(self, exchange: Exchange) -> bytes:
+        return self.bodies[exchange.body] if exchange.body >= 0 else b""
+
+    @property
+    def duration(self) -> float:
+        return self.exchanges[-1].at if self.exchanges else 0.0
+
+    def save(self, path: Path) -> None:
+        with gzip.open(path, "wt", encoding="utf-8") as f:
+            f.write(json.dumps({"version": TRACE_VERSION, "host": self.host, "recorded": self.recorded}) + "\n")
+            for body in self.bodies:
+                f.write(json.dumps({"body": base64.b64encode(body).decode()}) + "\n")
+            for ex in self.exchanges:
+                # Fields still at their default are left out, load() puts them back
+                f.write(json.dumps({k: v for k, v in vars(ex).items() if k in _REQUIRED or v != _DEFAULTS[k]}) + "\n")
+
+    @classmethod
+    def load(cls, path: Path) -> "Trace":
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            header = json.loads(f.readline())
+            if header.get("version") != TRACE_VERSION:
+                raise ValueError(f"{path}: unsupported trace version {header.get('version')}")
+            trace = cls(header.get("host", ""), header.get("recorded"))
+            for line in f:
+                item = json.loads(line)
+                if "body" in item and "path" not in item:
+                    trace.bodies.append(base64.b64decode(item["body"]))
+                else:
+                    trace.exchanges.append(Exchange(**item))
+        trace._index = {b: i for i, b in enumerate(trace.bodies)}
+        return trace
+
+
+# ---------- Recording ----------
+
+
+async def capture(
+    session: aiohttp.ClientSession, url: str, headers: Dict[str, str], timeout: float
+) -> Tuple[Exchange, Optional[bytes]]:
+    """GET url once and record the exchange; at is left for the caller"""
+    started = time.monotonic()
+    try:
+        async with session.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=timeout)) as resp:
+            ttfb = time.monotonic() - started
+            kept = {k: resp.headers[k] for k in KEPT_HEADERS if k in resp.headers}
+            body = bytearray()
+            cut = False
+            try:
+                async for c in resp.content.iter_any():
+                    body += c
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                cut = True
+            ex = Exchange(0.0, "", resp.status, ttfb, time.monotonic() - started - ttfb, cut=cut, headers=kept)
+            return ex, bytes(body)
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return Exchange(0.0, "", NO_RESPONSE, time.monotonic() - started), None
+
+
+def _describe(ex: Exchange, body: Optional[bytes]) -> str:
+    state = "no response" if ex.status == NO_RESPONSE else f"{ex.status} {len(body or b'')} B"
+    return f"{ex.at:8.1f}s {ex.path:<36}{state}{' cut off' if ex.cut else ''}  {ex.ttfb * 1000:.0f} ms"
+
+
+async def record(args: argparse.Namespace) -> None:
+    trace = Trace(args.host)
+    auth = aiohttp.BasicAuth(args.user, args.password)
+    connector = aiohttp.TCPConnector(limit_per_host=2)
+    started = time.monotonic()
+    async with aiohttp.ClientSession(connector=connector, auth=auth) as session:
+        try:
+            while time.monotonic() - started < args.seconds:
+                at = time.monotonic() - started
+                ex, body = await capture(session, f"http://{args.host}/{INFO_PATH}", {}, args.timeout)
+                ex.at, ex.path = at, INFO_PATH
+                trace.add(ex, body)
+                print(_describe(ex, body), flush=True)
+                await asyncio.sleep(max(0.0, at + args.interval - (time.monotonic() - started)))
+        finally:
+            trace.save(args.output)
+            print(f"{len(trace.exchanges)} exchanges, {len(trace.bodies)} distinct bodies -> {args.output}")
+
+
+async def proxy(args: argparse.Namespace) -> None:
+    trace = Trace(args.host)
+    started = time.monotonic()
+    session = aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit_per_host=2), auto_decompress=False)
+
+    async def _forward(request: web.Request) -> web.StreamResponse:
+        at = time.monotonic() - started
+        path = request.path_qs.lstrip("/")
+        headers = {k: v for k, v in request.headers.items() if k in (hdrs.AUTHORIZATION, hdrs.IF_NONE_MATCH, hdrs.IF_MODIFIED_SINCE)}
+        ex, body = await capture(session, f"http://{args.host}/{path}", headers, args.timeout)
+        ex.at, ex.path = at, path
+        trace.add(ex, body)
+        print(_describe(ex, body), flush=True)
+        return await respond(request, ex, body or b"", 0.0)
+
+    app = web.Application()
+    app.router.add_get("/{tail:.*}", _forward)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, args.bind, args.port).start()
+    print(f"recording {args.host} through http://{args.bind}:{args.port}/, Ctrl-C to stop", flush=True)
+    try:
+        while time.monotonic() - started < args.seconds:
+            await asyncio.sleep(min(1.0, args.seconds))
+    finally:
+        await runner.cleanup()
+        await session.close()
+        trace.save(args.output)
+        print(f"{len(trace.exchanges)} exchanges, {len(trace.bodies)} distinct bodies -> {args.output}")
+
+
+# ---------- Replay ----------
+
+
+async def respond(request: web.Request, ex: Exchange, body: bytes, scale: float) -> web.StreamResponse:
+    """Answer like the device did: same delay, status, validators, cut-off"""
+    if ex.status == NO_RESPONSE:
+        await asyncio.sleep(ex.ttfb * scale)
+        request.transport.close()
+        return web.Response()
+    if ex.ttfb * scale > 0:
+        await asyncio.sleep(ex.ttfb * scale)
+    headers = {k: v for k, v in ex.headers.items() if k != hdrs.CONTENT_LENGTH}
+    if ex.cut:
+        # Announce more than is sent, then hang up
+        headers[hdrs.CONTENT_LENGTH] = ex.headers.get(hdrs.CONTENT_LENGTH, str(len(body) + 1))
+    else:
+        headers[hdrs.CONTENT_LENGTH] = str(len(body))
+    resp = web.StreamResponse(status=ex.status, headers=headers)
+    await resp.prepare(request)
+    half = len(body) // 2
+    await resp.write(body[:half])
+    if ex.body_time * scale > 0:
+        await asyncio.sleep(ex.body_time * scale)
+    await resp.write(body[half:])
+    if ex.cut:
+        request.transport.close()
+        return resp
+    await resp.write_eof()
+    return resp
+
+
+class ReplayDevice:
+    """Serves one trace: every wattbox_info.xml request gets the next recorded
+    info exchange and every other request the next recorded other one, looping"""
+
+    def __init__(self, trace: Trace, scale: float, offset: int = 0):
+        self.trace = trace
+        self.scale = scale
+        info = [ex for ex in trace.exchanges if ex.is_info]
+        other = [ex for ex in trace.exchanges if not ex.is_info]
+        self._info = self._cycle(info, offset)
+        self._other = self._cycle(other, 0)
+        self.requests = 0
+
+    @staticmethod
+    def _cycle(exchanges: List[Exchange], offset: int) -> Iterator[Optional[Exchange]]:
+        if not exchanges:
+            while True:
+                yield None
+        i = offset % len(exchanges)
+        while True:
+            yield exchanges[i]
+            i = (i + 1) % len(exchanges)
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/{tail:.*}", self._handle)
+        return app
+
+    async def _handle(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        ex = next(self._info if request.path.lstrip("/") == INFO_PATH else self._other)
+        if ex is None:
+            # Commands not in the trace are accepted
+            return web.Response(text="OK")
+        return await respond(request, ex, self.trace.body(ex), self.scale)
+
+
+class ReplayServers:
+    """Replay devices on a thread and event loop of their own, so the loop
+    being measured only runs the integration"""
+
+    def __init__(self, devices: List[ReplayDevice]):
+        self.devices = devices
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._loop.run_forever, name="replay", daemon=True)
+        self._servers: List[TestServer] = []
+
+    def start(self) -> List[str]:
+        self._thread.start()
+        return asyncio.run_coroutine_threadsafe(self._start(), self._loop).result()
+
+    async def _start(self) -> List[str]:
+        for dev in self.devices:
+            server = TestServer(dev.app(), host="127.0.0.1")
+            await server.start_server()
+            self._servers.append(server)
+        return [f"127.0.0.1:{s.port}" for s in self._servers]
+
+    def close(self) -> None:
+        async def _close() -> None:
+            for server in self._servers:
+                await server.close()
+
+        asyncio.run_coroutine_threadsafe(_close(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+
+@dataclass
+class ReplayStats:
+    polls: List[float] = field(default_factory=list)
+    commands: List[float] = field(default_factory=list)
+    failures: Counter = field(default_factory=Counter)
+    late: int = 0
+
+
+async def _command(client: WattBoxHTTPClient, path: str) -> None:
+    """Issue a recorded control.cgi request through the client's public API"""
+    query = parse_qs(urlsplit(path).query)
+    outlet = int(query.get("outlet", ["0"])[0])
+    command = int(query.get("command", ["-1"])[0])
+    if command in (0, 1):
+        await client.set_outlet(outlet, command == 1)
+    elif command == 3:
+        await client.reset_outlet(outlet)
+    elif command in (4, 5):
+        await client.set_auto_reboot(command == 4)
+
+
+async def drive(
+    trace: Trace, client: WattBoxHTTPClient, pipeline: Optional[PollPipeline], args: argparse.Namespace,
+    stats: ReplayStats, stop: float, offset: float,
+) -> None:
+    """Issue the trace's requests on its schedule (sped up by --rate), one at a time, looping until stop"""
+    period = max(trace.duration, 1.0) + 1.0
+    data = None
+    base = time.monotonic() + offset
+    lap = 0
+    while True:
+        for ex in trace.exchanges:
+            due = base + (lap * period + ex.at) / args.rate
+            now = time.monotonic()
+            if due >= stop or now >= stop:
+                return
+            if due > now:
+                await asyncio.sleep(due - now)
+            elif now - due > 1.0:
+                stats.late += 1
+            started = time.monotonic()
+            try:
+                if not ex.is_info:
+                    await _command(client, ex.path)
+                    stats.commands.append(time.monotonic() - started)
+                    continue
+                if pipeline is not None:
+                    data = await pipeline.run(data)
+                else:
+                    await client.poll()
+                stats.polls.append(time.monotonic() - started)
+            except Exception as e:
+                stats.failures[type(e).__name__] += 1
+        lap += 1
+
+
+async def _loop_lag(samples: List[float], stop: asyncio.Event) -> None:
+    while not stop.is_set():
+        t = time.monotonic()
+        await asyncio.sleep(LAG_PERIOD)
+        samples.append(time.monotonic() - t - LAG_PERIOD)
+
+
+def _outlets(trace: Trace) -> int:
+    for ex in trace.exchanges:
+        if ex.is_info and ex.status == 200 and not ex.cut:
+            try:
+                return len(parse_info(trace.body(ex)).states)
+            except ValueError:
+                continue
+    return 0
+
+
+async def replay(args: argparse.Namespace) -> None:
+    traces = [Trace.load(p) for p in args.traces]
+    devices = [ReplayDevice(traces[i % len(traces)], args.latency_scale, i) for i in range(args.devices)]
+    servers = ReplayServers(devices)
+    hosts = servers.start()
+    fleet = FleetScheduler(args.concurrency)
+    clients = []
+    stats = ReplayStats()
+    lag: List[float] = []
+    stop_lag = asyncio.Event()
+    if args.memory:
+        tracemalloc.start()
+    # thread_time: the replay servers run on another thread of this process
+    cpu0, wall0 = time.thread_time(), time.monotonic()
+    try:
+        tasks = []
+        for i, (dev, host) in enumerate(zip(devices, hosts)):
+            client = WattBoxHTTPClient(None, host, "replay", "replay")
+            clients.append(client)
+            pipeline = None
+            if args.stage == "pipeline":
+                fleet.register(host)
+                interval = AdaptiveInterval(base=args.interval, minimum=args.interval, maximum=args.interval)
+                pipeline = PollPipeline(host, client, _outlets(dev.trace) or 1, interval, fleet)
+            # Devices sharing a trace start spread over its first poll gap
+            offset = (i / args.devices) * min(max(dev.trace.duration, 1.0), 10.0) / args.rate
+            tasks.append(drive(dev.trace, client, pipeline, args, stats, wall0 + args.seconds, offset))
+        lagger = asyncio.create_task(_loop_lag(lag, stop_lag))
+        await asyncio.gather(*tasks)
+        stop_lag.set()
+        await lagger
+    finally:
+        wall, cpu = time.monotonic() - wall0, time.thread_time() - cpu0
+        for client in clients:
+            await client.async_close()
+        servers.close()
+    current = peak = 0
+    if args.memory:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    done = len(stats.polls) + len(stats.commands)
+    print(f"{len(traces)} trace(s), {args.devices} devices, rate x{args.rate:g}, latency x{args.latency_scale:g}, {args.stage}")
+    print(f"{'requests':<10}{'per s':>8}{'cpu ms':>8}{'p50 ms':>8}{'p95 ms':>8}{'p99 ms':>8}{'max ms':>8}")
+    for name, values in (("polls", stats.polls), ("commands", stats.commands)):
+        if values:
+            ms = [percentile(values, p) * 1000 for p in (50, 95, 99, 100)]
+            # CPU time is shared by both kinds, shown per request on the first row
+            per = f"{cpu / max(done, 1) * 1000:>8.2f}" if name == "polls" else f"{'':>8}"
+            print(f"{name:<10}{len(values) / wall:>8.1f}{per}" + "".join(f"{v:>8.1f}" for v in ms))
+    if lag:
+        print(f"{'loop lag':<10}{'':>8}{'':>8}" + "".join(f"{percentile(lag, p) * 1000:>8.1f}" for p in (50, 95, 99, 100)))
+    failures = ", ".join(f"{name} {n}" for name, n in stats.failures.most_common()) or "none"
+    print(f"failures: {failures}; requests more than 1s behind schedule: {stats.late}")
+    memory = f"max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MB"
+    if args.memory:
+        memory += f", traced {current / 1024:.0f} KB now, {peak / 1024:.0f} KB peak"
+    print(f"memory: {memory}")
+
+
+def show(args: argparse.Namespace) -> None:
+    for path in args.traces:
+        trace = Trace.load(path)
+        info = [ex for ex in trace.exchanges if ex.is_info]
+        statuses = Counter("none" if ex.status == NO_RESPONSE else str(ex.status) for ex in trace.exchanges)
+        print(f"{path}: {trace.host}, recorded {trace.recorded}, {trace.duration:.0f}s")
+        print(f"  {len(trace.exchanges)} exchanges ({len(info)} info), {len(trace.bodies)} distinct bodies")
+        print(f"  status: {', '.join(f'{k} {n}' for k, n in sorted(statuses.items()))}; cut off: {sum(ex.cut for ex in trace.exchanges)}")
+        ttfb = [ex.ttfb for ex in trace.exchanges if ex.status != NO_RESPONSE]
+        if ttfb:
+            print("  ttfb ms: " + ", ".join(f"p{p} {percentile(ttfb, p) * 1000:.0f}" for p in (50, 95, 99)))
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = ap.add_subparsers(dest="cmd", required=True)
+
+    rec = sub.add_parser("record", help="poll wattbox_info.xml and record each exchange")
+    rec.add_argument("host")
+    rec.add_argument("-u", "--user", required=True)
+    rec.add_argument("-p", "--password", required=True)
+    rec.add_argument("-o", "--output", type=Path, required=True)
+    rec.add_argument("--seconds", type=float, default=600.0)
+    rec.add_argument("--interval", type=float, default=10.0, help="seconds between polls")
+    rec.add_argument("--timeout", type=float, default=8.0)
+
+    prx = sub.add_parser("proxy", help="record every request passing through to the device")
+    prx.add_argument("host")
+    prx.add_argument("-o", "--output", type=Path, required=True)
+    prx.add_argument("--bind", default="127.0.0.1")
+    prx.add_argument("--port", type=int, default=8080)
+    prx.add_argument("--seconds", type=float, default=float("inf"))
+    prx.add_argument("--timeout", type=float, default=8.0)
+
+    shw = sub.add_parser("show", help="summarize traces")
+    shw.add_argument("traces", type=Path, nargs="+")
+
+    rep = sub.add_parser("replay", help="replay traces against the client or the poll pipeline")
+    rep.add_argument("traces", type=Path, nargs="+")
+    rep.add_argument("--devices", type=int, default=1, help="replayed devices, sharing the traces round-robin")
+    rep.add_argument("--rate", type=float, default=1.0, help="speed-up of the recorded request schedule")
+    rep.add_argument("--latency-scale", type=float, default=1.0, help="factor on recorded device timings (0 for none)")
+    rep.add_argument("--seconds", type=float, default=10.0)
+    rep.add_argument("--stage", choices=["client", "pipeline"], default="client")
+    rep.add_argument("--concurrency", type=int, default=8, help="fleet-wide poll limit (pipeline stage)")
+    rep.add_argument("--interval", type=float, default=10.0, help="poll interval the pipeline's scheduler assumes")
+    rep.add_argument("--memory", action="store_true", help="trace allocations (slower)")
+    rep.add_argument("--verbose", action="store_true", help="show the integration's own log output")
+
+    args = ap.parse_args()
+    if args.cmd == "show":
+        show(args)
+        return
+    if not getattr(args, "verbose", False):
+        # Replayed faults would otherwise bury the report in warnings
+        logging.getLogger("wattbox_300_700").setLevel(logging.CRITICAL)
+    try:
+        asyncio.run({"record": record, "proxy": proxy, "replay": replay}[args.cmd](args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()